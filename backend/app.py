@@ -1,49 +1,51 @@
+import asyncio
+import atexit
 import base64
+import contextvars
+import email.utils
 import hashlib
+import hmac
 import io
 import json
 import os
+import random
+import re
 import secrets
+import tempfile
 import threading
 import time
-from urllib.parse import quote_plus, urlparse
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from queue import Empty, Queue
+from copy import deepcopy
+from urllib.parse import parse_qsl, quote_plus, urlencode, urlparse
 
-import requests
 from bs4 import BeautifulSoup
-from PIL import Image
-from flask import Flask, jsonify, request
+from PIL import Image, ImageOps, features
+from flask import Flask, g, jsonify, request, send_file
 
-
-APP = Flask(__name__)
-LOCK = threading.Lock()
-GAME_LOCK = threading.Lock()
-GAMES = {}
-
-ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
-ATTACHMENTS_DIR = os.path.join(ROOT_DIR, "frontend", "public", "attachments")
-UPLOADS_DIR = os.path.join(ROOT_DIR, "frontend", "public", "uploads")
-RENDERS_DIR = os.path.join(ROOT_DIR, "frontend", "public", "renders")
-AVATARS_DIR = os.path.join(ROOT_DIR, "frontend", "public", "avatars")
-CATALOG_PATH = os.path.join(ATTACHMENTS_DIR, "catalog.json")
-
-
-def _load_env_file():
-    env_path = os.path.join(ROOT_DIR, ".env")
-    if not os.path.isfile(env_path):
-        return
-    with open(env_path, "r", encoding="utf-8") as handle:
-        for raw_line in handle:
-            line = raw_line.strip()
-            if not line or line.startswith("#") or "=" not in line:
-                continue
-            key, value = line.split("=", 1)
-            key = key.strip()
-            value = value.strip().strip('"').strip("'")
-            if key and key not in os.environ:
-                os.environ[key] = value
+from config import (
+    ALLOWED_AVATARS, ATTACHMENTS_DIR, AVATARS_DIR, CATALOG_PATH, PUBLIC_DIR, REFS_DIR, RENDERS_DIR,
+    SEARCH_CACHE_DIR, UPLOADS_DIR, VARIANTS_DIR, _load_json, _safe_float, _safe_int, _save_json, _save_json_atomic,
+)
+from metrics import TIMING_TRACE, _count, _metrics_text, _observe, _span, _timing_breakdown
+from upstream import (
+    BROWSER_POOL, FAL_IMG_ENDPOINT, SHOP_BROWSER_MAX_NAVIGATIONS, SHOP_SEARCH_URL, UPSTREAM, _browser_pool_stats,
+    _browser_reset_slot, _browser_slot_page, _browser_worker_start, _request_get, _request_post, _submit_upstream,
+    _upstream_async_enabled, _upstream_health, _upstream_run, _upstream_stats, _upstream_stream, _upstream_submit,
+)
+from taxonomy import _apply_prompt_category, _category_matcher, _infer_category
+from catalog import (
+    LOCK, _catalog_apply, _catalog_db, _catalog_flush, _catalog_patch, _catalog_query, _catalog_resolve,
+    _catalog_response, _update_catalog, _update_render_state,
+)
+from games import (
+    GAME_LOCK_SHARDS, GAME_LOCK_STATS, GAME_LOCK_STATS_LOCK, _game_get, _game_insert, _game_store_stats,
+    _game_touch, _game_update, _serialize_game, _serialize_game_body, _wait_for_game,
+)
 
 
-_load_env_file()
+APP = Flask(__name__)
 
 FAL_API_KEY = (
     os.environ.get("FAI.AI_API_KEY")
@@ -52,24 +54,9 @@ FAL_API_KEY = (
     or os.environ.get("FAL_KEY")
 )
 FAL_AUTH_SCHEME = os.environ.get("FAL_AUTH_SCHEME", "Key")
-FAL_IMG_ENDPOINT = os.environ.get("FAL_SDXL_TURBO_IMG_ENDPOINT", "https://fal.run/fal-ai/fast-sdxl/image-to-image")
 FAL_IMAGE_SIZE = os.environ.get("FAL_IMAGE_SIZE", "square")
 
 
-def _safe_int(value, default):
-    try:
-        return int(value)
-    except (TypeError, ValueError):
-        return default
-
-
-def _safe_float(value, default):
-    try:
-        return float(value)
-    except (TypeError, ValueError):
-        return default
-
-
 FAL_NUM_STEPS = _safe_int(os.environ.get("FAL_NUM_STEPS"), 6)
 FAL_GUIDANCE = _safe_float(os.environ.get("FAL_GUIDANCE"), 5.0)
 FAL_STRENGTH = _safe_float(os.environ.get("FAL_STRENGTH"), 0.65)
@@ -77,21 +64,88 @@ RENDER_REF_HEIGHT = _safe_int(os.environ.get("RENDER_REF_HEIGHT"), 1024)
 RENDER_REF_GAP = _safe_int(os.environ.get("RENDER_REF_GAP"), 32)
 FAL_USE_IMAGE_URLS = os.environ.get("FAL_USE_IMAGE_URLS", "").lower() in ("1", "true", "yes")
 FAL_MINIMAL_IMG_PAYLOAD = os.environ.get("FAL_MINIMAL_IMG_PAYLOAD", "").lower() in ("1", "true", "yes")
+FAL_PAYLOAD_FORMAT = os.environ.get("FAL_PAYLOAD_FORMAT", "auto").lower()
+FAL_PAYLOAD_QUALITY = _safe_int(os.environ.get("FAL_PAYLOAD_QUALITY"), 85)
+FAL_PAYLOAD_MAX_BYTES = _safe_int(os.environ.get("FAL_PAYLOAD_MAX_KB"), 768) * 1024
+FAL_PAYLOAD_MIN_HEIGHT = _safe_int(os.environ.get("FAL_PAYLOAD_MIN_HEIGHT"), 384)
+FAL_REF_BASE_URL = os.environ.get("FAL_REF_BASE_URL", "").rstrip("/")
+FAL_REF_TTL = _safe_int(os.environ.get("FAL_REF_TTL_SECONDS"), 10 * 60)
+# Must be shared by every worker process when more than one serves /api/refs.
+FAL_REF_SIGNING_KEY = os.environ.get("FAL_REF_SIGNING_KEY", "").encode("utf-8") or secrets.token_bytes(32)
 
-REQUEST_PROXIES = {"http": None, "https": None}
-REQUEST_SESSION = requests.Session()
-REQUEST_SESSION.trust_env = False
 
-SHOP_SEARCH_URL = os.environ.get("SHOP_SEARCH_URL", "https://shop.app/search?q=")
 SHOP_SEARCH_QUERY = os.environ.get("SHOP_SEARCH_QUERY", "hoodie")
 SHOP_SEARCH_TIMEOUT = _safe_int(os.environ.get("SHOP_SEARCH_TIMEOUT"), 20)
 SHOP_SEARCH_LIMIT = _safe_int(os.environ.get("SHOP_SEARCH_LIMIT"), 6)
 SHOP_USE_PLAYWRIGHT = os.environ.get("SHOP_USE_PLAYWRIGHT", "1") == "1"
+SHOP_FAST_EXTRACT = os.environ.get("SHOP_FAST_EXTRACT", "1") == "1"
 SHOP_PLAYWRIGHT_TIMEOUT = _safe_int(os.environ.get("SHOP_PLAYWRIGHT_TIMEOUT"), 25)
+RENDER_ASYNC_CONCURRENCY = _safe_int(os.environ.get("RENDER_ASYNC_CONCURRENCY"), 256)
 GAME_DEFAULT_DURATION = _safe_int(os.environ.get("MULTI_DURATION_SECONDS"), 90)
 GAME_DEFAULT_LIMIT = _safe_int(os.environ.get("MULTI_ITEM_LIMIT"), 6)
-GAME_TTL_SECONDS = _safe_int(os.environ.get("MULTI_GAME_TTL_SECONDS"), 60 * 60)
 GAME_MAX_PLAYERS = _safe_int(os.environ.get("MULTI_MAX_PLAYERS"), 6)
+IMAGE_CACHE_MAX_BYTES = _safe_int(os.environ.get("IMAGE_CACHE_MAX_MB"), 256) * 1024 * 1024
+RENDER_CACHE_MAX_BYTES = _safe_int(os.environ.get("RENDER_CACHE_MAX_MB"), 512) * 1024 * 1024
+IMAGE_VARIANTS = os.environ.get("IMAGE_VARIANTS", "1") == "1"
+IMAGE_VARIANT_WIDTHS = sorted(
+    {
+        width
+        for width in (_safe_int(part, 0) for part in os.environ.get("IMAGE_VARIANT_WIDTHS", "160,320,640").split(","))
+        if width > 0
+    }
+)
+IMAGE_VARIANT_FORMATS = [
+    part.strip().lower() for part in os.environ.get("IMAGE_VARIANT_FORMATS", "webp,jpeg").split(",") if part.strip()
+]
+IMAGE_VARIANT_QUALITY = _safe_int(os.environ.get("IMAGE_VARIANT_QUALITY"), 78)
+IMAGE_VARIANT_WORKERS = _safe_int(os.environ.get("IMAGE_VARIANT_WORKERS"), 2)
+IMAGE_PLACEHOLDER_WIDTH = _safe_int(os.environ.get("IMAGE_PLACEHOLDER_WIDTH"), 16)
+RENDER_WORKERS = _safe_int(os.environ.get("RENDER_WORKERS"), 4)
+RENDER_WAIT_TIMEOUT = _safe_int(os.environ.get("RENDER_WAIT_TIMEOUT"), 180)
+RENDER_JOB_TTL = _safe_int(os.environ.get("RENDER_JOB_TTL_SECONDS"), 30 * 60)
+RENDER_BATCH_CONCURRENCY = _safe_int(os.environ.get("RENDER_BATCH_CONCURRENCY"), 4)
+RENDER_BATCH_MAX_CONCURRENCY = _safe_int(os.environ.get("RENDER_BATCH_MAX_CONCURRENCY"), 16)
+RENDER_BATCH_MAX_ITEMS = _safe_int(os.environ.get("RENDER_BATCH_MAX_ITEMS"), 200)
+FAL_MAX_RETRIES = _safe_int(os.environ.get("FAL_MAX_RETRIES"), 4)
+FAL_BACKOFF_BASE = _safe_float(os.environ.get("FAL_BACKOFF_BASE_SECONDS"), 1.0)
+FAL_BACKOFF_MAX = _safe_float(os.environ.get("FAL_BACKOFF_MAX_SECONDS"), 30.0)
+INGEST_WORKERS = _safe_int(os.environ.get("INGEST_WORKERS"), 8)
+INGEST_PER_HOST = _safe_int(os.environ.get("INGEST_PER_HOST"), 2)
+INGEST_BATCH_SIZE = _safe_int(os.environ.get("INGEST_BATCH_SIZE"), 8)
+INGEST_FLUSH_SECONDS = _safe_float(os.environ.get("INGEST_FLUSH_SECONDS"), 0.5)
+PHASH_DEDUPE = os.environ.get("PHASH_DEDUPE", "1") == "1"
+PHASH_MAX_DISTANCE = _safe_int(os.environ.get("PHASH_MAX_DISTANCE"), 4)
+PHASH_MAX_COLOR_DELTA = _safe_int(os.environ.get("PHASH_MAX_COLOR_DELTA"), 24)
+SEARCH_RANK = os.environ.get("SEARCH_RANK", "1") == "1"
+SEARCH_RANK_POOL_FACTOR = _safe_int(os.environ.get("SEARCH_RANK_POOL_FACTOR"), 3)
+SEARCH_RANK_MAX_CANDIDATES = _safe_int(os.environ.get("SEARCH_RANK_MAX_CANDIDATES"), 24)
+RANK_PROBE_BYTES = _safe_int(os.environ.get("RANK_PROBE_BYTES"), 32 * 1024)
+RANK_PROBE_TIMEOUT = _safe_float(os.environ.get("RANK_PROBE_TIMEOUT_SECONDS"), 3.0)
+RANK_PROBE_BUDGET = _safe_float(os.environ.get("RANK_PROBE_BUDGET_SECONDS"), 2.5)
+RANK_PROBE_WORKERS = _safe_int(os.environ.get("RANK_PROBE_WORKERS"), 8)
+RANK_PROBE_CACHE_SIZE = _safe_int(os.environ.get("RANK_PROBE_CACHE_SIZE"), 4096)
+RANK_PROBE_FAILURE_TTL = _safe_int(os.environ.get("RANK_PROBE_FAILURE_TTL_SECONDS"), 5 * 60)
+RANK_MIN_SIDE = _safe_int(os.environ.get("RANK_MIN_SIDE"), 512)
+RANK_TARGET_SIDE = _safe_int(os.environ.get("RANK_TARGET_SIDE"), 1024)
+RANK_MIN_ASPECT = _safe_float(os.environ.get("RANK_MIN_ASPECT"), 0.5)
+RANK_MAX_ASPECT = _safe_float(os.environ.get("RANK_MAX_ASPECT"), 1.5)
+RANK_POSITION_WEIGHT = _safe_float(os.environ.get("RANK_POSITION_WEIGHT"), 0.5)
+GAME_STREAM_KEEPALIVE = _safe_int(os.environ.get("MULTI_STREAM_KEEPALIVE_SECONDS"), 15)
+GAME_LONG_POLL_TIMEOUT = _safe_int(os.environ.get("MULTI_LONG_POLL_SECONDS"), 25)
+GAME_COLLECT_DEADLINE = _safe_float(os.environ.get("MULTI_COLLECT_DEADLINE_SECONDS"), 12.0)
+WARM_POOL_ENABLED = os.environ.get("WARM_POOL", "0") == "1"
+WARM_POOL_SIZE = _safe_int(os.environ.get("WARM_POOL_SIZE"), 8)
+WARM_POOL_TTL = _safe_int(os.environ.get("WARM_POOL_TTL_SECONDS"), 6 * 60 * 60)
+WARM_POOL_INTERVAL = _safe_int(os.environ.get("WARM_POOL_INTERVAL_SECONDS"), 5 * 60)
+WARM_POOL_RETRY = _safe_int(os.environ.get("WARM_POOL_RETRY_SECONDS"), 10 * 60)
+WARM_RENDER_TOP = _safe_int(os.environ.get("WARM_RENDER_TOP"), 2)
+WARM_RENDER_DAILY_BUDGET = _safe_int(os.environ.get("WARM_RENDER_DAILY_BUDGET"), 0)
+WARM_RENDER_PER_MINUTE = _safe_float(os.environ.get("WARM_RENDER_PER_MINUTE"), 2.0)
+SHOP_SEARCH_WORKERS = _safe_int(os.environ.get("SHOP_SEARCH_WORKERS"), 6)
+SEARCH_CACHE_TTL = _safe_int(os.environ.get("SHOP_SEARCH_CACHE_TTL"), 15 * 60)
+SEARCH_CACHE_STALE_TTL = _safe_int(os.environ.get("SHOP_SEARCH_CACHE_STALE_TTL"), 6 * 60 * 60)
+SEARCH_CACHE_MAX_ENTRIES = _safe_int(os.environ.get("SHOP_SEARCH_CACHE_MAX_ENTRIES"), 256)
+SEARCH_CACHE_DISK = os.environ.get("SHOP_SEARCH_CACHE_DISK", "1") == "1"
 
 PROMPT_PRESETS = [
     {
@@ -126,28 +180,6 @@ PROMPT_PRESETS = [
     },
 ]
 
-BOTTOM_KEYWORDS = [
-    "pants",
-    "jean",
-    "trouser",
-    "short",
-    "skirt",
-]
-
-ACCESSORY_KEYWORDS = [
-    "hat",
-    "cap",
-    "beanie",
-    "bag",
-    "belt",
-    "watch",
-    "ring",
-    "bracelet",
-    "necklace",
-    "sunglasses",
-]
-
-ALLOWED_AVATARS = {"girl", "boy"}
 AVATAR_FILES = {
     "girl": "basic girl.png",
     "boy": "basic guy.png",
@@ -160,29 +192,6 @@ RENDER_INSTRUCTION = (
 )
 
 
-
-def _load_json(path, default):
-    if not os.path.isfile(path):
-        return default
-    with open(path, "r", encoding="utf-8") as handle:
-        return json.load(handle)
-
-
-def _save_json(path, data):
-    with open(path, "w", encoding="utf-8") as handle:
-        json.dump(data, handle, indent=2)
-
-
-def _request_get(url, **kwargs):
-    kwargs.setdefault("proxies", REQUEST_PROXIES)
-    return REQUEST_SESSION.get(url, **kwargs)
-
-
-def _request_post(url, **kwargs):
-    kwargs.setdefault("proxies", REQUEST_PROXIES)
-    return REQUEST_SESSION.post(url, **kwargs)
-
-
 def _normalize_url(value, base_url=None):
     if not value:
         return None
@@ -292,6 +301,130 @@ def _parse_shop_search_html(html):
     return candidates
 
 
+SCRIPT_OPEN_RE = re.compile(r"<script\b([^>]*)>", re.IGNORECASE)
+SCRIPT_CLOSE_RE = re.compile(r"</script[\s/>]", re.IGNORECASE)
+LD_JSON_ATTR_RE = re.compile(r"""\btype\s*=\s*["']?\s*application/ld\+json""", re.IGNORECASE)
+NEXT_DATA_ATTR_RE = re.compile(r"""\bid\s*=\s*["']?__NEXT_DATA__(?:["'\s/]|$)""", re.IGNORECASE)
+SHOP_DATA_MARKER_RE = re.compile(r"application/ld\+json|__NEXT_DATA__", re.IGNORECASE)
+
+
+def _iter_script_blocks(html):
+    """Yield ``(kind, text)`` for ld+json and __NEXT_DATA__ scripts without building a DOM."""
+    position = 0
+    while True:
+        opening = SCRIPT_OPEN_RE.search(html, position)
+        if not opening:
+            return
+        closing = SCRIPT_CLOSE_RE.search(html, opening.end())
+        end = closing.start() if closing else len(html)
+        attrs = opening.group(1)
+        if LD_JSON_ATTR_RE.search(attrs):
+            yield "ld", html[opening.end():end]
+        elif NEXT_DATA_ATTR_RE.search(attrs):
+            yield "next", html[opening.end():end]
+        if not closing:
+            return
+        position = closing.end()
+
+
+def _iter_containers(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(entry for entry in reversed(node) if isinstance(entry, (dict, list)))
+        elif isinstance(node, dict):
+            yield node
+            stack.extend(value for value in reversed(node.values()) if isinstance(value, (dict, list)))
+
+
+def _iter_ld_products(root):
+    for node in _iter_containers(root):
+        node_type = node.get("@type")
+        if node_type == "ItemList" and isinstance(node.get("itemListElement"), list):
+            for entry in node["itemListElement"]:
+                candidate = entry.get("item") if isinstance(entry, dict) else None
+                if candidate:
+                    yield candidate
+        if node_type == "Product":
+            yield node
+
+
+def _iter_next_data_candidates(root):
+    for node in _iter_containers(root):
+        if _looks_like_product_candidate(node):
+            yield node
+
+
+def _extract_shop_candidates(html):
+    """Yield product candidates lazily, in the same order as _parse_shop_search_html."""
+    if not SHOP_FAST_EXTRACT:
+        yield from _parse_shop_search_html(html)
+        return
+    next_data = None
+    found = False
+    seen = set()
+    for kind, text in _iter_script_blocks(html):
+        found = True
+        if kind == "next":
+            if next_data is None:
+                next_data = text
+            continue
+        try:
+            data = json.loads(text)
+        except ValueError:
+            continue
+        for candidate in _iter_ld_products(data):
+            if id(candidate) not in seen:
+                seen.add(id(candidate))
+                yield candidate
+    if next_data and next_data.strip():
+        try:
+            data = json.loads(next_data)
+        except ValueError:
+            data = None
+        if data is not None:
+            yield from _iter_next_data_candidates(data)
+    if not found and SHOP_DATA_MARKER_RE.search(html):
+        yield from _parse_shop_search_html(html)
+
+
+IMAGE_SIZE_PARAMS = frozenset(("width", "height", "crop", "format", "quality", "pad_color"))
+IMAGE_SIZE_SUFFIX_RE = re.compile(r"_(?:\d+x\d*|\d*x\d+)(?:_crop_[a-z]+)?(?:@\dx)?(?=\.[A-Za-z0-9]+$)")
+
+
+def _image_url_key(url):
+    """Dedupe key for an image URL that ignores CDN sizing suffixes."""
+    parsed = urlparse(url)
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if key.lower() not in IMAGE_SIZE_PARAMS
+    ]
+    path = IMAGE_SIZE_SUFFIX_RE.sub("", parsed.path)
+    return parsed._replace(path=path, query=urlencode(query)).geturl()
+
+
+def _items_from_candidates(candidates, limit):
+    """Convert candidates to items until ``limit`` distinct images; returns ``(items, scanned)``."""
+    items = []
+    seen = set()
+    scanned = 0
+    for candidate in candidates:
+        scanned += 1
+        item = _candidate_to_item(candidate)
+        if not item:
+            continue
+        key = _image_url_key(item["imageUrl"])
+        if key in seen:
+            continue
+        seen.add(key)
+        items.append(item)
+        if len(items) >= limit:
+            break
+    return items, scanned
+
+
 def _candidate_to_item(candidate):
     if not isinstance(candidate, dict):
         return None
@@ -322,163 +455,190 @@ def _candidate_to_item(candidate):
         "store": store,
         "productUrl": product_url,
         "imageUrl": image_url,
+        "productType": product_type,
         "category": category,
+        "categoryVersion": _category_matcher()["version"],
         "status": "queued",
     }
 
 
-def _fetch_shop_search_html_browser(query):
+BROWSER_CANDIDATES_SCRIPT = """() => {
+    const results = [];
+    const seen = new Set();
+    const anchors = Array.from(document.querySelectorAll('a[href]'));
+    for (const a of anchors) {
+        const href = a.getAttribute('href');
+        if (!href) continue;
+        const absolute = new URL(href, window.location.href).href;
+        if (!absolute.includes('/products') && !absolute.includes('/product')) continue;
+        const img = a.querySelector('img');
+        const imageUrl = img?.currentSrc || img?.src || img?.getAttribute('src') || img?.getAttribute('data-src');
+        const titleEl = a.querySelector('h3, h2, [data-testid*="title"], [data-testid*="product"], [class*="title"]');
+        const rawTitle = titleEl?.textContent || img?.alt || a.getAttribute('aria-label') || a.textContent || '';
+        const title = rawTitle.trim();
+        if (!title || !imageUrl) continue;
+        if (seen.has(imageUrl)) continue;
+        seen.add(imageUrl);
+        results.push({ title, imageUrl, productUrl: absolute });
+    }
+    return results;
+}"""
+
+
+async def _browser_fetch_async(url, timeout_ms):
+    slots = BROWSER_POOL["slots"]
+    slot = await slots.get()
+    healthy = False
+    try:
+        page = await _browser_slot_page(slot)
+        response = await page.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
+        slot["navigations"] += 1
+        BROWSER_POOL["navigations"] += 1
+        try:
+            await page.wait_for_load_state("networkidle", timeout=timeout_ms)
+        except Exception:
+            pass
+        try:
+            await page.wait_for_timeout(2000)
+        except Exception:
+            pass
+        html = await page.content()
+        if "Verifying your connection" in html:
+            await page.wait_for_timeout(4000)
+            html = await page.content()
+        try:
+            browser_candidates = await page.evaluate(BROWSER_CANDIDATES_SCRIPT)
+        except Exception:
+            browser_candidates = []
+        meta = {
+            "status": response.status if response else None,
+            "url": page.url,
+            "contentType": "text/html",
+            "length": len(html),
+            "slot": slot["index"],
+        }
+        healthy = True
+        return html, meta, browser_candidates
+    finally:
+        if not healthy or slot["navigations"] >= max(SHOP_BROWSER_MAX_NAVIGATIONS, 1):
+            BROWSER_POOL["recycles"] += 1
+            await _browser_reset_slot(slot)
+        slots.put_nowait(slot)
+
+
+async def _fetch_shop_search_html_browser_async(query):
     try:
-        from playwright.sync_api import sync_playwright
+        import playwright.async_api  # noqa: F401
     except Exception as exc:
         return None, {"error": f"playwright not installed: {exc}"}, []
     if not query:
         return None, {"error": "missing query"}, []
     url = f"{SHOP_SEARCH_URL}{quote_plus(query)}"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0 Safari/537.36",
-        "Accept-Language": "en-US,en;q=0.9",
-    }
     timeout_ms = SHOP_PLAYWRIGHT_TIMEOUT * 1000
-    html = ""
     meta = {"source": "playwright"}
-    browser_candidates = []
     try:
-        with sync_playwright() as playwright:
-            browser = playwright.chromium.launch(headless=True)
-            context = browser.new_context(user_agent=headers["User-Agent"], locale="en-US")
-            page = context.new_page()
-            response = page.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
-            try:
-                page.wait_for_load_state("networkidle", timeout=timeout_ms)
-            except Exception:
-                pass
-            try:
-                page.wait_for_timeout(2000)
-            except Exception:
-                pass
-            html = page.content()
-            if "Verifying your connection" in html:
-                page.wait_for_timeout(4000)
-                html = page.content()
-            try:
-                browser_candidates = page.evaluate(
-                    """() => {
-                        const results = [];
-                        const seen = new Set();
-                        const anchors = Array.from(document.querySelectorAll('a[href]'));
-                        for (const a of anchors) {
-                            const href = a.getAttribute('href');
-                            if (!href) continue;
-                            const absolute = new URL(href, window.location.href).href;
-                            if (!absolute.includes('/products') && !absolute.includes('/product')) continue;
-                            const img = a.querySelector('img');
-                            const imageUrl = img?.currentSrc || img?.src || img?.getAttribute('src') || img?.getAttribute('data-src');
-                            const titleEl = a.querySelector('h3, h2, [data-testid*="title"], [data-testid*="product"], [class*="title"]');
-                            const rawTitle = titleEl?.textContent || img?.alt || a.getAttribute('aria-label') || a.textContent || '';
-                            const title = rawTitle.trim();
-                            if (!title || !imageUrl) continue;
-                            if (seen.has(imageUrl)) continue;
-                            seen.add(imageUrl);
-                            results.push({ title, imageUrl, productUrl: absolute });
-                        }
-                        return results;
-                    }"""
-                )
-            except Exception:
-                browser_candidates = []
-            meta.update(
-                {
-                    "status": response.status if response else None,
-                    "url": page.url,
-                    "contentType": "text/html",
-                    "length": len(html),
-                }
+        with _span("search.browser"):
+            html, page_meta, browser_candidates = await asyncio.wait_for(
+                _browser_fetch_async(url, timeout_ms), SHOP_PLAYWRIGHT_TIMEOUT * 2 + 15
             )
-            browser.close()
     except Exception as exc:
-        meta["error"] = str(exc)
+        meta["error"] = str(exc) or exc.__class__.__name__
+        return "", meta, []
+    if html and "Verifying your connection" in html:
+        _count("shop_impress_cloudflare_blocks_total", source="playwright")
+    meta.update(page_meta)
     return html, meta, browser_candidates
 
 
-def _fetch_shop_search_html(query):
+def _fetch_shop_search_html_browser(query):
+    try:
+        return _upstream_run(_fetch_shop_search_html_browser_async(query))
+    except Exception as exc:
+        return "", {"source": "playwright", "error": str(exc) or exc.__class__.__name__}, []
+
+
+SHOP_SEARCH_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/122.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+
+async def _fetch_shop_search_html_async(query):
     if not query:
         return None, None
     url = f"{SHOP_SEARCH_URL}{quote_plus(query)}"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/122.0 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.9",
+    with _span("search.fetch"):
+        async with _upstream_stream("GET", url, SHOP_SEARCH_TIMEOUT, headers=SHOP_SEARCH_HEADERS) as resp:
+            await resp.aread()
+            html = resp.text
+    meta = {
+        "status": resp.status_code,
+        "url": str(resp.url),
+        "contentType": resp.headers.get("content-type"),
+        "length": len(html),
+        "source": "http",
     }
-    resp = _request_get(
-        url,
-        headers=headers,
-        timeout=SHOP_SEARCH_TIMEOUT,
-        allow_redirects=True,
-    )
+    return html, meta
+
+
+def _fetch_shop_search_html(query):
+    if not query:
+        return None, None
+    url = f"{SHOP_SEARCH_URL}{quote_plus(query)}"
+    with _span("search.fetch"):
+        resp = _request_get(
+            url,
+            headers=SHOP_SEARCH_HEADERS,
+            timeout=SHOP_SEARCH_TIMEOUT,
+            allow_redirects=True,
+        )
+        html = resp.text
     meta = {
         "status": resp.status_code,
         "url": resp.url,
         "contentType": resp.headers.get("content-type"),
-        "length": len(resp.text),
+        "length": len(html),
         "source": "http",
     }
-    return resp.text, meta
+    return html, meta
 
 
-def _search_shop_products(query, limit, debug=False):
-    try:
-        html, meta = _fetch_shop_search_html(query)
-    except Exception as exc:
-        if debug:
-            return [], {"error": str(exc)}
-        return []
+def _search_http_outcome(html, meta, debug):
+    """Return ``(outcome, meta)`` where outcome is ``"parse"``, ``"browser"`` or ``"fail"``."""
     if not html:
-        if debug:
-            return [], {"error": "empty response"}
-        return []
-    browser_candidates = []
+        return "fail", {"error": "empty response"}
     blocked = "Verifying your connection" in html
+    if blocked:
+        _count("shop_impress_cloudflare_blocks_total", source="http")
     if meta and meta.get("status", 200) >= 400:
         if debug:
             if blocked:
                 meta["block"] = "cloudflare"
             meta["error"] = f"HTTP {meta['status']}"
-        if SHOP_USE_PLAYWRIGHT:
-            html, meta, browser_candidates = _fetch_shop_search_html_browser(query)
-            blocked = "Verifying your connection" in html if html else False
-        else:
-            return [], meta if debug else []
+        return ("browser" if SHOP_USE_PLAYWRIGHT else "fail"), meta
     if blocked and SHOP_USE_PLAYWRIGHT:
-        html, meta, browser_candidates = _fetch_shop_search_html_browser(query)
-        blocked = "Verifying your connection" in html if html else False
+        return "browser", meta
+    return "parse", meta
+
+
+def _search_items_from_html(html, meta, browser_candidates, limit, debug):
     if not html:
         if debug:
             return [], meta or {"error": "empty response"}
         return []
-    if debug and meta and blocked:
+    if debug and meta and "Verifying your connection" in html:
         meta["block"] = "cloudflare"
-    if browser_candidates:
-        candidates = browser_candidates
-    else:
-        candidates = _parse_shop_search_html(html)
-    items = []
-    seen = set()
-    for candidate in candidates:
-        item = _candidate_to_item(candidate)
-        if not item:
-            continue
-        key = item["imageUrl"]
-        if key in seen:
-            continue
-        seen.add(key)
-        items.append(item)
-        if len(items) >= limit:
-            break
+    with _span("search.parse"):
+        if browser_candidates:
+            candidates = browser_candidates
+        else:
+            candidates = _extract_shop_candidates(html)
+        items, scanned = _items_from_candidates(candidates, limit)
     if debug:
         if meta is None:
             meta = {}
-        meta["candidates"] = len(candidates)
+        meta["candidates"] = scanned
         meta["items"] = len(items)
         if browser_candidates:
             meta["browserCandidates"] = len(browser_candidates)
@@ -486,22 +646,550 @@ def _search_shop_products(query, limit, debug=False):
     return items
 
 
+# Header probes keyed by image URL, oldest first; failures expire after RANK_PROBE_FAILURE_TTL.
+PROBE_CACHE = {
+    "lock": threading.Lock(),
+    "entries": OrderedDict(),
+    "stats": {"hits": 0, "misses": 0, "probes": 0, "errors": 0, "timeouts": 0},
+}
+PROBE_EXECUTOR = ThreadPoolExecutor(max_workers=max(RANK_PROBE_WORKERS, 1), thread_name_prefix="probe")
+PROBE_FORMATS = {"JPEG", "PNG", "WEBP", "AVIF"}
+
+
+def _rank_pool_size(limit):
+    """How many candidates to convert so ranking has something to choose between."""
+    if not SEARCH_RANK:
+        return limit
+    return max(min(limit * max(SEARCH_RANK_POOL_FACTOR, 1), SEARCH_RANK_MAX_CANDIDATES), limit)
+
+
+def _probe_cache_get(url):
+    with PROBE_CACHE["lock"]:
+        cached = PROBE_CACHE["entries"].get(url)
+        if cached is not None:
+            stored_at, probe = cached
+            if "error" not in probe or time.time() - stored_at < RANK_PROBE_FAILURE_TTL:
+                PROBE_CACHE["entries"].move_to_end(url)
+                PROBE_CACHE["stats"]["hits"] += 1
+                return probe
+            del PROBE_CACHE["entries"][url]
+        PROBE_CACHE["stats"]["misses"] += 1
+        return None
+
+
+def _probe_cache_put(url, probe):
+    with PROBE_CACHE["lock"]:
+        PROBE_CACHE["stats"]["probes"] += 1
+        if "error" in probe:
+            PROBE_CACHE["stats"]["errors"] += 1
+        PROBE_CACHE["entries"][url] = (time.time(), probe)
+        PROBE_CACHE["entries"].move_to_end(url)
+        while len(PROBE_CACHE["entries"]) > max(RANK_PROBE_CACHE_SIZE, 1):
+            PROBE_CACHE["entries"].popitem(last=False)
+
+
+def _probe_total_bytes(status, headers):
+    """Full size of the image from a ranged (206) or plain (200) response, if given."""
+    if status == 206:
+        total = (headers.get("content-range") or "").rpartition("/")[2]
+    else:
+        total = headers.get("content-length") or ""
+    return int(total) if total.isdigit() else None
+
+
+def _probe_header(data, total):
+    with Image.open(io.BytesIO(data)) as image:
+        probe = {"width": image.width, "height": image.height, "format": image.format}
+    if total:
+        probe["bytes"] = total
+    return probe
+
+
+def _probe_image(url):
+    """Return the dimensions and format of ``url`` from its first bytes; never raises."""
+    data = bytearray()
+    try:
+        with _span("search.probe"):
+            resp = _request_get(
+                url,
+                headers={"Range": f"bytes=0-{RANK_PROBE_BYTES - 1}"},
+                timeout=RANK_PROBE_TIMEOUT,
+                stream=True,
+            )
+            try:
+                resp.raise_for_status()
+                for chunk in resp.iter_content(chunk_size=8192):
+                    data += chunk
+                    if len(data) >= RANK_PROBE_BYTES:
+                        break
+                total = _probe_total_bytes(resp.status_code, resp.headers)
+            finally:
+                resp.close()
+        probe = _probe_header(bytes(data), total)
+    except Exception as exc:
+        probe = {"error": str(exc) or exc.__class__.__name__}
+    _probe_cache_put(url, probe)
+    return probe
+
+
+async def _probe_image_async(url):
+    data = bytearray()
+    try:
+        with _span("search.probe"):
+            async with _upstream_stream(
+                "GET", url, RANK_PROBE_TIMEOUT, headers={"Range": f"bytes=0-{RANK_PROBE_BYTES - 1}"}
+            ) as resp:
+                resp.raise_for_status()
+                async for chunk in resp.aiter_bytes(8192):
+                    data += chunk
+                    if len(data) >= RANK_PROBE_BYTES:
+                        break
+                total = _probe_total_bytes(resp.status_code, resp.headers)
+        probe = _probe_header(bytes(data), total)
+    except Exception as exc:
+        probe = {"error": str(exc) or exc.__class__.__name__}
+    _probe_cache_put(url, probe)
+    return probe
+
+
+def _rank_score(probe, position, count):
+    """Score one candidate; higher is better. Unknown images land between good and bad ones."""
+    score = -RANK_POSITION_WEIGHT * position / max(count, 1)
+    if not probe or "error" in probe:
+        return score + 0.5
+    width, height = probe["width"], probe["height"]
+    short_side = min(width, height)
+    if short_side <= 0:
+        return score - 2.0
+    score += min(short_side / max(RANK_TARGET_SIDE, 1), 1.0)
+    if short_side < RANK_MIN_SIDE:
+        score -= 1.0
+    if not RANK_MIN_ASPECT <= width / height <= RANK_MAX_ASPECT:
+        score -= 1.0
+    if probe.get("format") not in PROBE_FORMATS:
+        score -= 0.5
+    return score
+
+
+def _rank_select(items, probes, limit, meta, started):
+    scored = sorted(
+        range(len(items)),
+        key=lambda index: -_rank_score(probes.get(items[index]["imageUrl"]), index, len(items)),
+    )
+    ranked = [items[index] for index in scored[:limit]]
+    if meta is not None:
+        known = sum(1 for item in items if "error" not in probes.get(item["imageUrl"], {"error": None}))
+        meta["items"] = len(ranked)
+        meta["ranking"] = {
+            "candidates": len(items),
+            "probed": known,
+            "unknown": len(items) - known,
+            "reordered": sum(1 for position, index in enumerate(scored[:limit]) if position != index),
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+    return ranked
+
+
+def _rank_pending(items):
+    """Split candidate image URLs into cached probes and URLs still to probe."""
+    probes = {}
+    pending = []
+    for item in items:
+        url = item["imageUrl"]
+        if url in probes or url in pending:
+            continue
+        cached = _probe_cache_get(url)
+        if cached is None:
+            pending.append(url)
+        else:
+            probes[url] = cached
+    return probes, pending
+
+
+def _rank_items(items, limit, meta=None):
+    """Pick the best ``limit`` of ``items`` by probed image headers, keeping search order as tiebreak."""
+    if not SEARCH_RANK or len(items) <= limit:
+        return items[:limit]
+    started = time.perf_counter()
+    with _span("search.rank"):
+        probes, pending = _rank_pending(items)
+        if pending:
+            futures = {
+                PROBE_EXECUTOR.submit(contextvars.copy_context().run, _probe_image, url): url for url in pending
+            }
+            done, not_done = wait(futures, timeout=RANK_PROBE_BUDGET)
+            for future in done:
+                probes[futures[future]] = future.result()
+            if not_done:
+                with PROBE_CACHE["lock"]:
+                    PROBE_CACHE["stats"]["timeouts"] += len(not_done)
+        return _rank_select(items, probes, limit, meta, started)
+
+
+async def _rank_items_async(items, limit, meta=None):
+    if not SEARCH_RANK or len(items) <= limit:
+        return items[:limit]
+    started = time.perf_counter()
+    with _span("search.rank"):
+        probes, pending = _rank_pending(items)
+        if pending:
+            tasks = {asyncio.ensure_future(_probe_image_async(url)): url for url in pending}
+            done, not_done = await asyncio.wait(tasks, timeout=RANK_PROBE_BUDGET)
+            for task in done:
+                probes[tasks[task]] = task.result()
+            for task in not_done:
+                task.cancel()
+            if not_done:
+                with PROBE_CACHE["lock"]:
+                    PROBE_CACHE["stats"]["timeouts"] += len(not_done)
+        return _rank_select(items, probes, limit, meta, started)
+
+
+def _probe_cache_stats():
+    with PROBE_CACHE["lock"]:
+        return dict(PROBE_CACHE["stats"], entries=len(PROBE_CACHE["entries"]))
+
+
+def _search_shop_products_uncached(query, limit, debug=False):
+    try:
+        html, meta = _fetch_shop_search_html(query)
+    except Exception as exc:
+        if debug:
+            return [], {"error": str(exc)}
+        return []
+    browser_candidates = []
+    outcome, meta = _search_http_outcome(html, meta, debug)
+    if outcome == "fail":
+        return ([], meta) if debug else []
+    if outcome == "browser":
+        html, meta, browser_candidates = _fetch_shop_search_html_browser(query)
+    items, meta = _search_items_from_html(html, meta, browser_candidates, _rank_pool_size(limit), True)
+    items = _rank_items(items, limit, meta if debug else None)
+    return (items, meta) if debug else items
+
+
+async def _search_shop_products_uncached_async(query, limit, debug=False):
+    try:
+        html, meta = await _fetch_shop_search_html_async(query)
+    except Exception as exc:
+        if debug:
+            return [], {"error": str(exc) or exc.__class__.__name__}
+        return []
+    browser_candidates = []
+    outcome, meta = _search_http_outcome(html, meta, debug)
+    if outcome == "fail":
+        return ([], meta) if debug else []
+    if outcome == "browser":
+        html, meta, browser_candidates = await _fetch_shop_search_html_browser_async(query)
+    items, meta = _search_items_from_html(html, meta, browser_candidates, _rank_pool_size(limit), True)
+    items = await _rank_items_async(items, limit, meta if debug else None)
+    return (items, meta) if debug else items
+
+
+SEARCH_CACHE = OrderedDict()
+SEARCH_CACHE_LOCK = threading.Lock()
+SEARCH_INFLIGHT = {}
+SEARCH_CACHE_STATS = {"hits": 0, "misses": 0, "stale": 0, "coalesced": 0, "diskHits": 0, "refreshes": 0}
+
+
+def _normalize_search_query(query):
+    return " ".join((query or "").lower().split())
+
+
+def _search_cache_key(query, limit):
+    return (_normalize_search_query(query), int(limit))
+
+
+def _search_cache_path(key):
+    digest = hashlib.sha256(f"{key[0]}|{key[1]}".encode("utf-8")).hexdigest()[:24]
+    return os.path.join(SEARCH_CACHE_DIR, f"{digest}.json")
+
+
+def _search_cache_store(key, entry):
+    # Caller holds SEARCH_CACHE_LOCK.
+    SEARCH_CACHE[key] = entry
+    SEARCH_CACHE.move_to_end(key)
+    while len(SEARCH_CACHE) > max(SEARCH_CACHE_MAX_ENTRIES, 1):
+        SEARCH_CACHE.popitem(last=False)
+
+
+def _search_cache_lookup(key):
+    with SEARCH_CACHE_LOCK:
+        entry = SEARCH_CACHE.get(key)
+        if entry is not None:
+            SEARCH_CACHE.move_to_end(key)
+            return entry
+    if not SEARCH_CACHE_DISK:
+        return None
+    try:
+        entry = _load_json(_search_cache_path(key), None)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict) or entry.get("query") != key[0] or entry.get("limit") != key[1]:
+        return None
+    with SEARCH_CACHE_LOCK:
+        current = SEARCH_CACHE.get(key)
+        if current is not None and current["fetchedAt"] >= entry.get("fetchedAt", 0):
+            return current
+        SEARCH_CACHE_STATS["diskHits"] += 1
+        _search_cache_store(key, entry)
+    return entry
+
+
+def _search_cache_check(key):
+    """Look ``key`` up and classify it as a fresh ``"hit"``, a ``"stale"`` hit or a ``"miss"``."""
+    entry = _search_cache_lookup(key)
+    age = time.time() - entry["fetchedAt"] if entry else None
+    with SEARCH_CACHE_LOCK:
+        if entry and age < SEARCH_CACHE_TTL:
+            SEARCH_CACHE_STATS["hits"] += 1
+            return entry, "hit"
+        if entry and age < SEARCH_CACHE_TTL + SEARCH_CACHE_STALE_TTL:
+            SEARCH_CACHE_STATS["stale"] += 1
+            return entry, "stale"
+        SEARCH_CACHE_STATS["misses"] += 1
+    return None, "miss"
+
+
+def _search_cache_join(key):
+    # Returns (flight, leader); only the leader searches upstream.
+    with SEARCH_CACHE_LOCK:
+        flight = SEARCH_INFLIGHT.get(key)
+        if flight is not None:
+            SEARCH_CACHE_STATS["coalesced"] += 1
+            return flight, False
+        flight = Future()
+        SEARCH_INFLIGHT[key] = flight
+    return flight, True
+
+
+def _search_cache_settle(key, flight, items, meta):
+    entry = None
+    try:
+        if items:
+            entry = {
+                "query": key[0],
+                "limit": key[1],
+                "fetchedAt": time.time(),
+                "items": items,
+                "meta": meta,
+            }
+            with SEARCH_CACHE_LOCK:
+                _search_cache_store(key, entry)
+            if SEARCH_CACHE_DISK:
+                try:
+                    _save_json_atomic(_search_cache_path(key), entry)
+                except OSError:
+                    pass
+    finally:
+        with SEARCH_CACHE_LOCK:
+            SEARCH_INFLIGHT.pop(key, None)
+        flight.set_result((entry, meta))
+    return entry
+
+
+def _search_cache_fetch(key, query, limit):
+    """Run one upstream search for ``key``; concurrent callers share the result."""
+    flight, leader = _search_cache_join(key)
+    if not leader:
+        entry, meta = flight.result()
+        return entry, meta, "coalesced"
+
+    items, meta = [], None
+    try:
+        items, meta = _search_shop_products_uncached(query, limit, debug=True)
+    except Exception as exc:
+        meta = {"error": str(exc)}
+    finally:
+        entry = _search_cache_settle(key, flight, items, meta)
+    return entry, meta, "miss"
+
+
+async def _search_cache_fetch_async(key, query, limit):
+    flight, leader = _search_cache_join(key)
+    if not leader:
+        entry, meta = await asyncio.wrap_future(flight)
+        return entry, meta, "coalesced"
+
+    items, meta = [], None
+    try:
+        items, meta = await _search_shop_products_uncached_async(query, limit, debug=True)
+    except Exception as exc:
+        meta = {"error": str(exc)}
+    finally:
+        # Also runs on cancellation so waiters on the flight are never stranded.
+        entry = _search_cache_settle(key, flight, items, meta)
+    return entry, meta, "miss"
+
+
+def _search_cache_refresh(key, query, limit):
+    with SEARCH_CACHE_LOCK:
+        if key in SEARCH_INFLIGHT:
+            return
+        SEARCH_CACHE_STATS["refreshes"] += 1
+    if _upstream_async_enabled() and _browser_worker_start():
+        _upstream_submit(_search_cache_fetch_async(key, query, limit))
+        return
+    thread = threading.Thread(target=_search_cache_fetch, args=(key, query, limit), daemon=True)
+    thread.start()
+
+
+def _search_cache_stats():
+    with SEARCH_CACHE_LOCK:
+        stats = dict(SEARCH_CACHE_STATS)
+        stats["entries"] = len(SEARCH_CACHE)
+    return stats
+
+
+def _search_cache_result(entry, meta, status, debug):
+    # Callers mutate returned items (category, status), so never hand out cached dicts.
+    items = deepcopy(entry["items"]) if entry else []
+    if not debug:
+        return items
+    if entry:
+        meta = deepcopy(entry.get("meta")) or {}
+    meta = meta or {"error": "empty response"}
+    meta["cache"] = dict(_search_cache_stats(), status=status)
+    if entry and entry.get("fetchedAt"):
+        meta["cache"]["age"] = round(time.time() - entry["fetchedAt"], 3)
+    if _upstream_async_enabled():
+        meta["upstream"] = _upstream_stats()
+    return items, meta
+
+
+def _search_shop_products(query, limit, debug=False):
+    if _upstream_async_enabled() and _browser_worker_start():
+        return _upstream_run(_search_shop_products_async(query, limit, debug))
+    key = _search_cache_key(query, limit)
+    if SEARCH_CACHE_TTL > 0 and key[0]:
+        entry, status = _search_cache_check(key)
+        meta = None
+        if status == "stale":
+            _search_cache_refresh(key, query, limit)
+        if entry is None:
+            entry, meta, status = _search_cache_fetch(key, query, limit)
+    else:
+        items, meta = _search_shop_products_uncached(query, limit, debug=True)
+        entry = {"items": items, "meta": meta} if items else None
+        status = "miss"
+    return _search_cache_result(entry, meta, status, debug)
+
+
+async def _search_shop_products_async(query, limit, debug=False):
+    key = _search_cache_key(query, limit)
+    if SEARCH_CACHE_TTL > 0 and key[0]:
+        entry, status = _search_cache_check(key)
+        meta = None
+        if status == "stale":
+            _search_cache_refresh(key, query, limit)
+        if entry is None:
+            entry, meta, status = await _search_cache_fetch_async(key, query, limit)
+    else:
+        items, meta = await _search_shop_products_uncached_async(query, limit, debug=True)
+        entry = {"items": items, "meta": meta} if items else None
+        status = "miss"
+    return _search_cache_result(entry, meta, status, debug)
+
+
 def _fal_headers():
     if not FAL_API_KEY:
         raise RuntimeError("FAI.AI_API_KEY is not set.")
     return {"Authorization": f"{FAL_AUTH_SCHEME} {FAL_API_KEY}"}
 
 
-def _fal_post(endpoint, payload):
-    response = _request_post(
-        endpoint,
-        headers=_fal_headers(),
-        json=payload,
-        timeout=120,
-    )
-    if not response.ok:
-        raise RuntimeError(f"fal error {response.status_code}: {response.text}")
-    return response.json()
+def _fal_request(payload, stats):
+    body = json.dumps(payload).encode("utf-8")
+    if stats is not None:
+        stats["payloadBytes"] = len(body)
+    headers = _fal_headers()
+    headers["Content-Type"] = "application/json"
+    return body, headers
+
+
+# A 429 pushes a process-wide cooldown so every fal caller backs off together.
+FAL_THROTTLE = {"lock": threading.Lock(), "until": 0.0}
+
+
+def _parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - time.time(), 0.0)
+
+
+def _fal_cooldown_remaining():
+    with FAL_THROTTLE["lock"]:
+        return FAL_THROTTLE["until"] - time.time()
+
+
+def _fal_retry_delay(status, retry_after, attempt, stats):
+    """Seconds to wait before retrying a failed fal call, or None to give up."""
+    if status != 429 and status < 500:
+        return None
+    if attempt >= FAL_MAX_RETRIES:
+        return None
+    delay = _parse_retry_after(retry_after)
+    if delay is None:
+        delay = FAL_BACKOFF_BASE * (2 ** attempt)
+    delay = min(delay, FAL_BACKOFF_MAX) * random.uniform(1.0, 1.5)
+    if status == 429:
+        with FAL_THROTTLE["lock"]:
+            FAL_THROTTLE["until"] = max(FAL_THROTTLE["until"], time.time() + delay)
+    if stats is not None:
+        stats["falRetries"] = stats.get("falRetries", 0) + 1
+        if status == 429:
+            stats["falThrottled"] = stats.get("falThrottled", 0) + 1
+    _count("shop_impress_fal_retries_total", status=status)
+    return delay
+
+
+def _fal_post(endpoint, payload, stats=None):
+    body, headers = _fal_request(payload, stats)
+    attempt = 0
+    while True:
+        cooldown = _fal_cooldown_remaining()
+        if cooldown > 0:
+            time.sleep(cooldown)
+        with _span("render.fal"):
+            response = _request_post(
+                endpoint,
+                headers=headers,
+                data=body,
+                timeout=120,
+            )
+        if response.ok:
+            return response.json()
+        delay = _fal_retry_delay(response.status_code, response.headers.get("Retry-After"), attempt, stats)
+        if delay is None:
+            raise RuntimeError(f"fal error {response.status_code}: {response.text}")
+        time.sleep(delay)
+        attempt += 1
+
+
+async def _fal_post_async(endpoint, payload, stats=None):
+    body, headers = _fal_request(payload, stats)
+    attempt = 0
+    while True:
+        cooldown = _fal_cooldown_remaining()
+        if cooldown > 0:
+            await asyncio.sleep(cooldown)
+        with _span("render.fal"):
+            async with _upstream_stream("POST", endpoint, 120, headers=headers, content=body) as response:
+                await response.aread()
+        if response.is_success:
+            return response.json()
+        delay = _fal_retry_delay(response.status_code, response.headers.get("Retry-After"), attempt, stats)
+        if delay is None:
+            raise RuntimeError(f"fal error {response.status_code}: {response.text}")
+        await asyncio.sleep(delay)
+        attempt += 1
 
 
 def _extract_image_url(data):
@@ -531,38 +1219,246 @@ def _public_to_local_path(public_url):
     if public_url.startswith("http://") or public_url.startswith("https://"):
         return None
     if public_url.startswith("/"):
-        return os.path.join(ROOT_DIR, "frontend", "public", public_url.lstrip("/"))
+        return os.path.join(PUBLIC_DIR, public_url.lstrip("/"))
     return None
 
 
 def _download_remote_image(url, path):
-    resp = _request_get(url, stream=True, timeout=40)
-    resp.raise_for_status()
+    with _span("render.download"):
+        resp = _request_get(url, stream=True, timeout=40)
+        resp.raise_for_status()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.part"
+        try:
+            with open(tmp_path, "wb") as handle:
+                for chunk in resp.iter_content(chunk_size=1024 * 1024):
+                    if chunk:
+                        handle.write(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+async def _download_remote_image_async(url, path):
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "wb") as handle:
-        for chunk in resp.iter_content(chunk_size=1024 * 1024):
-            if chunk:
-                handle.write(chunk)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    try:
+        with _span("render.download"), os.fdopen(fd, "wb") as handle:
+            async with _upstream_stream("GET", url, 40) as resp:
+                resp.raise_for_status()
+                async for chunk in resp.aiter_bytes(1024 * 1024):
+                    handle.write(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Cached PIL images are shared between renders and must not be mutated.
+IMAGE_CACHE_LOCK = threading.Lock()
+IMAGE_CACHE = OrderedDict()
+IMAGE_CACHE_STATS = {"bytes": 0, "hits": 0, "misses": 0, "evictions": 0}
+
+
+def _image_cache_get(key):
+    with IMAGE_CACHE_LOCK:
+        entry = IMAGE_CACHE.get(key)
+        if entry is None:
+            IMAGE_CACHE_STATS["misses"] += 1
+            return None
+        IMAGE_CACHE.move_to_end(key)
+        IMAGE_CACHE_STATS["hits"] += 1
+        return entry[0]
+
+
+def _image_cache_put(key, value, size):
+    if size > IMAGE_CACHE_MAX_BYTES:
+        return value
+    with IMAGE_CACHE_LOCK:
+        previous = IMAGE_CACHE.pop(key, None)
+        if previous is not None:
+            IMAGE_CACHE_STATS["bytes"] -= previous[1]
+        IMAGE_CACHE[key] = (value, size)
+        IMAGE_CACHE_STATS["bytes"] += size
+        while IMAGE_CACHE_STATS["bytes"] > IMAGE_CACHE_MAX_BYTES and IMAGE_CACHE:
+            _, (_, old_size) = IMAGE_CACHE.popitem(last=False)
+            IMAGE_CACHE_STATS["bytes"] -= old_size
+            IMAGE_CACHE_STATS["evictions"] += 1
+    return value
 
 
-def _load_image_from_source(source):
-    if not source:
-        raise ValueError("Missing image source.")
+def _image_cache_stats():
+    with IMAGE_CACHE_LOCK:
+        return dict(IMAGE_CACHE_STATS, entries=len(IMAGE_CACHE))
+
+
+def _local_source_path(source):
     local_path = _public_to_local_path(source)
     if local_path and os.path.isfile(local_path):
-        return Image.open(local_path).convert("RGBA")
+        return local_path
     if os.path.isfile(source):
-        return Image.open(source).convert("RGBA")
-    resp = _request_get(source, stream=True, timeout=30)
-    resp.raise_for_status()
-    return Image.open(io.BytesIO(resp.content)).convert("RGBA")
+        return source
+    return None
 
 
-def _image_to_data_uri(image):
-    buffer = io.BytesIO()
-    image.save(buffer, format="PNG")
-    encoded = base64.b64encode(buffer.getvalue()).decode("ascii")
-    return f"data:image/png;base64,{encoded}"
+def _load_source(source):
+    """Return ``(bytes, sha256)`` for a public path, local path or URL."""
+    if not source:
+        raise ValueError("Missing image source.")
+    local_path = _local_source_path(source)
+    if local_path:
+        stat = os.stat(local_path)
+        key = ("source", local_path, stat.st_mtime_ns, stat.st_size)
+        cached = _image_cache_get(key)
+        if cached is not None:
+            return cached
+        with open(local_path, "rb") as handle:
+            data = handle.read()
+        loaded = (data, hashlib.sha256(data).hexdigest())
+        return _image_cache_put(key, loaded, len(data))
+    resp = _request_get(source, timeout=30)
+    resp.raise_for_status()
+    data = resp.content
+    return data, hashlib.sha256(data).hexdigest()
+
+
+def _image_nbytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+def _decoded_image(loaded):
+    data, sha = loaded
+    key = ("decoded", sha)
+    image = _image_cache_get(key)
+    if image is None:
+        with _span("render.decode"):
+            image = Image.open(io.BytesIO(data)).convert("RGBA")
+        _image_cache_put(key, image, _image_nbytes(image))
+    return image
+
+
+def _resized_image(loaded, height):
+    key = ("resized", loaded[1], height)
+    image = _image_cache_get(key)
+    if image is None:
+        decoded = _decoded_image(loaded)
+        with _span("render.resize"):
+            image = _resize_to_height(decoded, height)
+        _image_cache_put(key, image, _image_nbytes(image))
+    return image
+
+
+PAYLOAD_MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+PAYLOAD_EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp"}
+
+
+def _payload_settings():
+    return (FAL_PAYLOAD_FORMAT, FAL_PAYLOAD_QUALITY, FAL_PAYLOAD_MAX_BYTES, FAL_PAYLOAD_MIN_HEIGHT)
+
+
+def _has_transparency(image):
+    if image.mode not in ("RGBA", "LA"):
+        return False
+    return image.getextrema()[-1][0] < 255
+
+
+def _encode_image(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == "png":
+        image.save(buffer, format="PNG")
+    elif fmt == "webp":
+        image.save(buffer, format="WEBP", quality=FAL_PAYLOAD_QUALITY, method=4)
+    else:
+        image.convert("RGB").save(buffer, format="JPEG", quality=FAL_PAYLOAD_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def _encode_payload_image(image):
+    """Return ``(bytes, mime)`` for ``image``, downscaled to fit FAL_PAYLOAD_MAX_BYTES."""
+    has_alpha = _has_transparency(image)
+    fmt = FAL_PAYLOAD_FORMAT if FAL_PAYLOAD_FORMAT in PAYLOAD_MIME_TYPES else "auto"
+    if fmt == "auto":
+        fmt = "png" if has_alpha else "jpeg"
+    elif fmt == "jpeg" and has_alpha:
+        fmt = "png"
+    min_height = min(FAL_PAYLOAD_MIN_HEIGHT, image.height)
+    while True:
+        data = _encode_image(image, fmt)
+        if FAL_PAYLOAD_MAX_BYTES <= 0 or len(data) <= FAL_PAYLOAD_MAX_BYTES or image.height <= min_height:
+            return data, PAYLOAD_MIME_TYPES[fmt]
+        scale = min(max((FAL_PAYLOAD_MAX_BYTES / len(data)) ** 0.5 * 0.95, 0.5), 0.9)
+        image = _resize_to_height(image, max(int(image.height * scale), min_height))
+
+
+def _ref_urls_enabled():
+    return FAL_USE_IMAGE_URLS and bool(FAL_REF_BASE_URL)
+
+
+def _ref_signature(name, expires):
+    message = f"{name}:{expires}".encode("utf-8")
+    return hmac.new(FAL_REF_SIGNING_KEY, message, hashlib.sha256).hexdigest()[:32]
+
+
+REFS_PRUNE = {"lastRun": 0.0}
+
+
+def _prune_staged_references():
+    now = time.time()
+    if now - REFS_PRUNE["lastRun"] < FAL_REF_TTL:
+        return
+    REFS_PRUNE["lastRun"] = now
+    cutoff = now - FAL_REF_TTL * 2
+    for name in os.listdir(REFS_DIR):
+        path = os.path.join(REFS_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            continue
+
+
+def _stage_reference(data, mime):
+    """Write encoded reference bytes under a content-hash name and return a signed URL."""
+    name = f"{hashlib.sha256(data).hexdigest()[:32]}.{PAYLOAD_EXTENSIONS[mime]}"
+    path = os.path.join(REFS_DIR, name)
+    os.makedirs(REFS_DIR, exist_ok=True)
+    if os.path.isfile(path):
+        os.utime(path)
+    else:
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as handle:
+            handle.write(data)
+        os.replace(tmp_path, path)
+    _prune_staged_references()
+    expires = int(time.time()) + FAL_REF_TTL
+    return f"{FAL_REF_BASE_URL}/api/refs/{name}?expires={expires}&sig={_ref_signature(name, expires)}"
+
+
+def _cached_reference(key, build, stats):
+    """Return a data URI or signed staged URL for the image produced by ``build()``."""
+    ref_urls = _ref_urls_enabled()
+    key = ("ref" if ref_urls else "uri",) + key + _payload_settings()
+    value = _image_cache_get(key)
+    if value is None:
+        image = build()
+        started = time.perf_counter()
+        with _span("render.encode"):
+            data, mime = _encode_payload_image(image)
+        stats["encodeMs"] = stats.get("encodeMs", 0) + round((time.perf_counter() - started) * 1000, 2)
+        if ref_urls:
+            value = (data, mime)
+            _image_cache_put(key, value, len(data))
+        else:
+            value = (f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}", mime)
+            _image_cache_put(key, value, len(value[0]))
+    else:
+        stats["cachedRefs"] = stats.get("cachedRefs", 0) + 1
+    stats.setdefault("formats", []).append(value[1])
+    stats["refMode"] = "url" if ref_urls else "inline"
+    if ref_urls:
+        return _stage_reference(*value)
+    return value[0]
 
 
 def _resize_to_height(image, height):
@@ -573,27 +1469,58 @@ def _resize_to_height(image, height):
     return image.resize((width, height), Image.LANCZOS)
 
 
-def _prepare_reference_images(avatar_path, item_source):
-    avatar = _load_image_from_source(avatar_path)
-    item = _load_image_from_source(item_source)
+def _reference_height(avatar_loaded, item_loaded):
+    avatar = _decoded_image(avatar_loaded)
+    item = _decoded_image(item_loaded)
+    return max(512, min(RENDER_REF_HEIGHT, max(avatar.height, item.height)))
+
 
-    target_height = max(512, min(RENDER_REF_HEIGHT, max(avatar.height, item.height)))
-    avatar = _resize_to_height(avatar, target_height)
-    item = _resize_to_height(item, target_height)
-    return avatar, item
+def _prepare_reference_images(avatar_loaded, item_loaded):
+    target_height = _reference_height(avatar_loaded, item_loaded)
+    return _resized_image(avatar_loaded, target_height), _resized_image(item_loaded, target_height)
 
 
-def _compose_reference_pair(avatar_path, item_source):
-    avatar, item = _prepare_reference_images(avatar_path, item_source)
+def _compose_reference_pair(avatar_loaded, item_loaded):
+    avatar, item = _prepare_reference_images(avatar_loaded, item_loaded)
     target_height = avatar.height
 
-    total_width = avatar.width + RENDER_REF_GAP + item.width
-    composite = Image.new("RGBA", (total_width, target_height), (255, 255, 255, 255))
-    composite.alpha_composite(avatar, dest=(0, 0))
-    composite.alpha_composite(item, dest=(avatar.width + RENDER_REF_GAP, 0))
+    with _span("render.compose"):
+        total_width = avatar.width + RENDER_REF_GAP + item.width
+        composite = Image.new("RGBA", (total_width, target_height), (255, 255, 255, 255))
+        composite.alpha_composite(avatar, dest=(0, 0))
+        composite.alpha_composite(item, dest=(avatar.width + RENDER_REF_GAP, 0))
     return composite
 
 
+def _reference_payload(avatar_loaded, item_loaded, use_image_urls, stats):
+    """Return the image fields of the fal payload, reusing cached encodings."""
+    target_height = _reference_height(avatar_loaded, item_loaded)
+    if use_image_urls:
+        return {
+            "image_urls": [
+                _cached_reference(
+                    (loaded[1], target_height),
+                    lambda loaded=loaded: _resized_image(loaded, target_height),
+                    stats,
+                )
+                for loaded in (avatar_loaded, item_loaded)
+            ]
+        }
+    key = ("pair", avatar_loaded[1], item_loaded[1], target_height, RENDER_REF_GAP)
+    return {"image_url": _cached_reference(key, lambda: _compose_reference_pair(avatar_loaded, item_loaded), stats)}
+
+
+def _warm_image_cache():
+    for avatar in sorted(ALLOWED_AVATARS):
+        try:
+            loaded = _load_source(_get_avatar_path(avatar))
+            decoded = _decoded_image(loaded)
+            height = max(512, min(RENDER_REF_HEIGHT, decoded.height))
+            _cached_reference((loaded[1], height), lambda: _resized_image(loaded, height), {})
+        except Exception:
+            continue
+
+
 def _get_avatar_path(avatar):
     if avatar not in ALLOWED_AVATARS:
         raise ValueError("Unknown avatar type.")
@@ -604,7 +1531,109 @@ def _get_avatar_path(avatar):
     return avatar_path
 
 
-def _render_item_on_avatar(item, avatar, base_image=None):
+# Finished renders keyed by a digest of their inputs.
+RENDER_CACHE_PREFIX = "cas_"
+RENDER_CACHE_LOCK = threading.Lock()
+RENDER_CACHE = {"index": None, "bytes": 0, "hits": 0, "misses": 0, "evictions": 0}
+
+
+def _render_inputs_digest(base_sha, item_sha, use_image_urls, use_minimal_payload):
+    digest = hashlib.sha256()
+    parts = [
+        "render-v1",
+        base_sha,
+        item_sha,
+        RENDER_INSTRUCTION,
+        FAL_IMG_ENDPOINT,
+        FAL_IMAGE_SIZE,
+        str(FAL_NUM_STEPS),
+        repr(FAL_GUIDANCE),
+        repr(FAL_STRENGTH),
+        str(RENDER_REF_HEIGHT),
+        str(RENDER_REF_GAP),
+        str(int(use_image_urls)),
+        str(int(use_minimal_payload)),
+        repr(_payload_settings()),
+    ]
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+
+def _render_cache_path(digest):
+    return os.path.join(RENDERS_DIR, f"{RENDER_CACHE_PREFIX}{digest}.png")
+
+
+def _render_cache_public(digest):
+    return f"/renders/{RENDER_CACHE_PREFIX}{digest}.png"
+
+
+def _render_cache_index():
+    # Caller holds RENDER_CACHE_LOCK.
+    if RENDER_CACHE["index"] is not None:
+        return RENDER_CACHE["index"]
+    entries = []
+    if os.path.isdir(RENDERS_DIR):
+        for name in os.listdir(RENDERS_DIR):
+            if not name.startswith(RENDER_CACHE_PREFIX) or not name.endswith(".png"):
+                continue
+            try:
+                stat = os.stat(os.path.join(RENDERS_DIR, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name[len(RENDER_CACHE_PREFIX):-4], stat.st_size))
+    index = OrderedDict()
+    for _, digest, size in sorted(entries):
+        index[digest] = size
+    RENDER_CACHE["index"] = index
+    RENDER_CACHE["bytes"] = sum(index.values())
+    return index
+
+
+def _render_cache_get(digest):
+    path = _render_cache_path(digest)
+    with RENDER_CACHE_LOCK:
+        index = _render_cache_index()
+        if digest not in index:
+            RENDER_CACHE["misses"] += 1
+            return None
+        if not os.path.isfile(path):
+            RENDER_CACHE["bytes"] -= index.pop(digest)
+            RENDER_CACHE["misses"] += 1
+            return None
+        index.move_to_end(digest)
+        RENDER_CACHE["hits"] += 1
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return _render_cache_public(digest)
+
+
+def _render_cache_put(digest):
+    size = os.path.getsize(_render_cache_path(digest))
+    evicted = []
+    with RENDER_CACHE_LOCK:
+        index = _render_cache_index()
+        RENDER_CACHE["bytes"] -= index.pop(digest, 0)
+        index[digest] = size
+        RENDER_CACHE["bytes"] += size
+        while RENDER_CACHE["bytes"] > RENDER_CACHE_MAX_BYTES and len(index) > 1:
+            old_digest, old_size = index.popitem(last=False)
+            RENDER_CACHE["bytes"] -= old_size
+            RENDER_CACHE["evictions"] += 1
+            evicted.append(old_digest)
+    for old_digest in evicted:
+        try:
+            os.remove(_render_cache_path(old_digest))
+        except OSError:
+            pass
+    return _render_cache_public(digest)
+
+
+def _prepare_render(item, avatar, base_image, stats):
+    """Return ``(digest, cached_url, payload)``; ``payload`` is None on a cache hit."""
     base_path = base_image or _get_avatar_path(avatar)
     overlay_source = item.get("previewImage") or item.get("imageUrl")
     if not overlay_source:
@@ -613,16 +1642,21 @@ def _render_item_on_avatar(item, avatar, base_image=None):
     use_image_urls = FAL_USE_IMAGE_URLS or "nano-banana" in FAL_IMG_ENDPOINT
     use_minimal_payload = FAL_MINIMAL_IMG_PAYLOAD or "nano-banana" in FAL_IMG_ENDPOINT
 
+    with _span("render.load"):
+        base_loaded = _load_source(base_path)
+        item_loaded = _load_source(overlay_source)
+    digest = _render_inputs_digest(base_loaded[1], item_loaded[1], use_image_urls, use_minimal_payload)
+    cached = _render_cache_get(digest)
+    stats["renderCache"] = "hit" if cached else "miss"
+    if not cached and not base_image:
+        cached = _phash_shared_render(item, avatar)
+        if cached:
+            stats["renderCache"] = "shared"
+    if cached:
+        return digest, cached, None
+
     payload = {"prompt": prompt}
-    if use_image_urls:
-        avatar_img, item_img = _prepare_reference_images(base_path, overlay_source)
-        payload["image_urls"] = [
-            _image_to_data_uri(avatar_img),
-            _image_to_data_uri(item_img),
-        ]
-    else:
-        guide = _compose_reference_pair(base_path, overlay_source)
-        payload["image_url"] = _image_to_data_uri(guide)
+    payload.update(_reference_payload(base_loaded, item_loaded, use_image_urls, stats))
 
     if not use_minimal_payload:
         payload.update(
@@ -633,15 +1667,42 @@ def _render_item_on_avatar(item, avatar, base_image=None):
                 "strength": FAL_STRENGTH,
             }
         )
-    result = _fal_post(FAL_IMG_ENDPOINT, payload)
+    return digest, None, payload
+
+
+def _render_item_on_avatar(item, avatar, base_image=None, stats=None):
+    if stats is None:
+        stats = {}
+    digest, cached, payload = _prepare_render(item, avatar, base_image, stats)
+    if cached:
+        return cached
+    result = _fal_post(FAL_IMG_ENDPOINT, payload, stats)
     image_url = _extract_image_url(result)
     if not image_url:
         raise RuntimeError("Failed to generate outfit preview.")
 
-    filename = f"{item['id']}_{avatar}.png"
-    output_path = os.path.join(RENDERS_DIR, filename)
-    _download_remote_image(image_url, output_path)
-    return f"/renders/{filename}"
+    _download_remote_image(image_url, _render_cache_path(digest))
+    return _render_cache_put(digest)
+
+
+async def _render_item_on_avatar_async(item, avatar, base_image=None, stats=None):
+    if stats is None:
+        stats = {}
+    loop = asyncio.get_running_loop()
+    digest, cached, payload = await loop.run_in_executor(
+        RENDER_EXECUTOR, contextvars.copy_context().run, _prepare_render, item, avatar, base_image, stats
+    )
+    if cached:
+        return cached
+    if UPSTREAM["renderSlots"] is None:
+        UPSTREAM["renderSlots"] = asyncio.Semaphore(max(RENDER_ASYNC_CONCURRENCY, 1))
+    async with UPSTREAM["renderSlots"]:
+        result = await _fal_post_async(FAL_IMG_ENDPOINT, payload, stats)
+        image_url = _extract_image_url(result)
+        if not image_url:
+            raise RuntimeError("Failed to generate outfit preview.")
+        await _download_remote_image_async(image_url, _render_cache_path(digest))
+    return _render_cache_put(digest)
 
 
 def _slug_from_url(url):
@@ -652,70 +1713,785 @@ def _slug_from_url(url):
     return f"{name}.png"
 
 
-def _infer_category(title, product_type):
-    text = f"{title} {product_type}".lower()
-    if any(word in text for word in BOTTOM_KEYWORDS):
-        return "bottom"
-    if any(word in text for word in ACCESSORY_KEYWORDS):
-        return "accessory"
-    return "top"
+atexit.register(_catalog_flush)
+
+
+INGEST_EXECUTOR = ThreadPoolExecutor(max_workers=max(INGEST_WORKERS, 1), thread_name_prefix="ingest")
+INGEST_HOST_LOCK = threading.Lock()
+INGEST_HOST_SLOTS = {}
+
+
+def _ingest_host_slot(url):
+    host = urlparse(url).netloc.lower()
+    with INGEST_HOST_LOCK:
+        slot = INGEST_HOST_SLOTS.get(host)
+        if slot is None:
+            slot = threading.BoundedSemaphore(max(INGEST_PER_HOST, 1))
+            INGEST_HOST_SLOTS[host] = slot
+    return slot
 
 
-def _download_image(url, item_id):
+def _ingest_host_slot_async(url):
+    # Runs on the upstream loop only, so the per-host semaphores need no lock.
+    host = urlparse(url).netloc.lower()
+    slot = UPSTREAM["hostSlots"].get(host)
+    if slot is None:
+        slot = asyncio.Semaphore(max(INGEST_PER_HOST, 1))
+        UPSTREAM["hostSlots"][host] = slot
+    return slot
+
+
+def _image_index_lookup(url):
+    with LOCK:
+        row = _catalog_db().execute(
+            "SELECT etag, last_modified, sha256, public_path FROM image_index WHERE url = ?",
+            (url,),
+        ).fetchone()
+    if not row:
+        return None
+    return {"etag": row[0], "lastModified": row[1], "sha256": row[2], "publicPath": row[3]}
+
+
+def _image_index_path_for_hash(sha):
+    with LOCK:
+        rows = _catalog_db().execute(
+            "SELECT public_path FROM image_index WHERE sha256 = ?",
+            (sha,),
+        ).fetchall()
+    for (public_path,) in rows:
+        local_path = _public_to_local_path(public_path)
+        if local_path and os.path.isfile(local_path):
+            return public_path
+    return None
+
+
+def _image_index_record(url, etag, last_modified, sha, public_path):
+    with LOCK:
+        db = _catalog_db()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO image_index "
+                "(url, etag, last_modified, sha256, public_path, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, sha, public_path, time.time()),
+            )
+
+
+def _ingest_known(url):
+    """Return the live index entry for ``url`` and its conditional GET headers."""
+    known = _image_index_lookup(url)
+    if known:
+        local_path = _public_to_local_path(known["publicPath"])
+        if not local_path or not os.path.isfile(local_path):
+            known = None
+    headers = {}
+    if known and known["etag"]:
+        headers["If-None-Match"] = known["etag"]
+    if known and known["lastModified"]:
+        headers["If-Modified-Since"] = known["lastModified"]
+    return known, headers
+
+
+def _ingest_commit(url, tmp_path, sha, etag, last_modified):
+    # The caller removes ``tmp_path`` if it is still there.
+    public_path = _image_index_path_for_hash(sha)
+    status = "duplicate"
+    if not public_path:
+        ext = os.path.splitext(_slug_from_url(url))[1] or ".png"
+        local_name = f"img_{sha[:24]}{ext}"
+        os.replace(tmp_path, os.path.join(UPLOADS_DIR, local_name))
+        public_path = f"/uploads/{local_name}"
+        status = "downloaded"
+    _image_index_record(url, etag, last_modified, sha, public_path)
+    return {"sha256": sha, "publicPath": public_path, "status": status}
+
+
+def _ingest_image(url):
+    """Download ``url`` into UPLOADS_DIR unless an identical copy is already stored."""
+    known, headers = _ingest_known(url)
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    tmp_path = None
+    try:
+        with _ingest_host_slot(url), _span("ingest.download"):
+            resp = _request_get(url, headers=headers, stream=True, timeout=20)
+            try:
+                if known and resp.status_code == 304:
+                    return dict(known, status="not-modified")
+                resp.raise_for_status()
+                fd, tmp_path = tempfile.mkstemp(dir=UPLOADS_DIR, suffix=".part")
+                with os.fdopen(fd, "wb") as handle:
+                    for chunk in resp.iter_content(chunk_size=256 * 1024):
+                        if chunk:
+                            digest.update(chunk)
+                            handle.write(chunk)
+                etag = resp.headers.get("ETag")
+                last_modified = resp.headers.get("Last-Modified")
+            finally:
+                resp.close()
+        return _ingest_commit(url, tmp_path, digest.hexdigest(), etag, last_modified)
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+async def _ingest_image_async(url):
+    known, headers = _ingest_known(url)
     os.makedirs(UPLOADS_DIR, exist_ok=True)
-    filename = _slug_from_url(url)
-    ext = os.path.splitext(filename)[1] or ".png"
-    local_name = f"{item_id}{ext}"
-    local_path = os.path.join(UPLOADS_DIR, local_name)
-    public_path = f"/uploads/{local_name}"
+    digest = hashlib.sha256()
+    tmp_path = None
+    try:
+        async with _ingest_host_slot_async(url):
+            with _span("ingest.download"):
+                async with _upstream_stream("GET", url, 20, headers=headers) as resp:
+                    if known and resp.status_code == 304:
+                        return dict(known, status="not-modified")
+                    resp.raise_for_status()
+                    fd, tmp_path = tempfile.mkstemp(dir=UPLOADS_DIR, suffix=".part")
+                    with os.fdopen(fd, "wb") as handle:
+                        async for chunk in resp.aiter_bytes(256 * 1024):
+                            digest.update(chunk)
+                            handle.write(chunk)
+                    etag = resp.headers.get("ETag")
+                    last_modified = resp.headers.get("Last-Modified")
+        return _ingest_commit(url, tmp_path, digest.hexdigest(), etag, last_modified)
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Perceptual index of canonical products, searched by multi-index hashing over dHash bands.
+def _phash_bands(count):
+    bands = []
+    shift = 0
+    for band in range(count):
+        width = 64 // count + (band < 64 % count)
+        bands.append((shift, width))
+        shift += width
+    return bands
+
+
+PHASH_BANDS = _phash_bands(min(max(PHASH_MAX_DISTANCE, 0) + 1, 64))
+PHASH_INDEX = {
+    "lock": threading.Lock(),
+    "loaded": False,
+    "tables": [{} for _ in PHASH_BANDS],
+    "items": {},
+    "stats": {"lookups": 0, "matches": 0, "registered": 0, "sharedRenders": 0},
+}
 
-    resp = _request_get(url, stream=True, timeout=20)
-    resp.raise_for_status()
-    with open(local_path, "wb") as handle:
-        for chunk in resp.iter_content(chunk_size=1024 * 1024):
-            if chunk:
-                handle.write(chunk)
 
-    return local_path, public_path
+def _image_fingerprint(sha, public_path):
+    """Return ``(dhash, (r, g, b))`` for an ingested image, computed once per content hash."""
+    with LOCK:
+        row = _catalog_db().execute(
+            "SELECT phash, color FROM image_fingerprints WHERE sha256 = ?", (sha,)
+        ).fetchone()
+    if row:
+        return int(row[0], 16), tuple(bytes.fromhex(row[1]))
+    with _span("ingest.fingerprint"), Image.open(_public_to_local_path(public_path)) as image:
+        image.draft("RGB", (64, 64))
+        flat = _flatten_image(image)
+        pixels = flat.convert("L").resize((9, 8), Image.BILINEAR).tobytes()
+        color = tuple(flat.resize((1, 1), Image.BOX).tobytes())
+    phash = 0
+    for row_start in range(0, 72, 9):
+        for col in range(row_start, row_start + 8):
+            phash = (phash << 1) | (pixels[col] < pixels[col + 1])
+    with LOCK:
+        db = _catalog_db()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO image_fingerprints (sha256, phash, color) VALUES (?, ?, ?)",
+                (sha, f"{phash:016x}", bytes(color).hex()),
+            )
+    return phash, color
+
+
+def _phash_insert(phash, item_id):
+    # Caller holds PHASH_INDEX["lock"].
+    for table, (shift, width) in zip(PHASH_INDEX["tables"], PHASH_BANDS):
+        table.setdefault((phash >> shift) & ((1 << width) - 1), []).append(item_id)
+
 
+def _phash_search(phash):
+    # Caller holds PHASH_INDEX["lock"].
+    candidates = set()
+    for table, (shift, width) in zip(PHASH_INDEX["tables"], PHASH_BANDS):
+        candidates.update(table.get((phash >> shift) & ((1 << width) - 1), ()))
+    items = PHASH_INDEX["items"]
+    matches = []
+    for item_id in candidates:
+        distance = (items[item_id]["phash"] ^ phash).bit_count()
+        if distance <= PHASH_MAX_DISTANCE:
+            matches.append((distance, item_id))
+    matches.sort()
+    return matches
 
-def _update_catalog(items):
+
+def _phash_load():
+    if PHASH_INDEX["loaded"]:
+        return
+    with LOCK:
+        rows = _catalog_db().execute("SELECT id, phash, color, renders FROM canonical_items").fetchall()
+    with PHASH_INDEX["lock"]:
+        if PHASH_INDEX["loaded"]:
+            return
+        for item_id, phash, color, renders in rows:
+            value = int(phash, 16)
+            PHASH_INDEX["items"][item_id] = {
+                "phash": value,
+                "color": tuple(bytes.fromhex(color)),
+                "renders": json.loads(renders),
+            }
+            _phash_insert(value, item_id)
+        PHASH_INDEX["loaded"] = True
+
+
+def _phash_canonical(item_id, fingerprint):
+    """Return the canonical item id for ``fingerprint``."""
+    phash, color = fingerprint
+    _phash_load()
+    with PHASH_INDEX["lock"]:
+        PHASH_INDEX["stats"]["lookups"] += 1
+        if item_id in PHASH_INDEX["items"]:
+            return item_id
+        for _, candidate in _phash_search(phash):
+            other = PHASH_INDEX["items"][candidate]["color"]
+            if max(abs(a - b) for a, b in zip(color, other)) <= PHASH_MAX_COLOR_DELTA:
+                PHASH_INDEX["stats"]["matches"] += 1
+                return candidate
+        PHASH_INDEX["items"][item_id] = {"phash": phash, "color": color, "renders": {}}
+        _phash_insert(phash, item_id)
+        PHASH_INDEX["stats"]["registered"] += 1
     with LOCK:
-        _save_json(CATALOG_PATH, items)
+        db = _catalog_db()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO canonical_items (id, phash, color, renders) VALUES (?, ?, ?, ?)",
+                (item_id, f"{phash:016x}", bytes(color).hex(), "{}"),
+            )
+    return item_id
+
 
+def _phash_renders(canonical_id):
+    """Renders shared by a canonical item whose files are still on disk, by avatar."""
+    with PHASH_INDEX["lock"]:
+        record = PHASH_INDEX["items"].get(canonical_id)
+        renders = dict(record["renders"]) if record else {}
+    shared = {}
+    for avatar, public_url in renders.items():
+        local_path = _public_to_local_path(public_url)
+        if local_path and os.path.isfile(local_path):
+            shared[avatar] = public_url
+    return shared
 
-def _update_render_state(item_id, avatar, status, rendered_url=None, error=None):
+
+def _phash_shared_render(item, avatar):
+    canonical_id = item.get("canonicalId")
+    if not canonical_id:
+        return None
+    rendered = _phash_renders(canonical_id).get(avatar)
+    if rendered:
+        with PHASH_INDEX["lock"]:
+            PHASH_INDEX["stats"]["sharedRenders"] += 1
+    return rendered
+
+
+def _phash_record_render(canonical_id, avatar, public_url):
+    with PHASH_INDEX["lock"]:
+        record = PHASH_INDEX["items"].get(canonical_id)
+        if record is None or record["renders"].get(avatar) == public_url:
+            return
+        record["renders"][avatar] = public_url
+        renders = json.dumps(record["renders"])
     with LOCK:
-        items = _load_json(CATALOG_PATH, [])
-        for entry in items:
-            if entry.get("id") != item_id:
+        db = _catalog_db()
+        with db:
+            db.execute("UPDATE canonical_items SET renders = ? WHERE id = ?", (renders, canonical_id))
+
+
+def _ingest_canonical(item, result):
+    """Return ``(key, fields)`` resolving a fresh preview to its canonical item."""
+    fields = {"previewImage": result["publicPath"], "imageHash": result["sha256"], "status": "ready"}
+    if not PHASH_DEDUPE:
+        return result["sha256"], fields
+    try:
+        fingerprint = _image_fingerprint(result["sha256"], result["publicPath"])
+    except Exception:
+        return result["sha256"], fields
+    canonical_id = _phash_canonical(item["id"], fingerprint)
+    fields["imagePhash"] = f"{fingerprint[0]:016x}"
+    fields["canonicalId"] = canonical_id
+    shared = _phash_renders(canonical_id)
+    if shared:
+        fields["renderedImages"] = shared
+        fields["renderStatus"] = {avatar: "ready" for avatar in shared}
+    return canonical_id, fields
+
+
+# Responsive derivatives under /variants, named after the source content hash.
+VARIANT_MIME_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg"}
+VARIANT_EXECUTOR = ThreadPoolExecutor(max_workers=max(IMAGE_VARIANT_WORKERS, 1), thread_name_prefix="variants")
+VARIANTS = {
+    "lock": threading.Lock(),
+    "inflight": {},
+    "records": OrderedDict(),
+    "formats": None,
+    "stats": {"built": 0, "reused": 0, "errors": 0},
+}
+VARIANT_RECORDS_MAX = 4096
+
+
+def _variant_formats():
+    if VARIANTS["formats"] is None:
+        formats = []
+        for fmt in IMAGE_VARIANT_FORMATS:
+            if fmt not in VARIANT_MIME_TYPES or fmt in formats:
                 continue
-            render_status = entry.get("renderStatus") or {}
-            render_status[avatar] = status
-            entry["renderStatus"] = render_status
-            if rendered_url:
-                rendered = entry.get("renderedImages") or {}
-                rendered[avatar] = rendered_url
-                entry["renderedImages"] = rendered
-            if error:
-                render_errors = entry.get("renderErrors") or {}
-                render_errors[avatar] = error
-                entry["renderErrors"] = render_errors
-            break
-        _save_json(CATALOG_PATH, items)
+            try:
+                supported = fmt == "jpeg" or features.check(fmt)
+            except Exception:
+                supported = False
+            if supported:
+                formats.append(fmt)
+        VARIANTS["formats"] = formats or ["jpeg"]
+    return VARIANTS["formats"]
 
 
-def _generate_items(items):
+def _variant_widths(source_width):
+    widths = [width for width in IMAGE_VARIANT_WIDTHS if width < source_width]
+    if not widths or (IMAGE_VARIANT_WIDTHS and source_width < IMAGE_VARIANT_WIDTHS[-1]):
+        widths.append(source_width)
+    return widths
+
+
+def _flatten_image(image):
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _encode_variant(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == "jpeg":
+        _flatten_image(image).save(buffer, format="JPEG", quality=IMAGE_VARIANT_QUALITY, optimize=True, progressive=True)
+    elif fmt == "webp":
+        image.save(buffer, format="WEBP", quality=IMAGE_VARIANT_QUALITY, method=4)
+    else:
+        image.save(buffer, format="AVIF", quality=IMAGE_VARIANT_QUALITY)
+    return buffer.getvalue()
+
+
+def _placeholder_data_uri(image):
+    width = max(IMAGE_PLACEHOLDER_WIDTH, 1)
+    height = max(int(round(image.height * width / max(image.width, 1))), 1)
+    small = _flatten_image(image).resize((width, height), Image.BILINEAR)
+    fmt = "webp" if "webp" in _variant_formats() else "jpeg"
+    buffer = io.BytesIO()
+    small.save(buffer, format=fmt.upper(), quality=40)
+    return f"data:{VARIANT_MIME_TYPES[fmt]};base64,{base64.b64encode(buffer.getvalue()).decode('ascii')}"
+
+
+def _build_image_variants(data):
+    """Encode the variant ladder for one source file and write its manifest."""
+    sha = hashlib.sha256(data).hexdigest()[:24]
+    manifest_path = os.path.join(VARIANTS_DIR, f"{sha}.json")
+    formats = _variant_formats()
+    try:
+        record = _load_json(manifest_path, None)
+    except ValueError:
+        record = None
+    if record and set(record.get("sources", {})) == {VARIANT_MIME_TYPES[fmt] for fmt in formats}:
+        with VARIANTS["lock"]:
+            VARIANTS["stats"]["reused"] += 1
+        return record
+
+    with _span("variants.build"):
+        image = Image.open(io.BytesIO(data))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or image.mode == "P" else "RGB")
+        os.makedirs(VARIANTS_DIR, exist_ok=True)
+        sources = {VARIANT_MIME_TYPES[fmt]: [] for fmt in formats}
+        for width in _variant_widths(image.width):
+            height = max(int(round(image.height * width / image.width)), 1)
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                ext = "jpg" if fmt == "jpeg" else fmt
+                name = f"{sha}_{width}.{ext}"
+                path = os.path.join(VARIANTS_DIR, name)
+                if not os.path.isfile(path):
+                    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                    with open(tmp_path, "wb") as handle:
+                        handle.write(_encode_variant(resized, fmt))
+                    os.replace(tmp_path, path)
+                sources[VARIANT_MIME_TYPES[fmt]].append({"width": width, "url": f"/variants/{name}"})
+        record = {
+            "width": image.width,
+            "height": image.height,
+            "placeholder": _placeholder_data_uri(image),
+            "sources": sources,
+        }
+    _save_json_atomic(manifest_path, record)
+    with VARIANTS["lock"]:
+        VARIANTS["stats"]["built"] += 1
+    return record
+
+
+def _image_variants(public_url):
+    """Return the variant record for a local public image, building it if needed."""
+    local_path = _public_to_local_path(public_url)
+    if not IMAGE_VARIANTS or not local_path or not os.path.isfile(local_path):
+        return None
+    stat = os.stat(local_path)
+    key = (local_path, stat.st_mtime_ns, stat.st_size)
+    with VARIANTS["lock"]:
+        record = VARIANTS["records"].get(key)
+        if record is not None:
+            VARIANTS["records"].move_to_end(key)
+            return record
+        flight = VARIANTS["inflight"].get(key)
+        leader = flight is None
+        if leader:
+            flight = Future()
+            VARIANTS["inflight"][key] = flight
+    if not leader:
+        return flight.result()
+    record = None
+    try:
+        with open(local_path, "rb") as handle:
+            data = handle.read()
+        record = _build_image_variants(data)
+    except Exception:
+        with VARIANTS["lock"]:
+            VARIANTS["stats"]["errors"] += 1
+    finally:
+        with VARIANTS["lock"]:
+            VARIANTS["inflight"].pop(key, None)
+            if record is not None:
+                VARIANTS["records"][key] = record
+                while len(VARIANTS["records"]) > VARIANT_RECORDS_MAX:
+                    VARIANTS["records"].popitem(last=False)
+        flight.set_result(record)
+    return record
+
+
+def _attach_preview_variants(item_id, public_url):
+    record = _image_variants(public_url)
+    if record is None:
+        return
+
+    def mutate(entry):
+        if entry.get("previewImage") in (None, public_url):
+            entry["previewVariants"] = record
+
+    _catalog_patch(item_id, mutate)
+
+
+def _attach_render_variants(item_id, avatar, public_url):
+    record = _image_variants(public_url)
+    if record is None:
+        return
+
+    def mutate(entry):
+        if (entry.get("renderedImages") or {}).get(avatar) == public_url:
+            entry.setdefault("renderedVariants", {})[avatar] = record
+
+    _catalog_patch(item_id, mutate)
+
+
+def _queue_variants(fn, *args):
+    if IMAGE_VARIANTS:
+        VARIANT_EXECUTOR.submit(fn, *args)
+
+
+def _product_handle(item):
+    path = urlparse(item.get("productUrl") or "").path.rstrip("/")
+    if "/products/" not in path:
+        return None
+    return (item.get("store"), path.rsplit("/products/", 1)[1].lower())
+
+
+def _collapse_handles(items):
+    """Drop later items that share a store and product handle; the kept copy lists them in ``duplicateIds``."""
+    kept = []
+    owners = {}
     for item in items:
+        handle = _product_handle(item)
+        owner = owners.get(handle) if handle else None
+        if owner is not None:
+            owner["duplicateIds"] = owner.get("duplicateIds", []) + [item["id"]]
+            continue
+        item = dict(item)
+        if handle:
+            owners[handle] = item
+        kept.append(item)
+    return kept
+
+
+def _generate_items(items):
+    """Ingest preview images for ``items`` and alias near-duplicate products."""
+    order = {item["id"]: index for index, item in enumerate(items)}
+    duplicates = {}
+    jobs = {
+        _submit_upstream(INGEST_EXECUTOR, _ingest_image, _ingest_image_async, item["imageUrl"]): item
+        for item in items
+    }
+    owners = {}
+    pending = {}
+    last_flush = time.monotonic()
+    for future in as_completed(jobs):
+        item = jobs[future]
         try:
-            _, public_path = _download_image(item["imageUrl"], item["id"])
-            item["previewImage"] = public_path
-            _update_catalog(items)
-            item["status"] = "ready"
+            result = future.result()
         except Exception as exc:
-            item["status"] = "error"
-            item["error"] = str(exc)
-        _update_catalog(items)
+            pending[item["id"]] = {"status": "error", "error": str(exc)}
+        else:
+            key, fields = _ingest_canonical(item, result)
+            pending[item["id"]] = fields
+            _queue_variants(_attach_preview_variants, item["id"], result["publicPath"])
+            for avatar, rendered_url in (fields.get("renderedImages") or {}).items():
+                _queue_variants(_attach_render_variants, item["id"], avatar, rendered_url)
+            owner = owners.get(key)
+            if owner is None:
+                owners[key] = item
+            else:
+                keep, drop = (owner, item) if order[owner["id"]] < order[item["id"]] else (item, owner)
+                owners[key] = keep
+                aliases = [drop["id"]] + duplicates.pop(drop["id"], [])
+                duplicates.setdefault(keep["id"], []).extend(aliases)
+                for alias_id in aliases:
+                    pending.setdefault(alias_id, {}).update(status="duplicate", duplicateOf=keep["id"])
+        if len(pending) >= INGEST_BATCH_SIZE or time.monotonic() - last_flush >= INGEST_FLUSH_SECONDS:
+            _catalog_apply(pending)
+            pending = {}
+            last_flush = time.monotonic()
+    by_id = {item["id"]: item for item in items}
+    for keep_id, alias_ids in duplicates.items():
+        duplicate_ids = list(by_id[keep_id].get("duplicateIds") or [])
+        for alias_id in sorted(alias_ids, key=order.get):
+            duplicate_ids += [alias_id] + (by_id[alias_id].get("duplicateIds") or [])
+        pending.setdefault(keep_id, {})["duplicateIds"] = duplicate_ids
+    _catalog_apply(pending)
+
+
+RENDER_EXECUTOR = ThreadPoolExecutor(max_workers=max(RENDER_WORKERS, 1), thread_name_prefix="render")
+RENDER_JOB_LOCK = threading.Lock()
+RENDER_JOBS = {}
+RENDER_JOB_KEYS = {}
+
+
+def _render_job_key(item_id, avatar, base_image):
+    return (item_id, avatar, base_image or "")
+
+
+def _public_render_job(job):
+    data = {
+        "jobId": job["id"],
+        "itemId": job["itemId"],
+        "avatar": job["avatar"],
+        "status": job["status"],
+        "createdAt": job["createdAt"],
+        "updatedAt": job["updatedAt"],
+    }
+    if job.get("renderedImage"):
+        data["renderedImage"] = job["renderedImage"]
+    if job.get("error"):
+        data["error"] = job["error"]
+    if job.get("stats"):
+        data["payload"] = dict(job["stats"])
+    return data
+
+
+def _prune_render_jobs():
+    # Caller holds RENDER_JOB_LOCK.
+    cutoff = time.time() - RENDER_JOB_TTL
+    for job_id, job in list(RENDER_JOBS.items()):
+        if job["status"] in ("ready", "error") and job["updatedAt"] < cutoff:
+            del RENDER_JOBS[job_id]
+
+
+def _set_render_job(job, **fields):
+    listeners = []
+    with RENDER_JOB_LOCK:
+        job.update(fields)
+        job["updatedAt"] = time.time()
+        finished = job["status"] in ("ready", "error")
+        if finished and RENDER_JOB_KEYS.get(job["key"]) == job["id"]:
+            del RENDER_JOB_KEYS[job["key"]]
+        if finished:
+            listeners, job["listeners"] = job["listeners"], []
+    if finished:
+        job["done"].set()
+        for listener in listeners:
+            listener(job)
+
+
+def _watch_render_job(job, callback):
+    """Call ``callback(job)`` once ``job`` finishes, right away if it already has."""
+    with RENDER_JOB_LOCK:
+        if job["status"] not in ("ready", "error"):
+            job["listeners"].append(callback)
+            return
+    callback(job)
+
+
+def _run_render_job(job, item):
+    token = TIMING_TRACE.set(job["timings"])
+    try:
+        _render_job_started(job)
+        rendered_url = _render_item_on_avatar(
+            item, job["avatar"], base_image=job["baseImage"], stats=job["stats"]
+        )
+    except Exception as exc:
+        _render_job_finished(job, error=str(exc))
+    else:
+        _render_job_finished(job, rendered_url=rendered_url)
+    finally:
+        TIMING_TRACE.reset(token)
+
+
+async def _run_render_job_async(job, item):
+    TIMING_TRACE.set(job["timings"])
+    try:
+        _render_job_started(job)
+        rendered_url = await _render_item_on_avatar_async(
+            item, job["avatar"], base_image=job["baseImage"], stats=job["stats"]
+        )
+    except Exception as exc:
+        _render_job_finished(job, error=str(exc) or exc.__class__.__name__)
+    else:
+        _render_job_finished(job, rendered_url=rendered_url)
+
+
+def _render_job_started(job):
+    _set_render_job(job, status="running")
+    if not job["baseImage"]:
+        _update_render_state(job["itemId"], job["avatar"], "generating")
+
+
+def _render_job_finished(job, rendered_url=None, error=None):
+    if error is not None:
+        if not job["baseImage"]:
+            _update_render_state(job["itemId"], job["avatar"], "error", error=error)
+        _set_render_job(job, status="error", error=error)
+        return
+    if not job["baseImage"]:
+        _update_render_state(job["itemId"], job["avatar"], "ready", rendered_url=rendered_url)
+        _queue_variants(_attach_render_variants, job["itemId"], job["avatar"], rendered_url)
+        if job["canonicalId"]:
+            _phash_record_render(job["canonicalId"], job["avatar"], rendered_url)
+    _set_render_job(job, status="ready", renderedImage=rendered_url)
+
+
+def _submit_render_job(item, avatar, base_image=None):
+    """Queue a render, or join the job for the same inputs; returns ``(job, created)``."""
+    key = _render_job_key(item["id"], avatar, base_image)
+    with RENDER_JOB_LOCK:
+        _prune_render_jobs()
+        job_id = RENDER_JOB_KEYS.get(key)
+        if job_id and job_id in RENDER_JOBS:
+            return RENDER_JOBS[job_id], False
+        now = time.time()
+        job = {
+            "id": f"render_{_make_token(12)}",
+            "key": key,
+            "itemId": item["id"],
+            "canonicalId": item.get("canonicalId"),
+            "avatar": avatar,
+            "baseImage": base_image,
+            "status": "queued",
+            "createdAt": now,
+            "updatedAt": now,
+            "done": threading.Event(),
+            "stats": {},
+            "timings": [],
+            "listeners": [],
+        }
+        RENDER_JOBS[job["id"]] = job
+        RENDER_JOB_KEYS[key] = job["id"]
+    _submit_upstream(RENDER_EXECUTOR, _run_render_job, _run_render_job_async, job, item)
+    return job, True
+
+
+def _get_render_job(job_id):
+    with RENDER_JOB_LOCK:
+        return RENDER_JOBS.get(job_id)
+
+
+def _render_batch_result(item_id, avatar, status, **fields):
+    return dict({"itemId": item_id, "avatar": avatar, "status": status}, **fields)
+
+
+def _render_batch_check(pair):
+    """Validate one batch entry; returns ``(item, avatar, result)``."""
+    if not isinstance(pair, dict):
+        return None, None, _render_batch_result(None, None, "error", error="Invalid entry.")
+    item_id = pair.get("itemId")
+    avatar = pair.get("avatar", "girl")
+    if not item_id:
+        return None, avatar, _render_batch_result(item_id, avatar, "error", error="Missing itemId.")
+    if avatar not in ALLOWED_AVATARS:
+        return None, avatar, _render_batch_result(item_id, avatar, "error", error="Invalid avatar.")
+    item = _catalog_resolve(item_id)
+    if not item:
+        return None, avatar, _render_batch_result(item_id, avatar, "error", error="Item not found.")
+    if item.get("status") != "ready":
+        return None, avatar, _render_batch_result(item_id, avatar, "error", error="Item not ready.")
+    existing = (item.get("renderedImages") or {}).get(avatar)
+    if existing:
+        local_path = _public_to_local_path(existing)
+        if local_path and os.path.isfile(local_path):
+            return None, avatar, _render_batch_result(item_id, avatar, "ready", renderedImage=existing, cached=True)
+    return item, avatar, None
+
+
+def _render_batch_stream(pairs, concurrency):
+    """Yield one NDJSON line per pair as its render finishes, then a summary line."""
+    started = time.perf_counter()
+    finished = Queue()
+    pending = deque(pairs)
+    window = concurrency
+    inflight = 0
+    counts = {"ready": 0, "error": 0}
+    while pending or inflight:
+        while pending and inflight < max(int(window), 1):
+            item, avatar, result = _render_batch_check(pending.popleft())
+            if result is not None:
+                counts[result["status"]] += 1
+                yield json.dumps(result) + "\n"
+                continue
+            job, _ = _submit_render_job(item, avatar)
+            inflight += 1
+            _watch_render_job(job, finished.put)
+        if not inflight:
+            continue
+        try:
+            job = finished.get(timeout=RENDER_WAIT_TIMEOUT)
+        except Empty:
+            break
+        inflight -= 1
+        counts[job["status"]] += 1
+        if job["stats"].get("falThrottled"):
+            window = max(window / 2, 1)
+        else:
+            window = min(window + 1, concurrency)
+        if job["status"] == "ready":
+            result = _render_batch_result(job["itemId"], job["avatar"], "ready", renderedImage=job["renderedImage"])
+        else:
+            result = _render_batch_result(job["itemId"], job["avatar"], "error", error=job["error"])
+        yield json.dumps(result) + "\n"
+    summary = {
+        "done": True,
+        "ready": counts["ready"],
+        "errors": counts["error"],
+        "unfinished": inflight + len(pending),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    yield json.dumps(summary) + "\n"
 
 
 def _make_token(length=8):
@@ -758,142 +2534,610 @@ def _prompt_query(prompt):
     return prompt.get("label", SHOP_SEARCH_QUERY)
 
 
-def _collect_prompt_items(prompt, per_category=3):
+SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=max(SHOP_SEARCH_WORKERS, 1), thread_name_prefix="shop-search")
+
+
+def _timed_search(query, limit):
+    started = time.perf_counter()
+    items = _search_shop_products(query, limit)
+    return items, time.perf_counter() - started
+
+
+async def _timed_search_async(query, limit):
+    started = time.perf_counter()
+    items = await _search_shop_products_async(query, limit)
+    return items, time.perf_counter() - started
+
+
+def _search_yielded_items(future):
+    return future.done() and future.exception() is None and bool(future.result()[0])
+
+
+def _merge_category_items(items, seen, category, batch):
+    added = []
+    for item in batch:
+        key = item.get("imageUrl")
+        if not key:
+            continue
+        key = _image_url_key(key)
+        if key in seen:
+            continue
+        seen.add(key)
+        _apply_prompt_category(item, category)
+        items.append(item)
+        added.append(item)
+    return added
+
+
+def _collect_prompt_items(prompt, per_category=3, deadline=None, timings=None, late=None):
+    """Search every prompt category concurrently and merge the results in category order."""
     categories = prompt.get("categories") or []
     if not categories:
         return []
-    items = []
-    seen = set()
+    if deadline is None:
+        deadline = GAME_COLLECT_DEADLINE
+
+    jobs = []
+    pooled_ids = set()
     for category in categories:
         query = category.get("query") or category.get("label") or prompt.get("label")
         target = _safe_int(category.get("count"), per_category)
         if not query or target <= 0:
             continue
-        batch = _search_shop_products(query, target)
-        for item in batch:
-            key = item.get("imageUrl")
-            if not key or key in seen:
-                continue
-            seen.add(key)
-            item["category"] = category.get("id") or item.get("category")
-            items.append(item)
+        pooled = _warm_pool_take(prompt, category, target)
+        if len(pooled) >= target:
+            future = Future()
+            future.set_result((pooled, 0.0))
+            pooled_ids.add(id(future))
+        else:
+            future = _submit_upstream(SEARCH_EXECUTOR, _timed_search, _timed_search_async, query, target)
+        jobs.append((category, query, future))
+
+    started = time.perf_counter()
+    done, pending = wait([job[2] for job in jobs], timeout=deadline if deadline > 0 else None)
+    while pending and not any(_search_yielded_items(future) for future in done):
+        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+        done |= finished
+
+    items = []
+    seen = set()
+    for category, query, future in jobs:
+        timing = {"category": category.get("id"), "query": query}
+        if not future.done():
+            timing["status"] = "late"
+            timing["seconds"] = round(time.perf_counter() - started, 3)
+            if late is not None:
+                late.append((category, future))
+        elif future.exception() is not None:
+            timing["status"] = "error"
+            timing["error"] = str(future.exception())
+        else:
+            batch, seconds = future.result()
+            added = _merge_category_items(items, seen, category, batch)
+            timing.update({"status": "ok", "seconds": round(seconds, 3), "count": len(added)})
+            timing["source"] = "pool" if id(future) in pooled_ids else "live"
+        if timings is not None:
+            timings.append(timing)
     return items
 
 
-def _cleanup_games():
-    cutoff = time.time() - GAME_TTL_SECONDS
-    with GAME_LOCK:
-        for game_id, game in list(GAMES.items()):
-            updated = game.get("updatedAt", game.get("createdAt", 0))
-            if updated < cutoff:
-                del GAMES[game_id]
+def _fill_late_items(game_id, category, future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    batch, _ = future.result()
+    added = []
+
+    def mutate(game):
+        if game.get("startTime") is not None:
+            return "Game already started.", 409
+        items = game.setdefault("items", [])
+        seen = {_image_url_key(item["imageUrl"]) for item in items if item.get("imageUrl")}
+        added[:] = _merge_category_items(items, seen, category, batch)
+        if not added:
+            return "Nothing new.", 200
+        for item in added:
+            item["status"] = "ready"
+        return None
 
+    _, error = _game_update(game_id, mutate)
+    if error is None:
+        _update_catalog(added)
 
-def _touch_game(game):
-    game["updatedAt"] = time.time()
 
+def _attach_late_items(game_id, late):
+    for category, future in late:
+        # Hop off the finishing thread, which may be the upstream loop.
+        future.add_done_callback(
+            lambda done, category=category: SEARCH_EXECUTOR.submit(_fill_late_items, game_id, category, done)
+        )
+
+
+# Ready items per prompt category, refilled and pre-rendered in the background.
+WARM_POOL = {
+    "lock": threading.Lock(),
+    "pools": {},
+    "loaded": False,
+    "wake": threading.Event(),
+    "thread": None,
+    "pending": {},
+    "slots": {},
+    "stats": {"hits": 0, "misses": 0, "refills": 0, "refillErrors": 0, "prerenders": 0, "prerenderErrors": 0},
+}
+
+
+def _warm_pool_key(prompt, category):
+    return f"{prompt['id']}:{category.get('id') or category.get('label')}"
+
+
+def _warm_pool_query(prompt, category):
+    return category.get("query") or category.get("label") or prompt.get("label")
+
+
+def _warm_pool_load():
+    with WARM_POOL["lock"]:
+        if WARM_POOL["loaded"]:
+            return
+    with LOCK:
+        db = _catalog_db()
+        meta = db.execute("SELECT pool, refreshed_at, attempted_at FROM warm_pool").fetchall()
+        rows = db.execute("SELECT pool, data FROM warm_pool_items ORDER BY pool, position").fetchall()
+    pools = {key: {"items": [], "refreshedAt": refreshed, "attemptedAt": attempted} for key, refreshed, attempted in meta}
+    for key, data in rows:
+        if key in pools:
+            pools[key]["items"].append(json.loads(data))
+    with WARM_POOL["lock"]:
+        if not WARM_POOL["loaded"]:
+            WARM_POOL["pools"] = pools
+            WARM_POOL["loaded"] = True
+
+
+def _warm_pool_save(key):
+    with WARM_POOL["lock"]:
+        pool = deepcopy(WARM_POOL["pools"].get(key))
+    if pool is None:
+        return
+    with LOCK:
+        db = _catalog_db()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO warm_pool (pool, refreshed_at, attempted_at) VALUES (?, ?, ?)",
+                (key, pool["refreshedAt"], pool["attemptedAt"]),
+            )
+            db.execute("DELETE FROM warm_pool_items WHERE pool = ?", (key,))
+            db.executemany(
+                "INSERT INTO warm_pool_items (pool, position, data) VALUES (?, ?, ?)",
+                [(key, position, json.dumps(item)) for position, item in enumerate(pool["items"])],
+            )
 
-def _public_player(player):
-    return {
-        "id": player["id"],
-        "name": player.get("name"),
-        "avatar": player.get("avatar"),
-        "pickedItemId": player.get("pickedItemId"),
-        "renderedImage": player.get("renderedImage"),
-    }
 
+def _warm_pool_usable(item):
+    local_path = _public_to_local_path(item.get("previewImage"))
+    return bool(local_path and os.path.isfile(local_path))
 
-def _compute_game_phase(game):
+
+def _warm_pool_take(prompt, category, count):
+    """Return up to ``count`` ready items from the category's pool, pre-rendered ones first."""
+    if not WARM_POOL_ENABLED or count <= 0:
+        return []
+    _warm_pool_load()
+    key = _warm_pool_key(prompt, category)
+    with WARM_POOL["lock"]:
+        pool = WARM_POOL["pools"].get(key)
+        items = list(pool["items"]) if pool else []
+    items = [item for item in items if _warm_pool_usable(item)]
+    rendered = [item for item in items if len(item.get("renderedImages") or {}) >= len(ALLOWED_AVATARS)]
+    rendered_ids = {id(item) for item in rendered}
+    rest = [item for item in items if id(item) not in rendered_ids]
+    picker = random.SystemRandom()
+    chosen = picker.sample(rendered, min(len(rendered), count))
+    chosen += picker.sample(rest, min(len(rest), count - len(chosen)))
+    with WARM_POOL["lock"]:
+        WARM_POOL["stats"]["hits" if len(chosen) >= count else "misses"] += 1
+    if len(items) < WARM_POOL_SIZE or len(chosen) < count:
+        WARM_POOL["wake"].set()
+    return deepcopy(chosen)
+
+
+def _warm_pool_for_query(query, count):
+    normalized = _normalize_search_query(query)
+    for prompt in PROMPT_PRESETS:
+        for category in prompt.get("categories") or []:
+            if _normalize_search_query(_warm_pool_query(prompt, category)) == normalized:
+                return _warm_pool_take(prompt, category, count)
+    return []
+
+
+def _warm_pool_ingest(items):
+    """Ingest previews for ``items`` and return ready copies in order, minus duplicates."""
+    handles = set()
+    jobs = []
+    for item in items:
+        handle = _product_handle(item)
+        if handle and handle in handles:
+            continue
+        if handle:
+            handles.add(handle)
+        jobs.append((item, _submit_upstream(INGEST_EXECUTOR, _ingest_image, _ingest_image_async, item["imageUrl"])))
+    ready = []
+    keys = set()
+    for item, future in jobs:
+        try:
+            result = future.result()
+        except Exception:
+            continue
+        key, fields = _ingest_canonical(item, result)
+        if key in keys:
+            continue
+        keys.add(key)
+        entry = dict(item, **fields)
+        variants = _image_variants(result["publicPath"])
+        if variants:
+            entry["previewVariants"] = variants
+        ready.append(entry)
+    return ready
+
+
+def _warm_pool_refill(prompt, category):
+    key = _warm_pool_key(prompt, category)
     now = time.time()
-    phase = "waiting"
-    time_remaining = None
-
-    if game.get("startTime") is not None:
-        end_time = game["startTime"] + game["durationSeconds"]
-        time_remaining = max(0, int(end_time - now))
-        phase = "draft" if now < end_time else "vote"
-
-    if phase == "vote":
-        votes = game.get("votes", {})
-        players = list(game["players"].values())
-        if players and len(votes) >= len(players):
-            phase = "done"
-
-    game["phase"] = phase
-    return phase, time_remaining
-
-
-def _compute_winner(game, phase):
-    if phase != "done":
-        return game.get("winner"), game.get("tie", False)
-
-    votes = game.get("votes", {})
-    tally = {player_id: 0 for player_id in game["players"].keys()}
-    for target in votes.values():
-        if target in tally:
-            tally[target] += 1
-
-    if not tally:
-        game["winner"] = None
-        game["tie"] = True
-        return None, True
-
-    max_votes = max(tally.values())
-    winners = [player_id for player_id, count in tally.items() if count == max_votes]
-    if len(winners) == 1:
-        game["winner"] = winners[0]
-        game["tie"] = False
-    else:
-        game["winner"] = None
-        game["tie"] = True
-    return game["winner"], game["tie"]
+    with WARM_POOL["lock"]:
+        pool = WARM_POOL["pools"].setdefault(key, {"items": [], "refreshedAt": 0, "attemptedAt": 0})
+        pool["attemptedAt"] = now
+        previous = {item["id"]: item for item in pool["items"]}
+    try:
+        found = _search_shop_products(_warm_pool_query(prompt, category), WARM_POOL_SIZE * 2)
+        for item in found:
+            _apply_prompt_category(item, category)
+        ready = _warm_pool_ingest(found)[:WARM_POOL_SIZE]
+    except Exception:
+        ready = []
+    with WARM_POOL["lock"]:
+        if ready:
+            for item in ready:
+                old = previous.get(item["id"])
+                if old and old.get("renderedImages"):
+                    item["renderedImages"] = dict(item.get("renderedImages") or {}, **old["renderedImages"])
+                item["warmedAt"] = now
+            pool["items"] = ready
+            pool["refreshedAt"] = now
+            WARM_POOL["stats"]["refills"] += 1
+        else:
+            WARM_POOL["stats"]["refillErrors"] += 1
+    _warm_pool_save(key)
+
+
+def _warm_pool_needs_refill(pool, now):
+    if pool is None:
+        return True
+    if now - pool.get("attemptedAt", 0) < WARM_POOL_RETRY:
+        return False
+    usable = [item for item in pool["items"] if _warm_pool_usable(item)]
+    return len(usable) < WARM_POOL_SIZE or now - pool.get("refreshedAt", 0) > WARM_POOL_TTL
+
 
+def _warm_render_slot():
+    # Caller holds LOCK. Returns (0, slot), (seconds, None), or (None, None) once the budget is spent.
+    now = time.time()
+    db = _catalog_db()
+    with db:
+        db.execute("DELETE FROM warm_renders WHERE at < ?", (now - 24 * 60 * 60,))
+        used, last = db.execute("SELECT COUNT(*), MAX(at) FROM warm_renders").fetchone()
+        if used >= WARM_RENDER_DAILY_BUDGET or WARM_RENDER_PER_MINUTE <= 0:
+            return None, None
+        spacing = 60.0 / WARM_RENDER_PER_MINUTE
+        if last is not None and now - last < spacing:
+            return last + spacing - now, None
+        slot = db.execute("INSERT INTO warm_renders (at) VALUES (?)", (now,)).lastrowid
+    return 0, slot
+
+
+def _warm_render_refund(slot):
+    with LOCK:
+        db = _catalog_db()
+        with db:
+            db.execute("DELETE FROM warm_renders WHERE rowid = ?", (slot,))
 
-def _serialize_game(game):
-    phase, time_remaining = _compute_game_phase(game)
-    winner, tie = _compute_winner(game, phase)
-    players = [_public_player(player) for player in game["players"].values()]
 
+def _warm_pool_prerender():
+    """Queue renders for the top items of every pool; returns seconds until the next slot."""
+    if not FAL_API_KEY or WARM_RENDER_TOP <= 0 or WARM_RENDER_DAILY_BUDGET <= 0:
+        return None
+    with WARM_POOL["lock"]:
+        todo = [
+            (key, item, avatar)
+            for key, pool in WARM_POOL["pools"].items()
+            for item in pool["items"][:WARM_RENDER_TOP]
+            for avatar in sorted(ALLOWED_AVATARS)
+            if avatar not in (item.get("renderedImages") or {})
+            and avatar not in (item.get("warmRenderErrors") or {})
+            and (key, item["id"], avatar) not in WARM_POOL["pending"]
+        ]
+    todo = [(key, item, avatar) for key, item, avatar in todo if _warm_pool_usable(item)]
+    for key, item, avatar in todo:
+        with LOCK:
+            delay, slot = _warm_render_slot()
+        if delay != 0:
+            return delay
+        job, created = _submit_render_job(item, avatar)
+        if not created:
+            _warm_render_refund(slot)
+        with WARM_POOL["lock"]:
+            WARM_POOL["pending"][(key, item["id"], avatar)] = job
+            if created:
+                WARM_POOL["slots"][(key, item["id"], avatar)] = slot
+            WARM_POOL["stats"]["prerenders"] += 1
+    return None
+
+
+def _warm_pool_collect_renders():
+    finished_renders = []
+    refunds = []
+    with WARM_POOL["lock"]:
+        finished = [
+            (pending, job) for pending, job in WARM_POOL["pending"].items() if job["status"] in ("ready", "error")
+        ]
+        changed = set()
+        for (key, item_id, avatar), job in finished:
+            del WARM_POOL["pending"][(key, item_id, avatar)]
+            slot = WARM_POOL["slots"].pop((key, item_id, avatar), None)
+            if slot is not None and job["stats"].get("renderCache") != "miss":
+                refunds.append(slot)
+            pool = WARM_POOL["pools"].get(key)
+            item = next((entry for entry in pool["items"] if entry["id"] == item_id), None) if pool else None
+            if item is None:
+                continue
+            if job["status"] == "ready":
+                item.setdefault("renderedImages", {})[avatar] = job["renderedImage"]
+                finished_renders.append((item, avatar, job["renderedImage"], key))
+            else:
+                WARM_POOL["stats"]["prerenderErrors"] += 1
+                item.setdefault("warmRenderErrors", {})[avatar] = job.get("error")
+            changed.add(key)
+        pending = bool(WARM_POOL["pending"])
+    for slot in refunds:
+        _warm_render_refund(slot)
+    for item, avatar, rendered_url, key in finished_renders:
+        variants = _image_variants(rendered_url)
+        if variants:
+            with WARM_POOL["lock"]:
+                item.setdefault("renderedVariants", {})[avatar] = variants
+    for key in changed:
+        _warm_pool_save(key)
+    return pending
+
+
+def _warm_pool_loop():
+    _warm_pool_load()
+    while True:
+        now = time.time()
+        for prompt in PROMPT_PRESETS:
+            for category in prompt.get("categories") or []:
+                with WARM_POOL["lock"]:
+                    pool = WARM_POOL["pools"].get(_warm_pool_key(prompt, category))
+                if _warm_pool_needs_refill(pool, now):
+                    _warm_pool_refill(prompt, category)
+        timeout = WARM_POOL_INTERVAL
+        if _warm_pool_collect_renders():
+            timeout = min(timeout, 5)
+        delay = _warm_pool_prerender()
+        if delay is not None:
+            timeout = min(timeout, delay)
+        WARM_POOL["wake"].wait(timeout)
+        WARM_POOL["wake"].clear()
+
+
+def _warm_pool_start():
+    with WARM_POOL["lock"]:
+        thread = WARM_POOL["thread"]
+        if not WARM_POOL_ENABLED or (thread is not None and thread.is_alive()):
+            return
+        thread = threading.Thread(target=_warm_pool_loop, name="warm-pool", daemon=True)
+        WARM_POOL["thread"] = thread
+    thread.start()
+
+
+def _warm_pool_status():
+    _warm_pool_load()
+    now = time.time()
+    with WARM_POOL["lock"]:
+        pools = {
+            key: {
+                "items": len(pool["items"]),
+                "rendered": sum(
+                    1 for item in pool["items"] if len(item.get("renderedImages") or {}) >= len(ALLOWED_AVATARS)
+                ),
+                "age": round(now - pool["refreshedAt"], 1) if pool.get("refreshedAt") else None,
+            }
+            for key, pool in WARM_POOL["pools"].items()
+        }
+        stats = dict(WARM_POOL["stats"], pending=len(WARM_POOL["pending"]))
+    with LOCK:
+        used = _catalog_db().execute(
+            "SELECT COUNT(*) FROM warm_renders WHERE at >= ?", (now - 24 * 60 * 60,)
+        ).fetchone()[0]
     return {
-        "gameId": game["id"],
-        "prompt": game.get("prompt"),
-        "promptId": game.get("promptId"),
-        "hostId": game.get("hostId"),
-        "maxPlayers": game.get("maxPlayers"),
-        "phase": phase,
-        "durationSeconds": game["durationSeconds"],
-        "timeRemaining": time_remaining,
-        "items": game.get("items", []),
-        "players": players,
-        "votes": game.get("votes", {}),
-        "winner": winner,
-        "tie": tie,
+        "enabled": WARM_POOL_ENABLED,
+        "running": bool(WARM_POOL["thread"] and WARM_POOL["thread"].is_alive()),
+        "poolSize": WARM_POOL_SIZE,
+        "renderBudget": {"daily": WARM_RENDER_DAILY_BUDGET, "used": used, "perMinute": WARM_RENDER_PER_MINUTE},
+        "pools": pools,
+        "stats": stats,
     }
 
 
+def _json_body_response(body, status=200):
+    return APP.response_class(body, status=status, mimetype="application/json")
+
+
+def _snapshot_metrics():
+    """Counters and gauges read from the existing stats dicts at scrape time."""
+    samples = {}
+
+    def add(name, kind, help_text, value, **labels):
+        family = samples.setdefault(name, (kind, help_text, []))
+        family[2].append((tuple(sorted(labels.items())), value))
+
+    search = _search_cache_stats()
+    for field, event in (
+        ("hits", "hit"),
+        ("misses", "miss"),
+        ("stale", "stale"),
+        ("coalesced", "coalesced"),
+        ("diskHits", "disk_hit"),
+        ("refreshes", "refresh"),
+    ):
+        add("shop_impress_search_cache_events_total", "counter", "Search cache lookups by outcome.", search[field], event=event)
+    add("shop_impress_search_cache_entries", "gauge", "Entries in the in-memory search cache.", search["entries"])
+    images = _image_cache_stats()
+    for field, event in (("hits", "hit"), ("misses", "miss"), ("evictions", "eviction")):
+        add("shop_impress_image_cache_events_total", "counter", "Decoded image cache lookups by outcome.", images[field], event=event)
+    add("shop_impress_image_cache_bytes", "gauge", "Bytes held by the decoded image cache.", images["bytes"])
+    with RENDER_CACHE_LOCK:
+        renders = dict(RENDER_CACHE)
+    for field, event in (("hits", "hit"), ("misses", "miss"), ("evictions", "eviction")):
+        add("shop_impress_render_cache_events_total", "counter", "Render cache lookups by outcome.", renders[field], event=event)
+    add("shop_impress_render_cache_bytes", "gauge", "Bytes of cached renders on disk.", renders["bytes"])
+    with WARM_POOL["lock"]:
+        pool = dict(WARM_POOL["stats"])
+    for field, value in sorted(pool.items()):
+        add("shop_impress_warm_pool_events_total", "counter", "Warm pool activity.", value, event=field)
+    with GAME_LOCK_STATS_LOCK:
+        lock_stats = dict(GAME_LOCK_STATS)
+    add("shop_impress_game_lock_acquisitions_total", "counter", "Game shard lock acquisitions.", lock_stats["acquisitions"])
+    add("shop_impress_game_lock_contended_total", "counter", "Game shard lock acquisitions that had to wait.", lock_stats["contended"])
+    with RENDER_JOB_LOCK:
+        job_states = {}
+        for job in RENDER_JOBS.values():
+            job_states[job["status"]] = job_states.get(job["status"], 0) + 1
+    for status in ("queued", "running", "ready", "error"):
+        add("shop_impress_render_jobs", "gauge", "Tracked render jobs by status.", job_states.get(status, 0), status=status)
+    with VARIANTS["lock"]:
+        variant_stats = dict(VARIANTS["stats"])
+    for event, value in sorted(variant_stats.items()):
+        add("shop_impress_image_variants_total", "counter", "Responsive image variant builds.", value, event=event)
+    with PHASH_INDEX["lock"]:
+        phash_stats = dict(PHASH_INDEX["stats"])
+        canonical_items = len(PHASH_INDEX["items"])
+    for event, value in sorted(phash_stats.items()):
+        add("shop_impress_phash_events_total", "counter", "Perceptual duplicate index activity.", value, event=event)
+    add("shop_impress_phash_canonical_items", "gauge", "Canonical items in the perceptual index.", canonical_items)
+    probe_stats = _probe_cache_stats()
+    for event in ("hits", "misses", "probes", "errors", "timeouts"):
+        add("shop_impress_image_probe_events_total", "counter", "Search candidate image header probes.", probe_stats[event], event=event)
+    add("shop_impress_image_probe_cache_entries", "gauge", "Cached image header probes.", probe_stats["entries"])
+    add("shop_impress_upstream_inflight", "gauge", "Requests in flight on the async upstream client.", UPSTREAM["inflight"])
+    browser_pool = _browser_pool_stats()
+    for event in ("launches", "navigations", "recycles"):
+        add("shop_impress_browser_pool_events_total", "counter", "Headless browser pool activity.", browser_pool[event], event=event)
+    breaker_states = {"closed": 0, "half-open": 1, "open": 2}
+    for upstream, health in _upstream_health().items():
+        add(
+            "shop_impress_upstream_breaker_state",
+            "gauge",
+            "Circuit breaker state per upstream (0 closed, 1 half-open, 2 open).",
+            breaker_states[health["state"]],
+            upstream=upstream,
+        )
+        add(
+            "shop_impress_upstream_error_rate",
+            "gauge",
+            "Share of failed upstream requests over the breaker window.",
+            health["errorRate"],
+            upstream=upstream,
+        )
+    return samples
+
+
+@APP.before_request
+def _start_request_timing():
+    g.started = time.perf_counter()
+    if request.args.get("debug") == "1":
+        g.trace_token = TIMING_TRACE.set([])
+
+
+@APP.after_request
+def _finish_request_timing(response):
+    started = g.get("started")
+    if started is not None and request.url_rule is not None:
+        _observe(
+            "shop_impress_http_request_seconds",
+            time.perf_counter() - started,
+            route=request.url_rule.rule,
+            method=request.method,
+            status=response.status_code,
+        )
+    return response
+
+
+@APP.teardown_request
+def _reset_request_trace(exc=None):
+    token = g.pop("trace_token", None)
+    if token is not None:
+        TIMING_TRACE.reset(token)
+
+
+def _request_timings():
+    return _timing_breakdown(TIMING_TRACE.get())
+
+
+@APP.get("/api/metrics")
+def metrics():
+    return APP.response_class(_metrics_text(_snapshot_metrics()), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
 @APP.route("/api/preload", methods=["GET", "POST"])
 def preload_items():
     limit = int(request.args.get("limit", str(SHOP_SEARCH_LIMIT)))
     query = request.args.get("q") or request.args.get("query") or SHOP_SEARCH_QUERY
     debug = request.args.get("debug") == "1"
-    if debug:
-        items, meta = _search_shop_products(query, limit, debug=True)
+    items = _warm_pool_for_query(query, limit)
+    if len(items) >= limit:
+        meta = {"source": "pool", "items": len(items)}
+        _update_catalog(items)
     else:
-        items = _search_shop_products(query, limit)
-        meta = None
-
-    _update_catalog(items)
-    thread = threading.Thread(target=_generate_items, args=(items,), daemon=True)
-    thread.start()
+        if debug:
+            items, meta = _search_shop_products(query, limit, debug=True)
+        else:
+            items = _search_shop_products(query, limit)
+            meta = None
+        items = _collapse_handles(items)
+        _update_catalog(items)
+        thread = threading.Thread(target=_generate_items, args=(items,), daemon=True)
+        thread.start()
     response = {"items": items, "count": len(items), "query": query}
     if debug:
         response["debug"] = meta
+        response["timings"] = _request_timings()
     return jsonify(response)
 
 
+@APP.get("/api/pool")
+def warm_pool_status():
+    return jsonify(_warm_pool_status())
+
+
+@APP.get("/api/upstreams")
+def upstream_status():
+    return jsonify(_upstream_stats())
+
+
 @APP.get("/api/catalog")
 def get_catalog():
-    return jsonify(_load_json(CATALOG_PATH, []))
+    query, error = _catalog_query(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    accept_gzip = "gzip" in request.accept_encodings
+    result = _catalog_response(query, accept_gzip)
+    if result is None:
+        return jsonify({"error": "Invalid cursor."}), 400
+    tag, body, gzipped = result
+    response = APP.response_class(body, mimetype="application/json")
+    response.set_etag(tag)
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Accept-Encoding")
+    if gzipped:
+        response.headers["Content-Encoding"] = "gzip"
+    return response.make_conditional(request)
 
 
 @APP.post("/api/render")
@@ -911,8 +3155,7 @@ def render_item():
     if avatar not in ALLOWED_AVATARS:
         return jsonify({"error": "Invalid avatar."}), 400
 
-    items = _load_json(CATALOG_PATH, [])
-    item = next((entry for entry in items if entry.get("id") == item_id), None)
+    item = _catalog_resolve(item_id)
     if not item:
         return jsonify({"error": "Item not found."}), 404
     if item.get("status") != "ready":
@@ -925,22 +3168,79 @@ def render_item():
             if local_path and os.path.isfile(local_path):
                 return jsonify({"itemId": item_id, "renderedImage": existing})
 
-    try:
-        if not base_image:
-            _update_render_state(item_id, avatar, "generating")
-        rendered_url = _render_item_on_avatar(item, avatar, base_image=base_image)
-        if not base_image:
-            _update_render_state(item_id, avatar, "ready", rendered_url=rendered_url)
-        return jsonify({"itemId": item_id, "renderedImage": rendered_url})
-    except Exception as exc:
-        if not base_image:
-            _update_render_state(item_id, avatar, "error", error=str(exc))
-        return jsonify({"error": str(exc)}), 500
+    wants_async = (
+        request.args.get("async") == "1"
+        or payload.get("async") is True
+        or "respond-async" in (request.headers.get("Prefer") or "")
+    )
+    job, created = _submit_render_job(item, avatar, base_image=base_image)
+    if not wants_async:
+        job["done"].wait(RENDER_WAIT_TIMEOUT)
+        if job["status"] == "ready":
+            response = {"itemId": item_id, "renderedImage": job["renderedImage"]}
+            if request.args.get("debug") == "1":
+                response["debug"] = {"payload": dict(job["stats"]), "timings": _timing_breakdown(job["timings"])}
+            return jsonify(response)
+        if job["status"] == "error":
+            return jsonify({"error": job["error"]}), 500
+
+    response = _public_render_job(job)
+    response["coalesced"] = not created
+    response["statusUrl"] = f"/api/render/jobs/{job['id']}"
+    if request.args.get("debug") == "1":
+        response["timings"] = _timing_breakdown(job["timings"])
+    return jsonify(response), 202
+
+
+@APP.post("/api/render/batch")
+def render_batch():
+    if not FAL_API_KEY:
+        return jsonify({"error": "FAI.AI_API_KEY is not set."}), 400
+
+    payload = request.get_json(silent=True) or {}
+    pairs = payload.get("items")
+    if pairs is None:
+        avatars = payload.get("avatars") or ["girl"]
+        pairs = [{"itemId": item_id, "avatar": avatar} for item_id in payload.get("itemIds") or [] for avatar in avatars]
+    if not isinstance(pairs, list) or not pairs:
+        return jsonify({"error": "Missing items."}), 400
+    if len(pairs) > RENDER_BATCH_MAX_ITEMS:
+        return jsonify({"error": f"At most {RENDER_BATCH_MAX_ITEMS} renders per batch."}), 400
+    concurrency = _safe_int(payload.get("concurrency"), RENDER_BATCH_CONCURRENCY)
+    concurrency = min(max(concurrency, 1), max(RENDER_BATCH_MAX_CONCURRENCY, 1))
+
+    return APP.response_class(
+        _render_batch_stream(pairs, concurrency),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@APP.get("/api/render/jobs/<job_id>")
+def render_job_status(job_id):
+    job = _get_render_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found."}), 404
+    response = _public_render_job(job)
+    if request.args.get("debug") == "1":
+        response["timings"] = _timing_breakdown(job["timings"])
+    return jsonify(response)
+
+
+@APP.get("/api/refs/<name>")
+def staged_reference(name):
+    expires = _safe_int(request.args.get("expires"), 0)
+    signature = request.args.get("sig") or ""
+    if expires < time.time() or not hmac.compare_digest(signature, _ref_signature(name, expires)):
+        return jsonify({"error": "Invalid or expired reference."}), 403
+    path = os.path.join(REFS_DIR, os.path.basename(name))
+    if not os.path.isfile(path):
+        return jsonify({"error": "Reference not found."}), 404
+    return send_file(path, max_age=FAL_REF_TTL)
 
 
 @APP.post("/api/multiplayer/create")
 def multiplayer_create():
-    _cleanup_games()
     payload = request.get_json(silent=True) or {}
     prompt_id = payload.get("promptId")
     prompt_label = payload.get("prompt")
@@ -949,14 +3249,24 @@ def multiplayer_create():
     limit = _safe_int(payload.get("limit"), GAME_DEFAULT_LIMIT)
     per_category = _safe_int(payload.get("perCategory"), 3)
     duration = _safe_int(payload.get("durationSeconds"), GAME_DEFAULT_DURATION)
+    deadline = _safe_float(payload.get("deadlineSeconds"), GAME_COLLECT_DEADLINE)
     avatar = payload.get("avatar", "girl")
     name = (payload.get("name") or "Player 1").strip() or "Player 1"
+    debug = request.args.get("debug") == "1"
 
     if avatar not in ALLOWED_AVATARS:
         return jsonify({"error": "Invalid avatar."}), 400
 
+    timings = []
+    late = []
     try:
-        items = _collect_prompt_items(prompt, per_category=per_category)
+        items = _collect_prompt_items(
+            prompt,
+            per_category=per_category,
+            deadline=deadline,
+            timings=timings,
+            late=late,
+        )
         if not items:
             items = _search_shop_products(query, limit)
     except Exception as exc:
@@ -992,19 +3302,21 @@ def multiplayer_create():
             }
         },
         "votes": {},
-        "phase": "waiting",
+        "version": 1,
     }
 
-    with GAME_LOCK:
-        GAMES[game_id] = game
-        state = _serialize_game(game)
+    _game_insert(game)
+    state = _serialize_game(game)
+    _attach_late_items(game_id, late)
 
-    return jsonify({"gameId": game_id, "playerId": player_id, "state": state})
+    response = {"gameId": game_id, "playerId": player_id, "state": state}
+    if debug:
+        response["debug"] = {"categories": timings, "timings": _request_timings()}
+    return jsonify(response)
 
 
 @APP.post("/api/multiplayer/join")
 def multiplayer_join():
-    _cleanup_games()
     payload = request.get_json(silent=True) or {}
     game_id = payload.get("gameId") or request.args.get("gameId")
     avatar = payload.get("avatar", "girl")
@@ -1015,25 +3327,23 @@ def multiplayer_join():
     if avatar not in ALLOWED_AVATARS:
         return jsonify({"error": "Invalid avatar."}), 400
 
-    with GAME_LOCK:
-        game = GAMES.get(game_id)
-        if not game:
-            return jsonify({"error": "Game not found."}), 404
-        if len(game["players"]) >= game.get("maxPlayers", GAME_MAX_PLAYERS):
-            return jsonify({"error": "Game is full."}), 409
-
-        player_id = _make_player_id()
-        if not name:
-            name = f"Player {len(game['players']) + 1}"
+    player_id = _make_player_id()
 
+    def mutate(game):
+        if len(game["players"]) >= game.get("maxPlayers", GAME_MAX_PLAYERS):
+            return "Game is full.", 409
         game["players"][player_id] = {
             "id": player_id,
-            "name": name,
+            "name": name or f"Player {len(game['players']) + 1}",
             "avatar": avatar,
             "joinedAt": time.time(),
         }
-        _touch_game(game)
-        state = _serialize_game(game)
+        return None
+
+    game, error = _game_update(game_id, mutate)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+    state = _serialize_game(game)
 
     return jsonify({"gameId": game_id, "playerId": player_id, "state": state})
 
@@ -1044,14 +3354,70 @@ def multiplayer_state():
     if not game_id:
         return jsonify({"error": "Missing gameId."}), 400
 
-    with GAME_LOCK:
-        game = GAMES.get(game_id)
-        if not game:
+    delta = request.args.get("delta") == "1"
+    since_version = request.args.get("sinceVersion")
+    if since_version is not None:
+        timeout = min(_safe_float(request.args.get("timeout"), GAME_LONG_POLL_TIMEOUT), GAME_LONG_POLL_TIMEOUT)
+        result = _wait_for_game(game_id, _safe_int(since_version, -1), timeout, delta=delta)
+        if result is None:
             return jsonify({"error": "Game not found."}), 404
-        _touch_game(game)
-        state = _serialize_game(game)
+        return _json_body_response(result[1])
+
+    have_version = request.args.get("haveVersion") if delta else None
+    game = _game_get(game_id)
+    if not game:
+        return jsonify({"error": "Game not found."}), 404
+    _game_touch(game_id)
+    body, _ = _serialize_game_body(game, _safe_int(have_version, None))
+
+    return _json_body_response(body)
+
+
+@APP.get("/api/multiplayer/stats")
+def multiplayer_stats():
+    with GAME_LOCK_STATS_LOCK:
+        lock_wait = dict(GAME_LOCK_STATS)
+    store = _game_store_stats()
+    return jsonify(
+        {
+            "games": store["games"],
+            "expiryQueue": store.get("expiryQueue"),
+            "lockShards": len(GAME_LOCK_SHARDS),
+            "lockWait": lock_wait,
+            "store": store,
+        }
+    )
 
-    return jsonify(state)
+
+@APP.get("/api/multiplayer/stream")
+def multiplayer_stream():
+    game_id = request.args.get("gameId")
+    if not game_id:
+        return jsonify({"error": "Missing gameId."}), 400
+    if _game_get(game_id) is None:
+        return jsonify({"error": "Game not found."}), 404
+    since_version = _safe_int(request.args.get("sinceVersion") or request.headers.get("Last-Event-ID"), -1)
+
+    def events():
+        # Only the first event carries the full state; the rest are deltas.
+        version = since_version
+        while True:
+            result = _wait_for_game(game_id, version, GAME_STREAM_KEEPALIVE, delta=True)
+            if result is None:
+                yield "event: gone\ndata: {}\n\n"
+                return
+            current, body, is_delta = result
+            if current <= version:
+                yield ": keepalive\n\n"
+                continue
+            version = current
+            yield f"id: {version}\nevent: {'delta' if is_delta else 'state'}\ndata: {body}\n\n"
+
+    return APP.response_class(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @APP.post("/api/multiplayer/start")
@@ -1063,20 +3429,20 @@ def multiplayer_start():
     if not game_id or not player_id:
         return jsonify({"error": "Missing gameId or playerId."}), 400
 
-    with GAME_LOCK:
-        game = GAMES.get(game_id)
-        if not game:
-            return jsonify({"error": "Game not found."}), 404
+    def mutate(game):
         if game.get("hostId") != player_id:
-            return jsonify({"error": "Only the host can start."}), 403
+            return "Only the host can start.", 403
         if len(game["players"]) < 2:
-            return jsonify({"error": "Need at least 2 players to start."}), 409
+            return "Need at least 2 players to start.", 409
         if game.get("startTime") is None:
             game["startTime"] = time.time()
-        _touch_game(game)
-        state = _serialize_game(game)
+        return None
+
+    game, error = _game_update(game_id, mutate)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
 
-    return jsonify(state)
+    return jsonify(_serialize_game(game))
 
 
 @APP.post("/api/multiplayer/pick")
@@ -1090,23 +3456,27 @@ def multiplayer_pick():
     if not game_id or not player_id or not item_id:
         return jsonify({"error": "Missing gameId, playerId, or itemId."}), 400
 
-    with GAME_LOCK:
-        game = GAMES.get(game_id)
-        if not game:
-            return jsonify({"error": "Game not found."}), 404
+    def mutate(game):
         player = game["players"].get(player_id)
         if not player:
-            return jsonify({"error": "Player not found."}), 404
-        if item_id not in {item["id"] for item in game.get("items", [])}:
-            return jsonify({"error": "Invalid itemId."}), 400
-
-        player["pickedItemId"] = item_id
+            return "Player not found.", 404
+        item_ids = {item["id"] for item in game.get("items", [])}
+        picked_id = item_id
+        if picked_id not in item_ids:
+            canonical = _catalog_resolve(picked_id)
+            picked_id = canonical["id"] if canonical else None
+        if picked_id not in item_ids:
+            return "Invalid itemId.", 400
+        player["pickedItemId"] = picked_id
         if rendered_image:
             player["renderedImage"] = rendered_image
-        _touch_game(game)
-        state = _serialize_game(game)
+        return None
 
-    return jsonify(state)
+    game, error = _game_update(game_id, mutate)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+
+    return jsonify(_serialize_game(game))
 
 
 @APP.post("/api/multiplayer/vote")
@@ -1119,22 +3489,21 @@ def multiplayer_vote():
     if not game_id or not player_id or not vote_for:
         return jsonify({"error": "Missing gameId, playerId, or voteFor."}), 400
 
-    with GAME_LOCK:
-        game = GAMES.get(game_id)
-        if not game:
-            return jsonify({"error": "Game not found."}), 404
+    def mutate(game):
         if player_id not in game["players"]:
-            return jsonify({"error": "Player not found."}), 404
+            return "Player not found.", 404
         if vote_for not in game["players"]:
-            return jsonify({"error": "Invalid vote target."}), 400
+            return "Invalid vote target.", 400
         if player_id == vote_for:
-            return jsonify({"error": "Cannot vote for yourself."}), 400
-
+            return "Cannot vote for yourself.", 400
         game.setdefault("votes", {})[player_id] = vote_for
-        _touch_game(game)
-        state = _serialize_game(game)
+        return None
+
+    game, error = _game_update(game_id, mutate)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
 
-    return jsonify(state)
+    return jsonify(_serialize_game(game))
 
 
 if __name__ == "__main__":
@@ -1142,6 +3511,11 @@ if __name__ == "__main__":
     os.makedirs(UPLOADS_DIR, exist_ok=True)
     os.makedirs(RENDERS_DIR, exist_ok=True)
     os.makedirs(AVATARS_DIR, exist_ok=True)
+    os.makedirs(VARIANTS_DIR, exist_ok=True)
     if not os.path.isfile(CATALOG_PATH):
         _save_json(CATALOG_PATH, [])
+    # Under the debug reloader only the serving child runs the background work.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        threading.Thread(target=_warm_image_cache, name="image-warm", daemon=True).start()
+        _warm_pool_start()
     APP.run(host="0.0.0.0", port=5000, debug=True)
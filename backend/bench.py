@@ -0,0 +1,611 @@
+"""Offline load test for the backend against local stand-ins for shop.app and fal.ai.
+
+Starts a fake shop search page (served from fixtures/), a fake fal image-to-image
+endpoint and a fake CDN in this process, boots the Flask app in a child process
+pointed at them with throwaway data directories, then drives the preload, render
+and multiplayer flows and prints a JSON report.
+
+    python bench.py [--concurrency 16] [--preload-requests 200] [--games 20]
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BACKEND_DIR, "fixtures")
+AVATARS_SRC = os.path.join(BACKEND_DIR, os.pardir, "frontend", "public", "avatars")
+CHALLENGE_FIXTURE = "shop_cloudflare_challenge.html"
+DEFAULT_QUERIES = "hoodie,jeans,sneakers,summer dress,boots,scarf,tote bag,beanie"
+SCENARIOS = ("preload", "render", "batch", "multiplayer")
+
+
+class _Counters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def add(self, name, amount=1):
+        with self.lock:
+            self.values[name] = self.values.get(name, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values)
+
+
+def _percentile(samples, fraction):
+    if not samples:
+        return None
+    index = min(len(samples) - 1, max(0, int(round(fraction * len(samples))) - 1))
+    return samples[index]
+
+
+def _summarize(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    return {
+        "p50Ms": round(_percentile(samples, 0.50) * 1000, 2),
+        "p95Ms": round(_percentile(samples, 0.95) * 1000, 2),
+        "p99Ms": round(_percentile(samples, 0.99) * 1000, 2),
+        "maxMs": round(samples[-1] * 1000, 2),
+        "meanMs": round(sum(samples) / len(samples) * 1000, 2),
+    }
+
+
+def _sleep_ms(base, jitter=0):
+    delay = base + (random.uniform(0, jitter) if jitter else 0)
+    if delay > 0:
+        time.sleep(delay / 1000.0)
+
+
+def _fake_png(key, size):
+    digest = hashlib.sha256(key.encode("utf-8")).digest()
+    image = Image.new("RGB", (size, size), tuple(digest[:3]))
+    image.paste(tuple(digest[3:6]), (size // 4, size // 4, size * 3 // 4, size * 3 // 4))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _parse_range(value, length):
+    """``(start, end)`` for a single ``bytes=`` range within ``length``, else None."""
+    if not value or not value.startswith("bytes=") or "," in value:
+        return None
+    start, _, end = value[len("bytes=") :].partition("-")
+    if not start.isdigit() or int(start) >= length:
+        return None
+    end = int(end) if end.isdigit() else length - 1
+    return int(start), min(end, length - 1)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    upstream = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _drain(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+
+class _ShopHandler(_Handler):
+    def do_GET(self):
+        upstream = self.upstream
+        parsed = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(parsed.query).get("q", [""])[0]
+        upstream.counters.add("shop.requests")
+        _sleep_ms(upstream.args.shop_latency_ms, upstream.args.shop_jitter_ms)
+        if upstream.args.block_rate and random.random() < upstream.args.block_rate:
+            upstream.counters.add("shop.blocked")
+            return self._send(403, upstream.challenge, "text/html; charset=utf-8")
+        self._send(200, upstream.shop_page(query), "text/html; charset=utf-8")
+
+
+class _FalHandler(_Handler):
+    def do_POST(self):
+        upstream = self.upstream
+        self._drain()
+        upstream.counters.add("fal.requests")
+        _sleep_ms(upstream.args.fal_latency_ms, upstream.args.fal_jitter_ms)
+        if upstream.args.fal_throttle_rate and random.random() < upstream.args.fal_throttle_rate:
+            upstream.counters.add("fal.throttled")
+            body = json.dumps({"detail": "Rate limit exceeded."}).encode("utf-8")
+            return self._send(429, body, "application/json", {"Retry-After": str(upstream.args.fal_retry_after)})
+        if upstream.args.fal_error_rate and random.random() < upstream.args.fal_error_rate:
+            upstream.counters.add("fal.errors")
+            body = json.dumps({"detail": "Injected failure."}).encode("utf-8")
+            return self._send(500, body, "application/json")
+        seq = upstream.next_render()
+        body = json.dumps({"images": [{"url": f"{upstream.cdn_url}/renders/{seq}.png"}]}).encode("utf-8")
+        self._send(200, body, "application/json")
+
+
+class _CdnHandler(_Handler):
+    def do_GET(self):
+        upstream = self.upstream
+        path = urllib.parse.urlparse(self.path).path
+        upstream.counters.add("cdn.requests")
+        etag = '"' + hashlib.sha1(path.encode("utf-8")).hexdigest()[:16] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            upstream.counters.add("cdn.notModified")
+            return self._send(304, b"", "image/png", {"ETag": etag})
+        _sleep_ms(upstream.args.cdn_latency_ms)
+        body = upstream.image(path)
+        headers = {"ETag": etag, "Cache-Control": "public, max-age=86400", "Accept-Ranges": "bytes"}
+        byte_range = _parse_range(self.headers.get("Range"), len(body))
+        if byte_range:
+            start, end = byte_range
+            upstream.counters.add("cdn.rangeRequests")
+            upstream.counters.add("cdn.bytes", end - start + 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+            return self._send(206, body[start : end + 1], "image/png", headers)
+        upstream.counters.add("cdn.bytes", len(body))
+        self._send(200, body, "image/png", headers)
+
+    do_HEAD = do_GET
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients drop keep-alive connections when the app process stops.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeUpstreams:
+    """The three fake services, each on its own ephemeral port."""
+
+    def __init__(self, args):
+        self.args = args
+        self.counters = _Counters()
+        self.servers = []
+        self._render_seq = 0
+        self._render_lock = threading.Lock()
+        self._images = {}
+        self._images_lock = threading.Lock()
+        with open(os.path.join(FIXTURES_DIR, args.shop_fixture), "r", encoding="utf-8") as handle:
+            self._page = handle.read()
+        with open(os.path.join(FIXTURES_DIR, CHALLENGE_FIXTURE), "rb") as handle:
+            self.challenge = handle.read()
+        self.shop_url = self._serve(_ShopHandler)
+        self.fal_url = self._serve(_FalHandler)
+        self.cdn_url = self._serve(_CdnHandler)
+
+    def _serve(self, handler):
+        handler_cls = type(handler.__name__, (handler,), {"upstream": self})
+        server = _QuietServer(("127.0.0.1", 0), handler_cls)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def shop_page(self, query):
+        # Per-query CDN prefix so each query yields distinct item ids and images.
+        slug = urllib.parse.quote(query.strip().lower().replace(" ", "-") or "all", safe="")
+        page = self._page.replace("https://cdn.shopify.com/", f"{self.cdn_url}/{slug}/")
+        page = page.replace("https:\\/\\/cdn.shopify.com\\/", f"{self.cdn_url}/{slug}/".replace("/", "\\/"))
+        return page.encode("utf-8")
+
+    def image(self, path):
+        with self._images_lock:
+            cached = self._images.get(path)
+        if cached is None:
+            size = self.args.image_size
+            # A deterministic share of product shots are thumbnails, which search ranking should skip.
+            if int(hashlib.sha1(path.encode("utf-8")).hexdigest()[:8], 16) < self.args.low_res_rate * 0x100000000:
+                size = max(size // 4, 16)
+            cached = _fake_png(path, size)
+            with self._images_lock:
+                self._images[path] = cached
+        return cached
+
+    def next_render(self):
+        with self._render_lock:
+            self._render_seq += 1
+            return self._render_seq
+
+    def close(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _request(base_url, method, path, payload=None, timeout=60):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method=method)
+    if data is not None:
+        req.add_header("Content-Type", "application/json")
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            status, body = response.status, response.read()
+    except urllib.error.HTTPError as exc:
+        status, body = exc.code, exc.read()
+    elapsed = time.perf_counter() - started
+    try:
+        parsed = json.loads(body) if body else None
+    except ValueError:
+        parsed = None
+    return status, parsed, elapsed
+
+
+class _Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, name, elapsed, ok):
+        with self.lock:
+            self.samples.setdefault(name, []).append(elapsed)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def call(self, base_url, name, method, path, payload=None, expect=(200,)):
+        status, body, elapsed = _request(base_url, method, path, payload)
+        self.record(name, elapsed, status in expect)
+        return status, body
+
+    def report(self, seconds):
+        steps = {}
+        total = 0
+        errors = 0
+        for name, samples in sorted(self.samples.items()):
+            total += len(samples)
+            errors += self.errors.get(name, 0)
+            steps[name] = {"requests": len(samples), "errors": self.errors.get(name, 0), **_summarize(samples)}
+        return {
+            "requests": total,
+            "errors": errors,
+            "seconds": round(seconds, 3),
+            "throughputRps": round(total / seconds, 2) if seconds else None,
+            "steps": steps,
+        }
+
+
+def _run_parallel(concurrency, count, task):
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(task, index) for index in range(count)]:
+            try:
+                future.result()
+            except Exception as exc:
+                print(f"bench task failed: {exc}", file=sys.stderr)
+    return time.perf_counter() - started
+
+
+def scenario_preload(base_url, args, queries):
+    recorder = _Recorder()
+
+    def task(index):
+        query = urllib.parse.quote_plus(queries[index % len(queries)])
+        recorder.call(base_url, "preload", "GET", f"/api/preload?q={query}&limit={args.limit}")
+
+    seconds = _run_parallel(args.concurrency, args.preload_requests, task)
+    return recorder.report(seconds)
+
+
+def _wait_ready(base_url, item_ids, timeout):
+    deadline = time.time() + timeout
+    ready = set()
+    while time.time() < deadline:
+        status, catalog, _ = _request(base_url, "GET", "/api/catalog")
+        if status == 200 and isinstance(catalog, list):
+            ready = {item["id"] for item in catalog if item.get("id") in item_ids and item.get("status") == "ready"}
+            if ready >= item_ids:
+                break
+        time.sleep(0.2)
+    return ready
+
+
+def scenario_render(base_url, args, queries):
+    recorder = _Recorder()
+    query = urllib.parse.quote_plus(queries[0])
+    status, body, _ = _request(base_url, "GET", f"/api/preload?q={query}&limit={args.render_items}")
+    items = (body or {}).get("items") or [] if status == 200 else []
+    ready = _wait_ready(base_url, {item["id"] for item in items}, args.ready_timeout)
+    jobs = [(item_id, avatar) for item_id in sorted(ready) for avatar in ("girl", "boy")]
+    if not jobs:
+        return {"requests": 0, "errors": 1, "seconds": 0, "note": "no items became ready"}
+    rounds = max(args.render_rounds, 1)
+
+    def task(index):
+        item_id, avatar = jobs[index % len(jobs)]
+        name = "render" if index < len(jobs) else "render.cached"
+        recorder.call(base_url, name, "POST", "/api/render", {"itemId": item_id, "avatar": avatar})
+
+    seconds = _run_parallel(args.concurrency, len(jobs) * rounds, task)
+    report = recorder.report(seconds)
+    report["items"] = len(ready)
+    return report
+
+
+def scenario_batch(base_url, args, queries):
+    """One streamed batch render over fresh items; records time to each result line."""
+    query = urllib.parse.quote_plus(queries[-1])
+    status, body, _ = _request(base_url, "GET", f"/api/preload?q={query}&limit={args.render_items}")
+    items = (body or {}).get("items") or [] if status == 200 else []
+    ready = _wait_ready(base_url, {item["id"] for item in items}, args.ready_timeout)
+    if not ready:
+        return {"requests": 0, "errors": 1, "seconds": 0, "note": "no items became ready"}
+    payload = {"itemIds": sorted(ready), "avatars": ["girl", "boy"], "concurrency": args.concurrency}
+    req = urllib.request.Request(
+        base_url + "/api/render/batch",
+        data=json.dumps(payload).encode("utf-8"),
+        method="POST",
+        headers={"Content-Type": "application/json"},
+    )
+    recorder = _Recorder()
+    summary = None
+    started = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=600) as response:
+        for line in response:
+            result = json.loads(line)
+            if result.get("done"):
+                summary = result
+                break
+            recorder.record("result", time.perf_counter() - started, result.get("status") == "ready")
+    report = recorder.report(time.perf_counter() - started)
+    report["items"] = len(ready)
+    report["summary"] = summary
+    return report
+
+
+def _play_game(base_url, recorder, args, index):
+    started = time.perf_counter()
+    _, created = recorder.call(
+        base_url,
+        "create",
+        "POST",
+        "/api/multiplayer/create",
+        {"name": f"Host {index}", "durationSeconds": args.draft_seconds, "deadlineSeconds": 5},
+    )
+    if not created or "gameId" not in created:
+        return
+    game_id = created["gameId"]
+    host_id = created["playerId"]
+    items = created["state"]["items"]
+    _, joined = recorder.call(
+        base_url, "join", "POST", "/api/multiplayer/join", {"gameId": game_id, "name": f"Guest {index}", "avatar": "boy"}
+    )
+    if not joined or "playerId" not in joined:
+        return
+    guest_id = joined["playerId"]
+    recorder.call(base_url, "start", "POST", "/api/multiplayer/start", {"gameId": game_id, "playerId": host_id})
+    for offset, player_id in enumerate((host_id, guest_id)):
+        item_id = items[offset % len(items)]["id"]
+        recorder.call(
+            base_url, "pick", "POST", "/api/multiplayer/pick", {"gameId": game_id, "playerId": player_id, "itemId": item_id}
+        )
+
+    version = -1
+    phase = None
+    deadline = time.time() + args.draft_seconds + 30
+    while phase != "vote" and time.time() < deadline:
+        _, state = recorder.call(
+            base_url, "poll", "GET", f"/api/multiplayer/state?gameId={game_id}&sinceVersion={version}&timeout=10"
+        )
+        if not state:
+            return
+        version = state.get("version", version)
+        phase = state.get("phase")
+
+    recorder.call(base_url, "vote", "POST", "/api/multiplayer/vote", {"gameId": game_id, "playerId": host_id, "voteFor": guest_id})
+    _, state = recorder.call(
+        base_url, "vote", "POST", "/api/multiplayer/vote", {"gameId": game_id, "playerId": guest_id, "voteFor": host_id}
+    )
+    recorder.record("lifecycle", time.perf_counter() - started, bool(state) and state.get("phase") == "done")
+
+
+def scenario_multiplayer(base_url, args, queries):
+    recorder = _Recorder()
+    seconds = _run_parallel(args.concurrency, args.games, lambda index: _play_game(base_url, recorder, args, index))
+    report = recorder.report(seconds)
+    lifecycle = report["steps"].pop("lifecycle", {"requests": 0, "errors": 0})
+    report["requests"] -= lifecycle["requests"]
+    report["errors"] -= lifecycle["errors"]
+    report["throughputRps"] = round(report["requests"] / seconds, 2) if seconds else None
+    report["lifecycle"] = lifecycle
+    return report
+
+
+def _peak_rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as handle:
+            for line in handle:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _start_server(upstreams, args, workdir):
+    public_dir = os.path.join(workdir, "public")
+    shutil.copytree(AVATARS_SRC, os.path.join(public_dir, "avatars"))
+    port = _free_port()
+    env = dict(os.environ)
+    env.update(
+        {
+            "PUBLIC_DIR": public_dir,
+            "DATA_DIR": os.path.join(workdir, "data"),
+            "CACHE_DIR": os.path.join(workdir, "cache"),
+            "SHOP_SEARCH_URL": f"{upstreams.shop_url}/search?q=",
+            "FAL_SDXL_TURBO_IMG_ENDPOINT": f"{upstreams.fal_url}/fal-ai/fast-sdxl/image-to-image",
+            "FAL_KEY": "bench",
+            "SHOP_USE_PLAYWRIGHT": "0",
+            "WARM_POOL": "0",
+        }
+    )
+    for assignment in args.env:
+        name, _, value = assignment.partition("=")
+        env[name] = value
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port)],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"server exited with status {process.returncode}")
+        try:
+            _request(base_url, "GET", "/api/catalog", timeout=2)
+            return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise SystemExit("server did not come up within 30s")
+
+
+def serve(port):
+    import logging
+
+    import app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    for path in (app.ATTACHMENTS_DIR, app.UPLOADS_DIR, app.RENDERS_DIR, app.AVATARS_DIR):
+        os.makedirs(path, exist_ok=True)
+    app.APP.run(host="127.0.0.1", port=port, debug=False, threaded=True, use_reloader=False)
+
+
+def run(args):
+    queries = [query.strip() for query in args.queries.split(",") if query.strip()]
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    upstreams = FakeUpstreams(args)
+    workdir = tempfile.mkdtemp(prefix="shop-bench-")
+    process, base_url = _start_server(upstreams, args, workdir)
+    report = {
+        "config": {
+            "concurrency": args.concurrency,
+            "shopFixture": args.shop_fixture,
+            "blockRate": args.block_rate,
+            "falLatencyMs": args.fal_latency_ms,
+            "falErrorRate": args.fal_error_rate,
+            "falThrottleRate": args.fal_throttle_rate,
+            "env": args.env,
+        },
+        "scenarios": {},
+    }
+    runners = {
+        "preload": scenario_preload,
+        "render": scenario_render,
+        "batch": scenario_batch,
+        "multiplayer": scenario_multiplayer,
+    }
+    try:
+        for name in scenarios:
+            report["scenarios"][name] = runners[name](base_url, args, queries)
+        report["serverPeakRssKb"] = _peak_rss_kb(process.pid)
+        status, upstream_stats, _ = _request(base_url, "GET", "/api/upstreams")
+        if status == 200:
+            report["breakers"] = upstream_stats["breakers"]
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        upstreams.close()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    if report.get("serverPeakRssKb") is None:
+        report["serverPeakRssKb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    report["upstream"] = upstreams.counters.snapshot()
+    if args.keep:
+        report["workdir"] = workdir
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--limit", type=int, default=6)
+    parser.add_argument("--preload-requests", type=int, default=200)
+    parser.add_argument("--render-items", type=int, default=6)
+    parser.add_argument("--render-rounds", type=int, default=3)
+    parser.add_argument("--ready-timeout", type=float, default=60.0)
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--draft-seconds", type=int, default=2)
+    parser.add_argument("--shop-fixture", default="shop_search_next_data.html")
+    parser.add_argument("--shop-latency-ms", type=float, default=150.0)
+    parser.add_argument("--shop-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--block-rate", type=float, default=0.0)
+    parser.add_argument("--fal-latency-ms", type=float, default=800.0)
+    parser.add_argument("--fal-jitter-ms", type=float, default=400.0)
+    parser.add_argument("--fal-error-rate", type=float, default=0.0)
+    parser.add_argument("--fal-throttle-rate", type=float, default=0.0, help="fraction of fal calls answered 429")
+    parser.add_argument("--fal-retry-after", type=int, default=1)
+    parser.add_argument("--cdn-latency-ms", type=float, default=20.0)
+    parser.add_argument("--image-size", type=int, default=512)
+    parser.add_argument("--low-res-rate", type=float, default=0.0, help="fraction of CDN images served at 1/4 size")
+    parser.add_argument("--env", action="append", default=[], help="NAME=VALUE passed to the server")
+    parser.add_argument("--output", help="also write the report to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary data directories")
+    parser.add_argument("--verbose", action="store_true", help="show server stderr")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.port)
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    args.concurrency = max(args.concurrency, 1)
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
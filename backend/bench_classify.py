@@ -0,0 +1,156 @@
+"""Throughput benchmark for the product category classifier.
+
+Classifies a few thousand synthetic product titles with the old substring scan, the
+same scan over the full taxonomy's keywords (what the old approach costs once its
+lists grow to that size) and the compiled taxonomy matcher, and checks each against
+a set of labelled titles.
+
+    python bench_classify.py [--titles 5000] [--rounds 5] [--seed 7]
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+
+import taxonomy
+
+
+# The classifier _infer_category used before the compiled taxonomy, kept for comparison.
+LEGACY_BOTTOM = ["pants", "jean", "trouser", "short", "skirt"]
+LEGACY_ACCESSORY = ["hat", "cap", "beanie", "bag", "belt", "watch", "ring", "bracelet", "necklace", "sunglasses"]
+
+LABELLED = [
+    ("Shortsleeve Tee", "", "top"),
+    ("Ring-Spun Cotton Tee", "", "top"),
+    ("Short Sleeve Button Up", "", "top"),
+    ("Oxford Dress Shirt", "", "top"),
+    ("Cap Sleeve Top", "", "top"),
+    ("Graphic Tee", "T-Shirts", "top"),
+    ("Linen Shorts", "", "bottom"),
+    ("Boot Cut Jeans", "", "bottom"),
+    ("Paper Bag Waist Trousers", "", "bottom"),
+    ("The Everyday", "Pants", "bottom"),
+    ("Jean Jacket", "", "outerwear"),
+    ("Women's Puffer Vest", "", "outerwear"),
+    ("Hoodie Dress", "", "dress"),
+    ("Short Sleeve Dress", "", "dress"),
+    ("Shirtdress", "", "dress"),
+    ("Cable Knit Sweaterdress", "", "dress"),
+    ("Leather Chelsea Boots", "", "shoes"),
+    ("Flip-Flops", "", "shoes"),
+    ("Canvas High Top Sneakers", "", "shoes"),
+    ("Bucket Hat", "", "accessory"),
+    ("Watch Cap", "", "accessory"),
+    ("Wool Scarf", "", "accessory"),
+    ("Boot socks", "", "accessory"),
+    ("Fleece Sweatshorts", "", "bottom"),
+]
+
+ADJECTIVES = ["Classic", "Relaxed", "Vintage", "Organic", "Oversized", "Cropped", "Women's", "Men's", "Kids'", "Heavyweight"]
+MATERIALS = ["Cotton", "Linen", "Denim", "Wool", "Ring-Spun", "Fleece", "Leather", "Corduroy", "Satin", "Knit"]
+NOUNS = [
+    "Tee", "Hoodie", "Sweater", "Shortsleeve Shirt", "Tank Top", "Cardigan", "Jeans", "Shorts", "Cargo Pants",
+    "Midi Skirt", "Sundress", "Slip Dress", "Jumpsuit", "Jacket", "Trench Coat", "Puffer Vest", "Sneakers",
+    "Chelsea Boots", "Sandals", "Loafers", "Bucket Hat", "Tote Bag", "Belt", "Beanie", "Scarf", "Necklace",
+]
+PRODUCT_TYPES = ["", "", "", "Apparel", "Tops", "Bottoms", "Dresses", "Outerwear", "Footwear", "Accessories"]
+
+
+def _legacy_category(title, product_type):
+    text = f"{title} {product_type}".lower()
+    if any(word in text for word in LEGACY_BOTTOM):
+        return "bottom"
+    if any(word in text for word in LEGACY_ACCESSORY):
+        return "accessory"
+    return "top"
+
+
+def _legacy_batch(pairs):
+    return [_legacy_category(title, product_type) for title, product_type in pairs]
+
+
+def _substring_batch(pairs):
+    keywords = list(taxonomy.CATEGORY_TAXONOMY["categories"].items())
+    default = taxonomy.CATEGORY_TAXONOMY["default"]
+    categories = []
+    for title, product_type in pairs:
+        text = f"{title} {product_type}".lower()
+        categories.append(
+            next((category for category, words in keywords if any(word in text for word in words)), default)
+        )
+    return categories
+
+
+def _titles(count, seed):
+    rng = random.Random(seed)
+    return [
+        (
+            f"{rng.choice(ADJECTIVES)} {rng.choice(MATERIALS)} {rng.choice(NOUNS)} #{index}",
+            rng.choice(PRODUCT_TYPES),
+        )
+        for index in range(count)
+    ]
+
+
+def _time(classify, pairs, rounds):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        classify(pairs)
+        samples.append(time.perf_counter() - started)
+    median = statistics.median(samples)
+    return {
+        "medianMs": round(median * 1000, 3),
+        "titlesPerSecond": round(len(pairs) / median) if median else None,
+    }
+
+
+def _accuracy(classify):
+    got = classify([(title, product_type) for title, product_type, _ in LABELLED])
+    misses = [
+        {"title": title, "productType": product_type, "expected": expected, "got": category}
+        for (title, product_type, expected), category in zip(LABELLED, got)
+        if category != expected
+    ]
+    return {"correct": len(LABELLED) - len(misses), "total": len(LABELLED), "misses": misses}
+
+
+def run(count, rounds, seed):
+    pairs = _titles(count, seed)
+    started = time.perf_counter()
+    taxonomy._category_matcher()
+    compile_ms = round((time.perf_counter() - started) * 1000, 3)
+    legacy = _legacy_batch(pairs)
+    compiled = taxonomy._infer_categories(pairs)
+    distribution = {}
+    for category in compiled:
+        distribution[category] = distribution.get(category, 0) + 1
+    return {
+        "titles": count,
+        "rounds": rounds,
+        "taxonomyVersion": taxonomy._category_matcher()["version"],
+        "compileMs": compile_ms,
+        "legacy": dict(_time(_legacy_batch, pairs, rounds), labelled=_accuracy(_legacy_batch)),
+        "substringFullTaxonomy": dict(_time(_substring_batch, pairs, rounds), labelled=_accuracy(_substring_batch)),
+        "compiled": dict(_time(taxonomy._infer_categories, pairs, rounds), labelled=_accuracy(taxonomy._infer_categories)),
+        "changed": sum(1 for old, new in zip(legacy, compiled) if old != new),
+        "distribution": dict(sorted(distribution.items())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--titles", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    report = run(max(args.titles, 1), max(args.rounds, 1), args.seed)
+    print(json.dumps(report, indent=2))
+    if report["compiled"]["labelled"]["misses"]:
+        raise SystemExit("compiled taxonomy misclassifies at least one labelled title")
+
+
+if __name__ == "__main__":
+    main()
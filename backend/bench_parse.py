@@ -0,0 +1,77 @@
+"""Parse-time benchmark for the shop search extractors.
+
+Runs the BeautifulSoup parser and the streaming extractor over every saved page in
+fixtures/ and prints a JSON report. Both must produce the same items.
+
+    python bench_parse.py [--rounds 30] [--limit 6]
+"""
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import time
+
+import app
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def _soup_items(html, limit):
+    return app._items_from_candidates(app._parse_shop_search_html(html), limit)[0]
+
+
+def _fast_items(html, limit):
+    return app._items_from_candidates(app._extract_shop_candidates(html), limit)[0]
+
+
+def _time(extract, html, limit, rounds):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        extract(html, limit)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        "medianMs": round(statistics.median(samples) * 1000, 3),
+        "p95Ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+        "minMs": round(samples[0] * 1000, 3),
+    }
+
+
+def run(rounds, limit):
+    report = {"rounds": rounds, "limit": limit, "fixtures": []}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html"))):
+        with open(path, "r", encoding="utf-8") as handle:
+            html = handle.read()
+        soup = _soup_items(html, limit)
+        fast = _fast_items(html, limit)
+        entry = {
+            "fixture": os.path.basename(path),
+            "bytes": len(html.encode("utf-8")),
+            "items": len(fast),
+            "match": [item["id"] for item in soup] == [item["id"] for item in fast],
+            "soup": _time(_soup_items, html, limit, rounds),
+            "fast": _time(_fast_items, html, limit, rounds),
+        }
+        if entry["fast"]["medianMs"]:
+            entry["speedup"] = round(entry["soup"]["medianMs"] / entry["fast"]["medianMs"], 1)
+        report["fixtures"].append(entry)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--limit", type=int, default=app.SHOP_SEARCH_LIMIT)
+    args = parser.parse_args()
+    report = run(max(args.rounds, 1), max(args.limit, 1))
+    print(json.dumps(report, indent=2))
+    if not all(entry["match"] for entry in report["fixtures"]):
+        raise SystemExit("extractors disagree on at least one fixture")
+
+
+if __name__ == "__main__":
+    main()
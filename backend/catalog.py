@@ -0,0 +1,350 @@
+import base64
+import gzip
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+
+from config import (
+    ALLOWED_AVATARS, CATALOG_DB_PATH, CATALOG_PATH, DATA_DIR, _load_json, _safe_float, _safe_int, _save_json_atomic,
+)
+from metrics import _span
+from taxonomy import _reclassify_entries
+
+
+LOCK = threading.Lock()
+CATALOG_EXPORT_DELAY = _safe_float(os.environ.get("CATALOG_EXPORT_DELAY_SECONDS"), 0.5)
+CATALOG_PAGE_MAX = _safe_int(os.environ.get("CATALOG_PAGE_MAX"), 200)
+CATALOG_GZIP_MIN_BYTES = _safe_int(os.environ.get("CATALOG_GZIP_MIN_BYTES"), 1024)
+CATALOG_RESPONSE_CACHE_SIZE = _safe_int(os.environ.get("CATALOG_RESPONSE_CACHE_SIZE"), 64)
+
+# Catalog entries are copy-on-write; treat anything handed out as read-only.
+CATALOG = {
+    "db": None,
+    "items": OrderedDict(),
+    "dirty": threading.Event(),
+    "exporter": None,
+    "version": 0,
+    "epoch": secrets.token_hex(4),
+    "responses": OrderedDict(),
+}
+
+
+def _catalog_write_rows(db, entries):
+    db.executemany(
+        "INSERT OR REPLACE INTO catalog_items (id, position, data) VALUES (?, ?, ?)",
+        [(entry["id"], position, json.dumps(entry)) for position, entry in entries],
+    )
+
+
+def _catalog_db():
+    # Caller holds LOCK.
+    if CATALOG["db"] is not None:
+        return CATALOG["db"]
+    os.makedirs(DATA_DIR, exist_ok=True)
+    db = sqlite3.connect(CATALOG_DB_PATH, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    with db:
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS catalog_items "
+            "(id TEXT PRIMARY KEY, position INTEGER NOT NULL, data TEXT NOT NULL)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS image_index "
+            "(url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, sha256 TEXT NOT NULL, "
+            "public_path TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS image_index_sha256 ON image_index (sha256)")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS image_fingerprints "
+            "(sha256 TEXT PRIMARY KEY, phash TEXT NOT NULL, color TEXT NOT NULL)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS canonical_items "
+            "(id TEXT PRIMARY KEY, phash TEXT NOT NULL, color TEXT NOT NULL, renders TEXT NOT NULL)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS warm_pool "
+            "(pool TEXT PRIMARY KEY, refreshed_at REAL NOT NULL, attempted_at REAL NOT NULL)"
+        )
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS warm_pool_items "
+            "(pool TEXT NOT NULL, position INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (pool, position))"
+        )
+        db.execute("CREATE TABLE IF NOT EXISTS warm_renders (at REAL NOT NULL)")
+    items = CATALOG["items"]
+    items.clear()
+    rows = db.execute("SELECT data FROM catalog_items ORDER BY position").fetchall()
+    for (data,) in rows:
+        entry = json.loads(data)
+        items[entry["id"]] = entry
+    reclassified = _reclassify_entries(items.values())
+    if reclassified:
+        for entry in reclassified:
+            items[entry["id"]] = entry
+        with db:
+            db.executemany(
+                "UPDATE catalog_items SET data = ? WHERE id = ?",
+                [(json.dumps(entry), entry["id"]) for entry in reclassified],
+            )
+    if not rows:
+        try:
+            legacy = _load_json(CATALOG_PATH, [])
+        except ValueError:
+            legacy = []
+        entries = [entry for entry in legacy if isinstance(entry, dict) and entry.get("id")]
+        for entry in entries:
+            items[entry["id"]] = entry
+        with db:
+            _catalog_write_rows(db, enumerate(items.values()))
+    CATALOG["db"] = db
+    return db
+
+
+def _catalog_export_loop():
+    dirty = CATALOG["dirty"]
+    while True:
+        dirty.wait()
+        time.sleep(max(CATALOG_EXPORT_DELAY, 0))
+        dirty.clear()
+        _catalog_export()
+
+
+def _catalog_export():
+    with LOCK:
+        _catalog_db()
+        snapshot = list(CATALOG["items"].values())
+    try:
+        _save_json_atomic(CATALOG_PATH, snapshot)
+    except OSError:
+        CATALOG["dirty"].set()
+
+
+def _catalog_mark_dirty():
+    # Caller holds LOCK.
+    CATALOG["version"] += 1
+    CATALOG["dirty"].set()
+    exporter = CATALOG["exporter"]
+    if exporter is None or not exporter.is_alive():
+        exporter = threading.Thread(target=_catalog_export_loop, name="catalog-export", daemon=True)
+        CATALOG["exporter"] = exporter
+        exporter.start()
+
+
+def _catalog_flush():
+    if CATALOG["dirty"].is_set():
+        CATALOG["dirty"].clear()
+        _catalog_export()
+
+
+def _catalog_get(item_id):
+    with LOCK:
+        _catalog_db()
+        return CATALOG["items"].get(item_id)
+
+
+def _catalog_resolve(item_id):
+    """Like _catalog_get, but follows a duplicate's ``duplicateOf`` to the item it folded into."""
+    with LOCK:
+        _catalog_db()
+        entry = CATALOG["items"].get(item_id)
+        for _ in range(8):
+            if entry is None or entry.get("status") != "duplicate":
+                break
+            entry = CATALOG["items"].get(entry.get("duplicateOf"))
+        return entry
+
+
+def _catalog_patch(item_id, mutate):
+    """Apply ``mutate(entry)`` to a copy of one entry and persist only that row."""
+    with _span("catalog.write"), LOCK:
+        db = _catalog_db()
+        current = CATALOG["items"].get(item_id)
+        if current is None:
+            return None
+        entry = deepcopy(current)
+        mutate(entry)
+        CATALOG["items"][item_id] = entry
+        with db:
+            db.execute(
+                "UPDATE catalog_items SET data = ? WHERE id = ?",
+                (json.dumps(entry), item_id),
+            )
+        _catalog_mark_dirty()
+        return entry
+
+
+def _catalog_apply(patches=None, removals=()):
+    """Apply several field patches and removals in one transaction."""
+    with _span("catalog.write"), LOCK:
+        db = _catalog_db()
+        catalog = CATALOG["items"]
+        rows = []
+        for item_id, fields in (patches or {}).items():
+            current = catalog.get(item_id)
+            if current is None:
+                continue
+            entry = deepcopy(current)
+            entry.update(fields)
+            catalog[item_id] = entry
+            rows.append((json.dumps(entry), item_id))
+        removed = [(item_id,) for item_id in removals if catalog.pop(item_id, None) is not None]
+        if not rows and not removed:
+            return
+        with db:
+            db.executemany("UPDATE catalog_items SET data = ? WHERE id = ?", rows)
+            db.executemany("DELETE FROM catalog_items WHERE id = ?", removed)
+        _catalog_mark_dirty()
+
+
+def _update_catalog(items):
+    entries = [deepcopy(item) for item in items if item.get("id")]
+    with _span("catalog.write"), LOCK:
+        db = _catalog_db()
+        catalog = CATALOG["items"]
+        catalog.clear()
+        for entry in entries:
+            catalog[entry["id"]] = entry
+        with db:
+            db.execute("DELETE FROM catalog_items")
+            _catalog_write_rows(db, enumerate(catalog.values()))
+        _catalog_mark_dirty()
+
+
+def _update_render_state(item_id, avatar, status, rendered_url=None, error=None):
+    def mutate(entry):
+        render_status = entry.get("renderStatus") or {}
+        render_status[avatar] = status
+        entry["renderStatus"] = render_status
+        if rendered_url:
+            rendered = entry.get("renderedImages") or {}
+            rendered[avatar] = rendered_url
+            entry["renderedImages"] = rendered
+        if error:
+            render_errors = entry.get("renderErrors") or {}
+            render_errors[avatar] = error
+            entry["renderErrors"] = render_errors
+
+    _catalog_patch(item_id, mutate)
+
+
+CATALOG_FILTERS = ("category", "status", "renderStatus", "fields")
+
+
+def _catalog_query(args):
+    """Normalize /api/catalog query arguments; returns ``(query, error)``."""
+    query = {}
+    for name in CATALOG_FILTERS:
+        query[name] = tuple(sorted({part.strip() for part in args.get(name, "").split(",") if part.strip()}))
+    query["avatar"] = args.get("avatar") or None
+    query["cursor"] = args.get("cursor") or None
+    query["limit"] = None
+    if "limit" in args:
+        limit = _safe_int(args.get("limit"), 0)
+        if limit <= 0:
+            return None, "limit must be a positive integer."
+        query["limit"] = min(limit, max(CATALOG_PAGE_MAX, 1))
+    if query["renderStatus"] and query["avatar"] not in ALLOWED_AVATARS:
+        return None, "renderStatus needs a valid avatar."
+    return tuple(sorted(query.items())), None
+
+
+def _catalog_matches(entry, query):
+    if query["category"] and entry.get("category") not in query["category"]:
+        return False
+    if query["status"] and entry.get("status") not in query["status"]:
+        return False
+    if not query["status"] and entry.get("status") == "duplicate":
+        return False
+    if query["renderStatus"]:
+        state = (entry.get("renderStatus") or {}).get(query["avatar"]) or "none"
+        if state not in query["renderStatus"]:
+            return False
+    return True
+
+
+def _encode_catalog_cursor(index, item_id):
+    return base64.urlsafe_b64encode(f"{index}:{item_id}".encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _catalog_cursor_start(entries, cursor):
+    """Index just after the cursor's item; falls back to its position if it was removed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        index, item_id = raw.split(":", 1)
+        index = int(index)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if 0 <= index < len(entries) and entries[index].get("id") == item_id:
+        return index + 1
+    for position, entry in enumerate(entries):
+        if entry.get("id") == item_id:
+            return position + 1
+    return min(max(index, 0), len(entries))
+
+
+def _catalog_body(entries, query):
+    """Serialize one catalog query as a plain list, or a page envelope when paged."""
+    query = dict(query)
+    fields = set(query["fields"])
+    if fields:
+        fields.add("id")
+    start = 0
+    if query["cursor"]:
+        start = _catalog_cursor_start(entries, query["cursor"])
+        if start is None:
+            return None
+    page = []
+    last_index = start - 1
+    has_more = False
+    for index in range(start, len(entries)):
+        entry = entries[index]
+        if not _catalog_matches(entry, query):
+            continue
+        if query["limit"] is not None and len(page) >= query["limit"]:
+            has_more = True
+            break
+        page.append({key: entry[key] for key in fields if key in entry} if fields else entry)
+        last_index = index
+    next_cursor = _encode_catalog_cursor(last_index, page[-1]["id"]) if has_more else None
+    if query["limit"] is None and query["cursor"] is None:
+        return json.dumps(page)
+    return json.dumps({"items": page, "nextCursor": next_cursor})
+
+
+def _catalog_response(query, accept_gzip):
+    """Return ``(etag, body, gzipped)`` for a query, serializing at most once per catalog version."""
+    cache_key = (query, accept_gzip)
+    with LOCK:
+        _catalog_db()
+        version = CATALOG["version"]
+        cached = CATALOG["responses"].get(cache_key)
+        if cached is not None and cached[0] == version:
+            CATALOG["responses"].move_to_end(cache_key)
+            return cached[1:]
+        entries = list(CATALOG["items"].values())
+    with _span("catalog.serialize"):
+        body = _catalog_body(entries, query)
+        if body is None:
+            return None
+        body = body.encode("utf-8")
+        tag = f"{CATALOG['epoch']}-{version}-{hashlib.sha1(repr(query).encode('utf-8')).hexdigest()[:12]}"
+        gzipped = accept_gzip and len(body) >= CATALOG_GZIP_MIN_BYTES
+        if gzipped:
+            body = gzip.compress(body, compresslevel=6)
+            tag += "-gz"
+    with LOCK:
+        responses = CATALOG["responses"]
+        current = responses.get(cache_key)
+        if current is None or current[0] <= version:
+            responses[cache_key] = (version, tag, body, gzipped)
+            responses.move_to_end(cache_key)
+            while len(responses) > max(CATALOG_RESPONSE_CACHE_SIZE, 1):
+                responses.popitem(last=False)
+    return tag, body, gzipped
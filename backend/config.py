@@ -0,0 +1,75 @@
+import json
+import os
+import threading
+
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+PUBLIC_DIR = os.environ.get("PUBLIC_DIR") or os.path.join(ROOT_DIR, "frontend", "public")
+ATTACHMENTS_DIR = os.path.join(PUBLIC_DIR, "attachments")
+UPLOADS_DIR = os.path.join(PUBLIC_DIR, "uploads")
+RENDERS_DIR = os.path.join(PUBLIC_DIR, "renders")
+AVATARS_DIR = os.path.join(PUBLIC_DIR, "avatars")
+VARIANTS_DIR = os.path.join(PUBLIC_DIR, "variants")
+CATALOG_PATH = os.path.join(ATTACHMENTS_DIR, "catalog.json")
+CACHE_DIR = os.environ.get("CACHE_DIR") or os.path.join(ROOT_DIR, "backend", "cache")
+SEARCH_CACHE_DIR = os.path.join(CACHE_DIR, "search")
+REFS_DIR = os.path.join(CACHE_DIR, "refs")
+DATA_DIR = os.environ.get("DATA_DIR") or os.path.join(ROOT_DIR, "backend", "data")
+CATALOG_DB_PATH = os.path.join(DATA_DIR, "catalog.sqlite3")
+GAMES_DB_PATH = os.environ.get("MULTI_GAME_DB") or os.path.join(DATA_DIR, "games.sqlite3")
+ALLOWED_AVATARS = {"girl", "boy"}
+
+
+def _load_env_file():
+    env_path = os.path.join(ROOT_DIR, ".env")
+    if not os.path.isfile(env_path):
+        return
+    with open(env_path, "r", encoding="utf-8") as handle:
+        for raw_line in handle:
+            line = raw_line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            key = key.strip()
+            value = value.strip().strip('"').strip("'")
+            if key and key not in os.environ:
+                os.environ[key] = value
+
+
+_load_env_file()
+
+
+def _safe_int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _safe_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _load_json(path, default):
+    if not os.path.isfile(path):
+        return default
+    with open(path, "r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def _save_json(path, data):
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(data, handle, indent=2)
+
+
+def _save_json_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(data, handle)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
@@ -0,0 +1,454 @@
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from config import DATA_DIR, GAMES_DB_PATH, _safe_float, _safe_int
+from metrics import LOCK_WAIT_BUCKETS, _observe
+
+
+GAMES = {}
+GAME_WAITERS = {}
+GAME_SNAPSHOTS = {}
+GAME_TTL_SECONDS = _safe_int(os.environ.get("MULTI_GAME_TTL_SECONDS"), 60 * 60)
+GAME_SNAPSHOT_HISTORY = _safe_int(os.environ.get("MULTI_SNAPSHOT_HISTORY"), 16)
+GAME_LOCK_SHARD_COUNT = _safe_int(os.environ.get("MULTI_LOCK_SHARDS"), 64)
+# "memory" serves games from this process only; "sqlite" shares them between workers.
+GAME_STORE_BACKEND = os.environ.get("MULTI_GAME_STORE", "memory").strip().lower()
+GAME_STORE_POLL_INTERVAL = _safe_float(os.environ.get("MULTI_STORE_POLL_SECONDS"), 0.25)
+GAME_TOUCH_INTERVAL = _safe_float(os.environ.get("MULTI_TOUCH_INTERVAL_SECONDS"), 15.0)
+GAME_PHASES = ("waiting", "draft", "vote", "done")
+
+# Fixed table of shard locks for per-game critical sections.
+GAME_LOCK_SHARDS = [threading.Lock() for _ in range(max(GAME_LOCK_SHARD_COUNT, 1))]
+GAME_LOCK_STATS_LOCK = threading.Lock()
+GAME_LOCK_STATS = {"acquisitions": 0, "contended": 0, "waitSeconds": 0.0, "maxWaitSeconds": 0.0}
+
+
+def _game_shard(game_id):
+    return GAME_LOCK_SHARDS[hash(game_id) % len(GAME_LOCK_SHARDS)]
+
+
+@contextmanager
+def _game_locked(game_id):
+    """Hold ``game_id``'s shard lock, recording how long it took to get it."""
+    lock = _game_shard(game_id)
+    waited = 0.0
+    if not lock.acquire(blocking=False):
+        started = time.perf_counter()
+        lock.acquire()
+        waited = time.perf_counter() - started
+    try:
+        with GAME_LOCK_STATS_LOCK:
+            GAME_LOCK_STATS["acquisitions"] += 1
+            if waited:
+                GAME_LOCK_STATS["contended"] += 1
+                GAME_LOCK_STATS["waitSeconds"] += waited
+                GAME_LOCK_STATS["maxWaitSeconds"] = max(GAME_LOCK_STATS["maxWaitSeconds"], waited)
+        if waited:
+            _observe("shop_impress_game_lock_wait_seconds", waited, buckets=LOCK_WAIT_BUCKETS)
+        yield
+    finally:
+        lock.release()
+
+
+# Updates are compare-and-set on the stored version.
+GAME_STORE = {
+    "lock": threading.Lock(),
+    "local": threading.local(),
+    "ready": False,
+    "reaper": None,
+    "stats": {"updates": 0, "conflicts": 0, "aborted": 0, "reaped": 0},
+}
+
+
+def _copy_game(game):
+    copied = dict(game)
+    copied["players"] = {player_id: dict(player) for player_id, player in game["players"].items()}
+    copied["votes"] = dict(game.get("votes", {}))
+    copied["items"] = list(game.get("items", []))
+    return copied
+
+
+def _game_store_db():
+    local = GAME_STORE["local"]
+    db = getattr(local, "db", None)
+    if db is not None:
+        return db
+    os.makedirs(DATA_DIR, exist_ok=True)
+    db = sqlite3.connect(GAMES_DB_PATH, timeout=10, isolation_level=None, check_same_thread=False)
+    db.execute("PRAGMA busy_timeout=10000")
+    db.execute("PRAGMA synchronous=NORMAL")
+    with GAME_STORE["lock"]:
+        if not GAME_STORE["ready"]:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS games "
+                "(id TEXT PRIMARY KEY, version INTEGER NOT NULL, data TEXT NOT NULL, touched_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS games_touched_at ON games (touched_at)")
+            GAME_STORE["ready"] = True
+            reaper = threading.Thread(target=_reap_stored_games, name="game-reaper", daemon=True)
+            GAME_STORE["reaper"] = reaper
+            reaper.start()
+    local.db = db
+    return db
+
+
+def _game_get(game_id):
+    if GAME_STORE_BACKEND != "sqlite":
+        return GAMES.get(game_id)
+    row = _game_store_db().execute("SELECT data FROM games WHERE id = ?", (game_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def _game_insert(game):
+    if GAME_STORE_BACKEND != "sqlite":
+        with _game_locked(game["id"]):
+            GAMES[game["id"]] = game
+        _schedule_game_expiry(game["id"], game["updatedAt"] + GAME_TTL_SECONDS)
+        return
+    _game_store_db().execute(
+        "INSERT INTO games (id, version, data, touched_at) VALUES (?, ?, ?, ?)",
+        (game["id"], game["version"], json.dumps(game), game["updatedAt"]),
+    )
+
+
+def _game_update(game_id, mutate):
+    """Apply ``mutate`` to a copy of the game and store it under the next version."""
+    stats = GAME_STORE["stats"]
+    if GAME_STORE_BACKEND != "sqlite":
+        with _game_locked(game_id):
+            current = GAMES.get(game_id)
+            if current is None:
+                return None, ("Game not found.", 404)
+            game = _copy_game(current)
+            error = mutate(game)
+            if error is not None:
+                with GAME_STORE["lock"]:
+                    stats["aborted"] += 1
+                return current, error
+            game["version"] = current.get("version", 0) + 1
+            game["updatedAt"] = time.time()
+            GAMES[game_id] = game
+            with GAME_STORE["lock"]:
+                stats["updates"] += 1
+            waiters = GAME_WAITERS.get(game_id)
+            if waiters:
+                waiters.notify_all()
+        return game, None
+
+    db = _game_store_db()
+    while True:
+        row = db.execute("SELECT version, data FROM games WHERE id = ?", (game_id,)).fetchone()
+        if row is None:
+            return None, ("Game not found.", 404)
+        version, data = row
+        game = json.loads(data)
+        error = mutate(game)
+        if error is not None:
+            with GAME_STORE["lock"]:
+                stats["aborted"] += 1
+            return json.loads(data), error
+        game["version"] = version + 1
+        game["updatedAt"] = time.time()
+        written = db.execute(
+            "UPDATE games SET version = ?, data = ?, touched_at = ? WHERE id = ? AND version = ?",
+            (game["version"], json.dumps(game), game["updatedAt"], game_id, version),
+        ).rowcount
+        with GAME_STORE["lock"]:
+            if written:
+                stats["updates"] += 1
+                waiters = GAME_WAITERS.get(game_id)
+                if waiters:
+                    waiters.notify_all()
+                return game, None
+            stats["conflicts"] += 1
+
+
+def _game_touch(game_id):
+    now = time.time()
+    if GAME_STORE_BACKEND != "sqlite":
+        game = GAMES.get(game_id)
+        if game is not None:
+            game["updatedAt"] = now
+        return
+    _game_store_db().execute(
+        "UPDATE games SET touched_at = ? WHERE id = ? AND touched_at < ?",
+        (now, game_id, now - GAME_TOUCH_INTERVAL),
+    )
+
+
+def _game_wait_changed(game_id, version, timeout):
+    """Block until the stored version moves past ``version`` or ``timeout`` expires."""
+    if timeout <= 0:
+        return
+    if GAME_STORE_BACKEND != "sqlite":
+        with _game_locked(game_id):
+            game = GAMES.get(game_id)
+            if game is None or game.get("version", 0) != version:
+                return
+            waiters = GAME_WAITERS.get(game_id)
+            if waiters is None:
+                waiters = threading.Condition(_game_shard(game_id))
+                GAME_WAITERS[game_id] = waiters
+            waiters.wait(timeout)
+        return
+
+    db = _game_store_db()
+    give_up = time.time() + timeout
+    while True:
+        row = db.execute("SELECT version FROM games WHERE id = ?", (game_id,)).fetchone()
+        remaining = give_up - time.time()
+        if row is None or row[0] != version or remaining <= 0:
+            return
+        with GAME_STORE["lock"]:
+            waiters = GAME_WAITERS.get(game_id)
+            if waiters is None:
+                waiters = threading.Condition(GAME_STORE["lock"])
+                GAME_WAITERS[game_id] = waiters
+            waiters.wait(min(remaining, GAME_STORE_POLL_INTERVAL))
+
+
+def _game_store_stats():
+    stats = {"backend": GAME_STORE_BACKEND}
+    if GAME_STORE_BACKEND != "sqlite":
+        stats["games"] = len(GAMES)
+        with GAME_EXPIRY:
+            stats["expiryQueue"] = len(GAME_EXPIRY_HEAP)
+    else:
+        stats["games"] = _game_store_db().execute("SELECT COUNT(*) FROM games").fetchone()[0]
+        stats["path"] = GAMES_DB_PATH
+    with GAME_STORE["lock"]:
+        stats.update(GAME_STORE["stats"])
+    return stats
+
+
+def _reap_stored_games():
+    db = sqlite3.connect(GAMES_DB_PATH, timeout=10, isolation_level=None)
+    db.execute("PRAGMA busy_timeout=10000")
+    interval = max(1.0, min(60.0, GAME_TTL_SECONDS / 4))
+    while True:
+        time.sleep(interval)
+        try:
+            reaped = db.execute(
+                "DELETE FROM games WHERE touched_at < ?", (time.time() - GAME_TTL_SECONDS,)
+            ).rowcount
+            known = set(GAME_SNAPSHOTS) | set(GAME_WAITERS)
+            live = {
+                game_id
+                for game_id in known
+                if db.execute("SELECT 1 FROM games WHERE id = ?", (game_id,)).fetchone()
+            }
+        except sqlite3.Error:
+            continue
+        gone = known - live
+        for game_id in gone:
+            with _game_locked(game_id):
+                GAME_SNAPSHOTS.pop(game_id, None)
+        with GAME_STORE["lock"]:
+            GAME_STORE["stats"]["reaped"] += reaped
+            for game_id in gone:
+                waiters = GAME_WAITERS.pop(game_id, None)
+                if waiters:
+                    waiters.notify_all()
+
+
+# Min-heap of (deadline, game_id); the reaper re-checks updatedAt when an entry comes due.
+GAME_EXPIRY = threading.Condition()
+GAME_EXPIRY_HEAP = []
+GAME_REAPER = {"thread": None}
+
+
+def _schedule_game_expiry(game_id, deadline):
+    with GAME_EXPIRY:
+        heapq.heappush(GAME_EXPIRY_HEAP, (deadline, game_id))
+        if GAME_EXPIRY_HEAP[0][1] == game_id:
+            GAME_EXPIRY.notify()
+        reaper = GAME_REAPER["thread"]
+        if reaper is None or not reaper.is_alive():
+            reaper = threading.Thread(target=_reap_games, name="game-reaper", daemon=True)
+            GAME_REAPER["thread"] = reaper
+            reaper.start()
+
+
+def _reap_games():
+    while True:
+        with GAME_EXPIRY:
+            while not GAME_EXPIRY_HEAP or GAME_EXPIRY_HEAP[0][0] > time.time():
+                timeout = GAME_EXPIRY_HEAP[0][0] - time.time() if GAME_EXPIRY_HEAP else None
+                GAME_EXPIRY.wait(timeout)
+            _, game_id = heapq.heappop(GAME_EXPIRY_HEAP)
+        with _game_locked(game_id):
+            game = GAMES.get(game_id)
+            if game is None:
+                continue
+            deadline = game.get("updatedAt", game.get("createdAt", 0)) + GAME_TTL_SECONDS
+            if deadline <= time.time():
+                del GAMES[game_id]
+                GAME_SNAPSHOTS.pop(game_id, None)
+                with GAME_STORE["lock"]:
+                    GAME_STORE["stats"]["reaped"] += 1
+                waiters = GAME_WAITERS.pop(game_id, None)
+                if waiters:
+                    waiters.notify_all()
+                continue
+        _schedule_game_expiry(game_id, deadline)
+
+
+def _game_deadline(game):
+    if game.get("startTime") is None:
+        return None
+    end_time = game["startTime"] + game["durationSeconds"]
+    return end_time if end_time > time.time() else None
+
+
+def _game_version(game):
+    # Clock-driven phase changes are folded into the stored version.
+    phase, _ = _compute_game_phase(game)
+    return game.get("version", 0) * len(GAME_PHASES) + GAME_PHASES.index(phase)
+
+
+def _wait_for_game(game_id, since_version, timeout, delta=False):
+    """Wait until the game's version passes ``since_version``; None once the game is gone."""
+    give_up = time.time() + max(timeout, 0)
+    while True:
+        game = _game_get(game_id)
+        if not game:
+            return None
+        version = _game_version(game)
+        now = time.time()
+        if version > since_version or now >= give_up:
+            _game_touch(game_id)
+            body, is_delta = _serialize_game_body(game, since_version if delta else None)
+            return version, body, is_delta
+        wake_at = give_up
+        deadline = _game_deadline(game)
+        if deadline is not None:
+            wake_at = min(wake_at, deadline + 0.05)
+        _game_wait_changed(game_id, game.get("version", 0), wake_at - now)
+
+
+def _public_player(player):
+    return {
+        "id": player["id"],
+        "name": player.get("name"),
+        "avatar": player.get("avatar"),
+        "pickedItemId": player.get("pickedItemId"),
+        "renderedImage": player.get("renderedImage"),
+    }
+
+
+def _compute_game_phase(game):
+    now = time.time()
+    phase = "waiting"
+    time_remaining = None
+
+    if game.get("startTime") is not None:
+        end_time = game["startTime"] + game["durationSeconds"]
+        time_remaining = max(0, int(end_time - now))
+        phase = "draft" if now < end_time else "vote"
+
+    if phase == "vote":
+        votes = game.get("votes", {})
+        players = list(game["players"].values())
+        if players and len(votes) >= len(players):
+            phase = "done"
+
+    return phase, time_remaining
+
+
+def _compute_winner(game, phase):
+    if phase != "done":
+        return None, False
+
+    votes = game.get("votes", {})
+    tally = {player_id: 0 for player_id in game["players"].keys()}
+    for target in votes.values():
+        if target in tally:
+            tally[target] += 1
+
+    if not tally:
+        return None, True
+
+    max_votes = max(tally.values())
+    winners = [player_id for player_id, count in tally.items() if count == max_votes]
+    if len(winners) == 1:
+        return winners[0], False
+    return None, True
+
+
+def _game_snapshot(game):
+    """Return ``(snapshot, time_remaining)`` for the game's current version."""
+    phase, time_remaining = _compute_game_phase(game)
+    version = _game_version(game)
+    with _game_locked(game["id"]):
+        snapshot = GAME_SNAPSHOTS.get(game["id"])
+    if snapshot and snapshot["version"] == version:
+        return snapshot, time_remaining
+
+    winner, tie = _compute_winner(game, phase)
+    state = {
+        "gameId": game["id"],
+        "version": version,
+        "prompt": game.get("prompt"),
+        "promptId": game.get("promptId"),
+        "hostId": game.get("hostId"),
+        "maxPlayers": game.get("maxPlayers"),
+        "phase": phase,
+        "durationSeconds": game["durationSeconds"],
+        "items": list(game.get("items", [])),
+        "players": [_public_player(player) for player in game["players"].values()],
+        "votes": dict(game.get("votes", {})),
+        "winner": winner,
+        "tie": tie,
+    }
+    fragments = {key: json.dumps(value) for key, value in state.items()}
+    built = {
+        "version": version,
+        "state": state,
+        "fragments": fragments,
+        "history": OrderedDict(),
+        "prefix": "{" + ", ".join(f"{json.dumps(key)}: {value}" for key, value in fragments.items()),
+    }
+    with _game_locked(game["id"]):
+        snapshot = GAME_SNAPSHOTS.get(game["id"])
+        if snapshot and snapshot["version"] >= version:
+            built["history"] = snapshot["history"]
+            return (snapshot if snapshot["version"] == version else built), time_remaining
+        history = snapshot["history"] if snapshot else OrderedDict()
+        history[version] = fragments
+        while len(history) > max(GAME_SNAPSHOT_HISTORY, 1):
+            history.popitem(last=False)
+        built["history"] = history
+        GAME_SNAPSHOTS[game["id"]] = built
+    return built, time_remaining
+
+
+def _serialize_game(game):
+    snapshot, time_remaining = _game_snapshot(game)
+    return dict(snapshot["state"], timeRemaining=time_remaining)
+
+
+def _serialize_game_body(game, base_version=None):
+    """Return ``(json_text, is_delta)`` for the game state."""
+    snapshot, time_remaining = _game_snapshot(game)
+    remaining = json.dumps(time_remaining)
+    base = snapshot["history"].get(base_version) if base_version is not None else None
+    if base is None:
+        return f'{snapshot["prefix"]}, "timeRemaining": {remaining}}}', False
+    changes = [
+        f"{json.dumps(key)}: {value}"
+        for key, value in snapshot["fragments"].items()
+        if base.get(key) != value
+    ]
+    changes.append(f'"timeRemaining": {remaining}')
+    body = (
+        f'{{"gameId": {json.dumps(game["id"])}, "version": {snapshot["version"]}, '
+        f'"baseVersion": {base_version}, "delta": true, "changes": {{{", ".join(changes)}}}}}'
+    )
+    return body, True
@@ -0,0 +1,133 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Histogram buckets are stored non-cumulative and summed when rendered.
+METRICS_LOCK = threading.Lock()
+METRICS = {"counters": {}, "histograms": {}}
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LOCK_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+METRIC_HELP = {
+    "shop_impress_stage_seconds": ("histogram", "Time spent in each backend stage."),
+    "shop_impress_http_request_seconds": ("histogram", "API request latency by route."),
+    "shop_impress_game_lock_wait_seconds": ("histogram", "Wait for a contended game shard lock."),
+    "shop_impress_upstream_responses_total": ("counter", "Upstream HTTP responses by upstream and status code."),
+    "shop_impress_upstream_failures_total": ("counter", "Upstream requests that failed before a response."),
+    "shop_impress_cloudflare_blocks_total": ("counter", "Shop search pages that came back as a Cloudflare challenge."),
+    "shop_impress_fal_retries_total": ("counter", "fal calls retried after a 429 or 5xx, by status."),
+    "shop_impress_upstream_request_seconds": ("histogram", "Upstream time to response headers, by upstream."),
+    "shop_impress_upstream_retries_total": ("counter", "Idempotent upstream requests retried after a failure."),
+    "shop_impress_upstream_short_circuits_total": ("counter", "Upstream calls refused by an open circuit breaker."),
+    "shop_impress_upstream_breaker_opens_total": ("counter", "Times an upstream circuit breaker opened."),
+}
+TIMING_TRACE = contextvars.ContextVar("timing_trace", default=None)
+
+
+def _metric_key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _count(name, amount=1, **labels):
+    key = _metric_key(name, labels)
+    with METRICS_LOCK:
+        METRICS["counters"][key] = METRICS["counters"].get(key, 0) + amount
+
+
+def _observe(name, seconds, buckets=STAGE_BUCKETS, **labels):
+    key = _metric_key(name, labels)
+    with METRICS_LOCK:
+        histogram = METRICS["histograms"].get(key)
+        if histogram is None:
+            histogram = {"le": buckets, "counts": [0] * (len(buckets) + 1), "sum": 0.0}
+            METRICS["histograms"][key] = histogram
+        histogram["counts"][bisect.bisect_left(histogram["le"], seconds)] += 1
+        histogram["sum"] += seconds
+
+
+@contextmanager
+def _span(stage):
+    """Time a block into the stage histogram and the current timing trace, if any."""
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        _observe("shop_impress_stage_seconds", elapsed, stage=stage)
+        trace = TIMING_TRACE.get()
+        if trace is not None:
+            entry = {"stage": stage, "ms": round(elapsed * 1000, 2)}
+            if failed:
+                entry["error"] = True
+            trace.append(entry)
+
+
+def _timing_breakdown(trace):
+    stages = {}
+    for entry in trace or ():
+        total = stages.setdefault(entry["stage"], {"count": 0, "ms": 0.0})
+        total["count"] += 1
+        total["ms"] = round(total["ms"] + entry["ms"], 2)
+    return {"stages": stages, "spans": list(trace or ())}
+
+
+async def _with_trace(coro, trace):
+    # Tasks get their own context, so the trace has to be set inside the task.
+    TIMING_TRACE.set(trace)
+    return await coro
+
+
+def _metric_labels(labels):
+    if not labels:
+        return ""
+    escaped = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _metric_number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def _metrics_text(snapshot):
+    with METRICS_LOCK:
+        counters = dict(METRICS["counters"])
+        histograms = {key: dict(value, counts=list(value["counts"])) for key, value in METRICS["histograms"].items()}
+    families = {}
+    for (name, labels), value in counters.items():
+        families.setdefault(name, []).append((labels, value))
+    for (name, labels), histogram in histograms.items():
+        families.setdefault(name, []).append((labels, histogram))
+
+    lines = []
+    for name in sorted(set(families) | set(METRIC_HELP)):
+        kind, help_text = METRIC_HELP.get(name, ("untyped", ""))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(families.get(name, ())):
+            if kind != "histogram":
+                lines.append(f"{name}{_metric_labels(labels)} {_metric_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(value["le"] + (float("inf"),), value["counts"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _metric_number(float(bound))
+                lines.append(f"{name}_bucket{_metric_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_metric_labels(labels)} {_metric_number(value['sum'])}")
+            lines.append(f"{name}_count{_metric_labels(labels)} {cumulative}")
+    for name, (kind, help_text, values) in snapshot.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in values:
+            lines.append(f"{name}{_metric_labels(labels)} {_metric_number(value)}")
+    return "\n".join(lines) + "\n"
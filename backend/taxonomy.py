@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+from config import _load_json
+
+
+# CATEGORY_TAXONOMY_PATH may point at a JSON file of the same shape.
+CATEGORY_TAXONOMY_PATH = os.environ.get("CATEGORY_TAXONOMY_PATH", "")
+CATEGORY_TAXONOMY = {
+    "default": "top",
+    "weights": {"productType": 3.0, "title": 1.0, "head": 1.0},
+    "categories": {
+        "dress": [
+            "dress", "sundress", "gown", "jumpsuit", "romper", "playsuit", "shirt dress", "slip dress",
+            # Word-bounded matching never sees "dress" inside these single-word compounds.
+            "shirtdress", "sweaterdress", "tshirtdress", "teedress", "slipdress", "wrapdress",
+            "minidress", "mididress", "maxidress", "pinafore",
+        ],
+        "outerwear": [
+            "jacket", "coat", "overcoat", "raincoat", "parka", "blazer", "windbreaker", "puffer",
+            "anorak", "trench", "gilet", "vest", "shacket", "bomber", "poncho", "outerwear",
+            "topcoat", "peacoat", "rainjacket",
+        ],
+        "shoes": [
+            "shoe", "sneaker", "trainer", "sandal", "boot", "bootie", "loafer", "heel", "slipper",
+            "clog", "mule", "espadrille", "slide", "moccasin", "flip flop", "flip-flop", "footwear",
+            "rainboot", "snowboot", "hightop", "high-top",
+        ],
+        "bottom": [
+            "pant", "jean", "trouser", "short", "skirt", "skort", "legging", "jogger", "chino",
+            "sweatpant", "culotte", "bottom", "sweatshort", "boardshort", "overall", "dungaree",
+        ],
+        "accessory": [
+            "hat", "cap", "beanie", "bag", "backpack", "tote", "handbag", "purse", "belt", "watch",
+            "ring", "bracelet", "necklace", "earring", "sunglasses", "scarf", "glove", "wallet",
+            "bandana", "headband", "accessory", "accessories", "jewelry", "jewellery", "sock",
+            "sunhat", "snapback",
+        ],
+        "top": [
+            "top", "shirt", "t-shirt", "tshirt", "tee", "hoodie", "sweatshirt", "sweater", "jumper",
+            "cardigan", "blouse", "tank", "camisole", "cami", "polo", "crewneck", "pullover",
+            "henley", "turtleneck", "tunic", "jersey", "dress shirt", "short sleeve", "long sleeve",
+            "cap sleeve", "tank top", "crop top", "overshirt", "undershirt", "bodysuit",
+        ],
+    },
+    "ignore": ["ring spun", "boot cut", "paper bag", "belt loop", "watch strap"],
+}
+
+
+CATEGORY_TOKEN_RE = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+CATEGORY_SEPARATOR_RE = re.compile(r"[^a-z0-9-]+")
+CATEGORY_MATCHER = {"lock": threading.Lock(), "compiled": None}
+
+
+def _category_tokens(text):
+    return CATEGORY_TOKEN_RE.findall(text.lower()) if text else []
+
+
+def _trie_pattern(node):
+    branches = []
+    for char, child in sorted((char, child) for char, child in node.items() if char):
+        prefix = CATEGORY_SEPARATOR_RE.pattern if char == " " else re.escape(char)
+        branches.append(prefix + _trie_pattern(child))
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    return f"(?:{pattern})?" if "" in node else pattern
+
+
+def _compile_taxonomy(taxonomy):
+    """Compile every keyword phrase (and its plural) into one word-bounded regex."""
+    phrases = {}
+
+    def add(phrase, category):
+        tokens = _category_tokens(phrase)
+        if not tokens:
+            return
+        last = tokens[-1]
+        forms = {last, f"{last}s"}
+        if last.endswith(("s", "x", "z", "ch", "sh")):
+            forms.add(f"{last}es")
+        for form in forms:
+            phrases.setdefault(" ".join(tokens[:-1] + [form]), category)
+
+    for phrase in taxonomy.get("ignore") or []:
+        add(phrase, None)
+    for category, keywords in taxonomy["categories"].items():
+        for phrase in keywords:
+            add(phrase, category)
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = True
+    weights = dict(CATEGORY_TAXONOMY["weights"], **(taxonomy.get("weights") or {}))
+    return {
+        "regex": re.compile(rf"(?<![a-z0-9-])(?:{_trie_pattern(trie)})(?![a-z0-9-])"),
+        "phrases": phrases,
+        "order": {category: index for index, category in enumerate(taxonomy["categories"])},
+        "default": taxonomy.get("default") or CATEGORY_TAXONOMY["default"],
+        "weights": weights,
+        "version": hashlib.sha256(json.dumps(taxonomy, sort_keys=True).encode("utf-8")).hexdigest()[:12],
+    }
+
+
+def _category_matcher():
+    compiled = CATEGORY_MATCHER["compiled"]
+    if compiled is not None:
+        return compiled
+    with CATEGORY_MATCHER["lock"]:
+        if CATEGORY_MATCHER["compiled"] is None:
+            taxonomy = CATEGORY_TAXONOMY
+            if CATEGORY_TAXONOMY_PATH:
+                try:
+                    taxonomy = _load_json(CATEGORY_TAXONOMY_PATH, None) or CATEGORY_TAXONOMY
+                except ValueError:
+                    taxonomy = CATEGORY_TAXONOMY
+            CATEGORY_MATCHER["compiled"] = _compile_taxonomy(taxonomy)
+        return CATEGORY_MATCHER["compiled"]
+
+
+def _category_matches(matcher, text):
+    """Categories named in ``text``, left to right; the longest phrase wins at each position."""
+    if not text:
+        return []
+    phrases = matcher["phrases"]
+    matches = []
+    for phrase in matcher["regex"].findall(text.lower()):
+        category = phrases[phrase] if phrase in phrases else phrases[CATEGORY_SEPARATOR_RE.sub(" ", phrase)]
+        if category is not None:
+            matches.append(category)
+    return matches
+
+
+def _classify_category(matcher, title, product_type):
+    type_matches = _category_matches(matcher, product_type)
+    title_matches = _category_matches(matcher, title)
+    if not type_matches:
+        if not title_matches:
+            return matcher["default"]
+        if len(title_matches) == 1:
+            return title_matches[0]
+    weights = matcher["weights"]
+    scores = {}
+    for category in type_matches:
+        scores[category] = scores.get(category, 0.0) + weights["productType"]
+    for category in title_matches:
+        scores[category] = scores.get(category, 0.0) + weights["title"]
+    if title_matches:
+        # English puts the head noun last: "jean jacket" is a jacket, "hoodie dress" a dress.
+        scores[title_matches[-1]] += weights["head"]
+    order = matcher["order"]
+    return max(scores, key=lambda category: (scores[category], -order[category]))
+
+
+def _infer_categories(pairs):
+    """Classify many ``(title, product_type)`` pairs against one compiled taxonomy."""
+    matcher = _category_matcher()
+    memo = {}
+    categories = []
+    for title, product_type in pairs:
+        key = (title or "", product_type or "")
+        category = memo.get(key)
+        if category is None:
+            category = memo[key] = _classify_category(matcher, *key)
+        categories.append(category)
+    return categories
+
+
+def _infer_category(title, product_type):
+    return _infer_categories([(title, product_type)])[0]
+
+
+def _reclassify_entries(entries):
+    """Return updated copies of entries classified under an older taxonomy."""
+    version = _category_matcher()["version"]
+    stale = [entry for entry in entries if entry.get("categoryVersion") not in (None, version)]
+    categories = _infer_categories((entry.get("name"), entry.get("productType")) for entry in stale)
+    updated = []
+    for entry, category in zip(stale, categories):
+        updated.append(dict(entry, category=category, categoryVersion=version))
+    return updated
+
+
+def _apply_prompt_category(item, category):
+    if category.get("id"):
+        item["category"] = category["id"]
+        item.pop("categoryVersion", None)
@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app reads its directories at import time, so point them at a scratch tree first.
+_ROOT = tempfile.mkdtemp(prefix="shop-impress-tests-")
+for name in ("PUBLIC_DIR", "DATA_DIR", "CACHE_DIR"):
+    os.environ[name] = os.path.join(_ROOT, name.lower())
+os.environ["WARM_POOL"] = "0"
+os.environ["SHOP_SEARCH_CACHE_DISK"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    return app_module
+
+
+@pytest.fixture
+def client():
+    return app_module.APP.test_client()
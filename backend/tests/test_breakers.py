@@ -0,0 +1,87 @@
+import itertools
+
+import pytest
+
+import upstream
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def name(monkeypatch):
+    monkeypatch.setattr(upstream, "BREAKER_MIN_REQUESTS", 4)
+    monkeypatch.setattr(upstream, "BREAKER_ERROR_RATE", 0.5)
+    monkeypatch.setattr(upstream, "BREAKER_COOLDOWN", 30.0)
+    return f"test-{next(_names)}"
+
+
+def _trip(name):
+    for _ in range(4):
+        upstream._breaker_record(name, False, 0.01, False)
+
+
+def _cool_down(name):
+    with upstream.BREAKER_LOCK:
+        upstream.BREAKERS[name]["openedAt"] -= upstream.BREAKER_COOLDOWN + 1
+
+
+def test_closed_breaker_admits(name):
+    assert upstream._breaker_admit(name) is False
+    upstream._breaker_record(name, True, 0.01, False)
+    assert upstream._upstream_health()[name]["state"] == "closed"
+
+
+def test_stays_closed_below_min_requests(name):
+    for _ in range(3):
+        upstream._breaker_record(name, False, 0.01, False)
+    assert upstream._upstream_health()[name]["state"] == "closed"
+
+
+def test_opens_at_error_rate_and_short_circuits(name):
+    _trip(name)
+    health = upstream._upstream_health()[name]
+    assert health["state"] == "open"
+    assert health["opens"] == 1
+    with pytest.raises(RuntimeError, match="circuit open"):
+        upstream._breaker_admit(name)
+    assert upstream._upstream_health()[name]["shortCircuits"] == 1
+
+
+def test_half_open_lets_one_probe_through(name):
+    _trip(name)
+    _cool_down(name)
+    assert upstream._breaker_admit(name) is True
+    assert upstream._upstream_health()[name]["state"] == "half-open"
+    with pytest.raises(RuntimeError):
+        upstream._breaker_admit(name)
+
+
+def test_successful_probe_closes(name):
+    _trip(name)
+    _cool_down(name)
+    probe = upstream._breaker_admit(name)
+    upstream._breaker_record(name, True, 0.01, probe)
+    health = upstream._upstream_health()[name]
+    assert health["state"] == "closed"
+    assert health["windowRequests"] == 0
+    assert upstream._breaker_admit(name) is False
+
+
+def test_failed_probe_reopens_and_counts(name):
+    _trip(name)
+    _cool_down(name)
+    probe = upstream._breaker_admit(name)
+    upstream._breaker_record(name, False, 0.01, probe)
+    health = upstream._upstream_health()[name]
+    assert health["state"] == "open"
+    assert health["opens"] == 2
+    with pytest.raises(RuntimeError):
+        upstream._breaker_admit(name)
+
+
+def test_released_probe_frees_the_slot(name):
+    _trip(name)
+    _cool_down(name)
+    probe = upstream._breaker_admit(name)
+    upstream._breaker_record(name, None, None, probe)
+    assert upstream._breaker_admit(name) is True
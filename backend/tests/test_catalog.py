@@ -0,0 +1,107 @@
+import gzip
+import json
+
+import pytest
+
+import catalog as catalog_store
+
+
+def _item(index, **fields):
+    item = {
+        "id": f"item_{index}",
+        "title": f"Item {index}",
+        "imageUrl": f"https://cdn.example.com/{index}.jpg",
+        "category": "top" if index % 2 else "bottom",
+        "status": "ready",
+    }
+    item.update(fields)
+    return item
+
+
+@pytest.fixture
+def catalog(app):
+    items = [_item(index) for index in range(7)]
+    items[3]["status"] = "pending"
+    items[4]["renderStatus"] = {"girl": "ready"}
+    items.append(_item(7, status="duplicate", duplicateOf="item_1"))
+    app._update_catalog(items)
+    return items
+
+
+def test_plain_list_without_paging(client, catalog):
+    response = client.get("/api/catalog")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert isinstance(body, list)
+    assert [item["id"] for item in body] == [f"item_{index}" for index in range(7)]
+
+
+def test_filters(client, catalog):
+    assert [item["id"] for item in client.get("/api/catalog?category=top").get_json()] == [
+        "item_1",
+        "item_3",
+        "item_5",
+    ]
+    assert [item["id"] for item in client.get("/api/catalog?status=pending").get_json()] == ["item_3"]
+    assert [item["id"] for item in client.get("/api/catalog?status=duplicate").get_json()] == ["item_7"]
+    assert [item["id"] for item in client.get("/api/catalog?renderStatus=ready&avatar=girl").get_json()] == [
+        "item_4"
+    ]
+
+
+def test_projection_always_keeps_id(client, catalog):
+    body = client.get("/api/catalog?fields=title").get_json()
+    assert body[0] == {"id": "item_0", "title": "Item 0"}
+
+
+def test_cursor_paging_walks_every_item_once(client, catalog):
+    seen = []
+    url = "/api/catalog?limit=3"
+    while True:
+        page = client.get(url).get_json()
+        seen += [item["id"] for item in page["items"]]
+        if page["nextCursor"] is None:
+            break
+        url = f"/api/catalog?limit=3&cursor={page['nextCursor']}"
+    assert seen == [f"item_{index}" for index in range(7)]
+
+
+def test_cursor_survives_removal_of_its_item(app, client, catalog):
+    page = client.get("/api/catalog?limit=2").get_json()
+    app._catalog_apply(removals=["item_1"])
+    page = client.get(f"/api/catalog?limit=2&cursor={page['nextCursor']}").get_json()
+    assert [item["id"] for item in page["items"]] == ["item_2", "item_3"]
+
+
+def test_etag_revalidates_until_the_catalog_changes(app, client, catalog):
+    first = client.get("/api/catalog")
+    etag = first.headers["ETag"]
+    assert client.get("/api/catalog", headers={"If-None-Match": etag}).status_code == 304
+    app._catalog_apply({"item_0": {"status": "error"}})
+    changed = client.get("/api/catalog", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_etag_differs_per_query(client, catalog):
+    assert client.get("/api/catalog").headers["ETag"] != client.get("/api/catalog?category=top").headers["ETag"]
+
+
+def test_gzip_for_large_bodies(client, monkeypatch, catalog):
+    monkeypatch.setattr(catalog_store, "CATALOG_GZIP_MIN_BYTES", 1)
+    response = client.get("/api/catalog?category=bottom", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert [item["id"] for item in json.loads(gzip.decompress(response.data))] == [
+        "item_0",
+        "item_2",
+        "item_4",
+        "item_6",
+    ]
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["limit=0", "limit=abc", "cursor=not-a-cursor", "renderStatus=ready", "renderStatus=ready&avatar=robot"],
+)
+def test_rejects_bad_queries(client, catalog, query):
+    assert client.get(f"/api/catalog?{query}").status_code == 400
@@ -0,0 +1,54 @@
+import pytest
+
+import taxonomy
+
+
+@pytest.mark.parametrize(
+    "title, product_type, expected",
+    [
+        ("Graphic Tee", "", "top"),
+        ("Shortsleeve Tee", "", "top"),
+        ("Short Sleeve Button Up", "", "top"),
+        ("Ring-Spun Cotton Tee", "", "top"),
+        ("Cap Sleeve Top", "", "top"),
+        ("Linen Shorts", "", "bottom"),
+        ("Boot Cut Jeans", "", "bottom"),
+        ("Paper Bag Waist Trousers", "", "bottom"),
+        ("Fleece Sweatshorts", "", "bottom"),
+        ("Jean Jacket", "", "outerwear"),
+        ("Women's Puffer Vest", "", "outerwear"),
+        ("Hoodie Dress", "", "dress"),
+        ("Shirtdress", "", "dress"),
+        ("Cable Knit Sweaterdress", "", "dress"),
+        ("Leather Chelsea Boots", "", "shoes"),
+        ("Flip-Flops", "", "shoes"),
+        ("Canvas High Top Sneakers", "", "shoes"),
+        ("Bucket Hat", "", "accessory"),
+        ("Watch Cap", "", "accessory"),
+        ("Boot socks", "", "accessory"),
+        ("The Everyday", "Pants", "bottom"),
+        ("The Everyday", "", "top"),
+        ("", "", "top"),
+    ],
+)
+def test_classify_category(title, product_type, expected):
+    assert taxonomy._classify_category(taxonomy._category_matcher(), title, product_type) == expected
+
+
+def test_product_type_outweighs_title():
+    assert taxonomy._infer_category("Chelsea", "Boots") == "shoes"
+    assert taxonomy._infer_category("Sneaker Tee", "T-Shirts") == "top"
+
+
+def test_batch_matches_single():
+    pairs = [("Linen Shorts", ""), ("Shirtdress", ""), ("Linen Shorts", "")]
+    assert taxonomy._infer_categories(pairs) == [taxonomy._infer_category(*pair) for pair in pairs]
+
+
+def test_custom_taxonomy():
+    matcher = taxonomy._compile_taxonomy(
+        {"default": "other", "categories": {"swim": ["swimsuit", "bikini"]}, "ignore": []}
+    )
+    assert taxonomy._classify_category(matcher, "Ribbed Bikinis", "") == "swim"
+    assert taxonomy._classify_category(matcher, "Linen Shorts", "") == "other"
+    assert matcher["version"] != taxonomy._category_matcher()["version"]
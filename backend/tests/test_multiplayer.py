@@ -0,0 +1,75 @@
+import pytest
+
+
+ITEMS = [
+    {"id": f"item_{index}", "title": f"Item {index}", "imageUrl": f"https://cdn.example.com/{index}.jpg", "category": "top"}
+    for index in range(3)
+]
+
+
+@pytest.fixture
+def game(app, client, monkeypatch):
+    monkeypatch.setattr(app, "_collect_prompt_items", lambda prompt, **kwargs: [dict(item) for item in ITEMS])
+    return client.post("/api/multiplayer/create", json={"name": "Host"}).get_json()
+
+
+def _state(client, game_id, **params):
+    query = "&".join(f"{key}={value}" for key, value in params.items())
+    return client.get(f"/api/multiplayer/state?gameId={game_id}&{query}").get_json()
+
+
+def _apply(state, delta):
+    assert delta["baseVersion"] == state["version"]
+    state = dict(state, **delta["changes"])
+    assert state["version"] == delta["version"]
+    return state
+
+
+def _without_clock(state):
+    return {key: value for key, value in state.items() if key != "timeRemaining"}
+
+
+def test_delta_applies_to_its_base_version(client, game):
+    game_id = game["gameId"]
+    base = _state(client, game_id)
+    client.post("/api/multiplayer/join", json={"gameId": game_id, "name": "Guest"})
+    delta = _state(client, game_id, delta=1, haveVersion=base["version"])
+    assert delta["delta"] is True
+    assert "players" in delta["changes"]
+    assert "items" not in delta["changes"]
+    full = _state(client, game_id)
+    assert _without_clock(_apply(base, delta)) == _without_clock(full)
+
+
+def test_chained_deltas_rebuild_the_latest_state(client, game):
+    game_id = game["gameId"]
+    state = _state(client, game_id)
+    host_id = game["playerId"]
+    client.post("/api/multiplayer/join", json={"gameId": game_id, "name": "Guest"})
+    state = _apply(state, _state(client, game_id, delta=1, haveVersion=state["version"]))
+    client.post("/api/multiplayer/start", json={"gameId": game_id, "playerId": host_id})
+    state = _apply(state, _state(client, game_id, delta=1, haveVersion=state["version"]))
+    client.post("/api/multiplayer/pick", json={"gameId": game_id, "playerId": host_id, "itemId": "item_1"})
+    state = _apply(state, _state(client, game_id, delta=1, haveVersion=state["version"]))
+    assert _without_clock(state) == _without_clock(_state(client, game_id))
+
+
+def test_unknown_base_version_gets_the_full_state(client, game):
+    state = _state(client, game["gameId"], delta=1, haveVersion=999)
+    assert "delta" not in state
+    assert [item["id"] for item in state["items"]] == [item["id"] for item in ITEMS]
+
+
+def test_long_poll_returns_a_delta_once_the_version_moves(client, game):
+    game_id = game["gameId"]
+    base = _state(client, game_id)
+    client.post("/api/multiplayer/join", json={"gameId": game_id, "name": "Guest"})
+    delta = _state(client, game_id, delta=1, sinceVersion=base["version"], timeout=1)
+    assert delta["baseVersion"] == base["version"]
+    assert _without_clock(_apply(base, delta)) == _without_clock(_state(client, game_id))
+
+
+def test_long_poll_times_out_with_the_current_state(client, game):
+    base = _state(client, game["gameId"])
+    state = _state(client, game["gameId"], sinceVersion=base["version"], timeout=0.1)
+    assert state["version"] == base["version"]
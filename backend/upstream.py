@@ -0,0 +1,532 @@
+import asyncio
+import atexit
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+import requests
+
+from config import _safe_float, _safe_int
+from metrics import TIMING_TRACE, _count, _observe, _with_trace
+
+
+FAL_IMG_ENDPOINT = os.environ.get("FAL_SDXL_TURBO_IMG_ENDPOINT", "https://fal.run/fal-ai/fast-sdxl/image-to-image")
+SHOP_SEARCH_URL = os.environ.get("SHOP_SEARCH_URL", "https://shop.app/search?q=")
+SHOP_BROWSER_POOL_SIZE = _safe_int(os.environ.get("SHOP_BROWSER_POOL_SIZE"), 2)
+SHOP_BROWSER_MAX_NAVIGATIONS = _safe_int(os.environ.get("SHOP_BROWSER_MAX_NAVIGATIONS"), 40)
+SHOP_BROWSER_USER_AGENT = os.environ.get(
+    "SHOP_BROWSER_USER_AGENT",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0 Safari/537.36",
+)
+
+REQUEST_PROXIES = {"http": None, "https": None}
+REQUEST_SESSION = requests.Session()
+REQUEST_SESSION.trust_env = False
+
+# Coroutine-based shop, fal and CDN calls on the upstream loop; needs httpx.
+UPSTREAM_ASYNC = os.environ.get("UPSTREAM_ASYNC", "0") == "1"
+UPSTREAM_MAX_CONNECTIONS = _safe_int(os.environ.get("UPSTREAM_MAX_CONNECTIONS"), 1000)
+UPSTREAM_MAX_KEEPALIVE = _safe_int(os.environ.get("UPSTREAM_MAX_KEEPALIVE"), 200)
+UPSTREAM_KEEPALIVE_SECONDS = _safe_float(os.environ.get("UPSTREAM_KEEPALIVE_SECONDS"), 30.0)
+UPSTREAM_POOL_HOSTS = _safe_int(os.environ.get("UPSTREAM_POOL_HOSTS"), 16)
+UPSTREAM_POOL_PER_HOST = _safe_int(os.environ.get("UPSTREAM_POOL_PER_HOST"), 32)
+UPSTREAM_CONNECT_TIMEOUT = _safe_float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT"), 5.0)
+UPSTREAM_RETRIES = _safe_int(os.environ.get("UPSTREAM_RETRIES"), 2)
+UPSTREAM_RETRY_BACKOFF = _safe_float(os.environ.get("UPSTREAM_RETRY_BACKOFF_SECONDS"), 0.25)
+BREAKER_WINDOW = _safe_float(os.environ.get("BREAKER_WINDOW_SECONDS"), 30.0)
+BREAKER_MIN_REQUESTS = _safe_int(os.environ.get("BREAKER_MIN_REQUESTS"), 10)
+BREAKER_ERROR_RATE = _safe_float(os.environ.get("BREAKER_ERROR_RATE"), 0.5)
+BREAKER_COOLDOWN = _safe_float(os.environ.get("BREAKER_COOLDOWN_SECONDS"), 15.0)
+
+
+def _upstream_label(url):
+    host = urlparse(url).netloc
+    if host == urlparse(SHOP_SEARCH_URL).netloc:
+        return "shop"
+    if host == urlparse(FAL_IMG_ENDPOINT).netloc:
+        return "fal"
+    return "cdn"
+
+
+def _count_upstream_response(url, status):
+    _count("shop_impress_upstream_responses_total", upstream=_upstream_label(url), status=status)
+
+
+def _count_upstream_failure(url):
+    _count("shop_impress_upstream_failures_total", upstream=_upstream_label(url))
+
+
+# pool_maxsize is keep-alive connections per host; pool_connections is hosts kept.
+for _scheme in ("https://", "http://"):
+    REQUEST_SESSION.mount(
+        _scheme,
+        requests.adapters.HTTPAdapter(
+            pool_connections=max(UPSTREAM_POOL_HOSTS, 1), pool_maxsize=max(UPSTREAM_POOL_PER_HOST, 1)
+        ),
+    )
+UPSTREAM_RETRY_STATUSES = (502, 503, 504)
+UPSTREAM_IDEMPOTENT_METHODS = ("GET", "HEAD")
+
+# One circuit breaker per upstream over the last BREAKER_WINDOW_SECONDS.
+BREAKER_LOCK = threading.Lock()
+BREAKERS = {}
+
+
+def _breaker(upstream):
+    # Caller holds BREAKER_LOCK.
+    breaker = BREAKERS.get(upstream)
+    if breaker is None:
+        breaker = {
+            "state": "closed",
+            "openedAt": 0.0,
+            "probing": False,
+            "window": deque(),
+            "requests": 0,
+            "failures": 0,
+            "opens": 0,
+            "shortCircuits": 0,
+        }
+        BREAKERS[upstream] = breaker
+    return breaker
+
+
+def _breaker_trim(breaker, now):
+    window = breaker["window"]
+    while window and window[0][0] < now - BREAKER_WINDOW:
+        window.popleft()
+
+
+def _breaker_admit(upstream):
+    """Raise if ``upstream``'s breaker is open; return True when this call is the probe."""
+    now = time.time()
+    with BREAKER_LOCK:
+        breaker = _breaker(upstream)
+        if breaker["state"] == "open" and now - breaker["openedAt"] >= BREAKER_COOLDOWN:
+            breaker["state"] = "half-open"
+        if breaker["state"] == "closed":
+            return False
+        probe = breaker["state"] == "half-open" and not breaker["probing"]
+        if probe:
+            breaker["probing"] = True
+        else:
+            breaker["shortCircuits"] += 1
+    if probe:
+        return True
+    _count("shop_impress_upstream_short_circuits_total", upstream=upstream)
+    raise RuntimeError(f"{upstream} is unavailable (circuit open)")
+
+
+def _breaker_record(upstream, ok, seconds, probe):
+    """Feed one outcome into the breaker; ``ok=None`` only releases a probe slot."""
+    if seconds is not None:
+        _observe("shop_impress_upstream_request_seconds", seconds, upstream=upstream)
+    now = time.time()
+    opened = False
+    with BREAKER_LOCK:
+        breaker = _breaker(upstream)
+        if probe:
+            breaker["probing"] = False
+        if ok is None:
+            return
+        breaker["requests"] += 1
+        if not ok:
+            breaker["failures"] += 1
+        window = breaker["window"]
+        window.append((now, ok, seconds))
+        _breaker_trim(breaker, now)
+        if probe:
+            if ok:
+                breaker["state"] = "closed"
+                window.clear()
+            else:
+                breaker["state"] = "open"
+                breaker["openedAt"] = now
+                breaker["opens"] += 1
+                opened = True
+        elif breaker["state"] == "closed" and not ok and len(window) >= max(BREAKER_MIN_REQUESTS, 1):
+            failures = sum(1 for entry in window if not entry[1])
+            if failures / len(window) >= BREAKER_ERROR_RATE:
+                breaker["state"] = "open"
+                breaker["openedAt"] = now
+                breaker["opens"] += 1
+                opened = True
+    if opened:
+        _count("shop_impress_upstream_breaker_opens_total", upstream=upstream)
+
+
+def _upstream_health():
+    """Per-upstream breaker state plus error rate and latency over the breaker window."""
+    now = time.time()
+    health = {}
+    with BREAKER_LOCK:
+        for upstream, breaker in sorted(BREAKERS.items()):
+            _breaker_trim(breaker, now)
+            window = list(breaker["window"])
+            latencies = sorted(entry[2] for entry in window if entry[2] is not None)
+            entry = {
+                "state": breaker["state"],
+                "requests": breaker["requests"],
+                "failures": breaker["failures"],
+                "opens": breaker["opens"],
+                "shortCircuits": breaker["shortCircuits"],
+                "windowRequests": len(window),
+                "errorRate": round(sum(1 for item in window if not item[1]) / len(window), 3) if window else 0.0,
+            }
+            if latencies:
+                entry["p50Ms"] = round(latencies[len(latencies) // 2] * 1000, 1)
+                entry["p95Ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1)
+            health[upstream] = entry
+    return health
+
+
+def _upstream_retry_delay(attempt):
+    return UPSTREAM_RETRY_BACKOFF * (2 ** attempt) * random.uniform(1.0, 1.5)
+
+
+def _split_timeout(timeout):
+    """Bound connection setup separately so a dead host fails in seconds, not the read timeout."""
+    if isinstance(timeout, (int, float)):
+        return min(UPSTREAM_CONNECT_TIMEOUT, timeout), timeout
+    return timeout
+
+
+def _request_counted(method, url, **kwargs):
+    """Send through REQUEST_SESSION behind the breaker; only GETs are retried."""
+    kwargs.setdefault("proxies", REQUEST_PROXIES)
+    kwargs["timeout"] = _split_timeout(kwargs.get("timeout"))
+    upstream = _upstream_label(url)
+    retries = UPSTREAM_RETRIES if method in UPSTREAM_IDEMPOTENT_METHODS else 0
+    attempt = 0
+    while True:
+        probe = _breaker_admit(upstream)
+        started = time.perf_counter()
+        try:
+            response = REQUEST_SESSION.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            _breaker_record(upstream, False, time.perf_counter() - started, probe)
+            _count_upstream_failure(url)
+            if attempt >= retries:
+                raise
+        except BaseException:
+            _breaker_record(upstream, None, None, probe)
+            _count_upstream_failure(url)
+            raise
+        else:
+            _breaker_record(upstream, response.status_code < 500, time.perf_counter() - started, probe)
+            _count_upstream_response(url, response.status_code)
+            if response.status_code not in UPSTREAM_RETRY_STATUSES or attempt >= retries:
+                return response
+            response.close()
+        _count("shop_impress_upstream_retries_total", upstream=upstream)
+        time.sleep(_upstream_retry_delay(attempt))
+        attempt += 1
+
+
+def _request_get(url, **kwargs):
+    return _request_counted("GET", url, **kwargs)
+
+
+def _request_post(url, **kwargs):
+    return _request_counted("POST", url, **kwargs)
+
+
+# Playwright and httpx objects are bound to this loop; other threads only submit coroutines.
+BROWSER_POOL = {
+    "lock": threading.Lock(),
+    "thread": None,
+    "loop": None,
+    "playwright": None,
+    "browser": None,
+    "launchLock": None,
+    "slots": None,
+    "generation": 0,
+    "launches": 0,
+    "navigations": 0,
+    "recycles": 0,
+}
+
+
+async def _browser_ensure():
+    async with BROWSER_POOL["launchLock"]:
+        browser = BROWSER_POOL["browser"]
+        if browser is not None and browser.is_connected():
+            return browser
+        from playwright.async_api import async_playwright
+
+        if BROWSER_POOL["playwright"] is None:
+            BROWSER_POOL["playwright"] = await async_playwright().start()
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception:
+                pass
+        browser = await BROWSER_POOL["playwright"].chromium.launch(headless=True)
+        BROWSER_POOL["browser"] = browser
+        BROWSER_POOL["generation"] += 1
+        BROWSER_POOL["launches"] += 1
+        return browser
+
+
+async def _browser_reset_slot(slot):
+    context = slot.get("context")
+    slot.update({"context": None, "page": None, "navigations": 0, "generation": None})
+    if context is not None:
+        try:
+            await context.close()
+        except Exception:
+            pass
+
+
+async def _browser_slot_page(slot):
+    browser = await _browser_ensure()
+    page = slot.get("page")
+    if page is not None and slot.get("generation") == BROWSER_POOL["generation"] and not page.is_closed():
+        return page
+    await _browser_reset_slot(slot)
+    context = await browser.new_context(user_agent=SHOP_BROWSER_USER_AGENT, locale="en-US")
+    slot["context"] = context
+    slot["page"] = await context.new_page()
+    slot["generation"] = BROWSER_POOL["generation"]
+    return slot["page"]
+
+
+async def _upstream_close():
+    client = UPSTREAM["client"]
+    UPSTREAM["client"] = None
+    if client is not None:
+        try:
+            await client.aclose()
+        except Exception:
+            pass
+    slots = BROWSER_POOL["slots"]
+    while slots is not None and not slots.empty():
+        await _browser_reset_slot(slots.get_nowait())
+    browser = BROWSER_POOL["browser"]
+    BROWSER_POOL["browser"] = None
+    if browser is not None:
+        try:
+            await browser.close()
+        except Exception:
+            pass
+    playwright = BROWSER_POOL["playwright"]
+    BROWSER_POOL["playwright"] = None
+    if playwright is not None:
+        try:
+            await playwright.stop()
+        except Exception:
+            pass
+
+
+def _browser_worker_run(loop, ready):
+    asyncio.set_event_loop(loop)
+    BROWSER_POOL["launchLock"] = asyncio.Lock()
+    slots = asyncio.Queue()
+    for index in range(max(SHOP_BROWSER_POOL_SIZE, 1)):
+        slots.put_nowait({"index": index, "context": None, "page": None, "navigations": 0, "generation": None})
+    BROWSER_POOL["slots"] = slots
+    loop.call_soon(ready.set)
+    try:
+        loop.run_forever()
+    finally:
+        try:
+            loop.run_until_complete(_upstream_close())
+        finally:
+            loop.close()
+
+
+def _browser_worker_start():
+    with BROWSER_POOL["lock"]:
+        thread = BROWSER_POOL["thread"]
+        if thread is not None and thread.is_alive():
+            return True
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        thread = threading.Thread(
+            target=_browser_worker_run,
+            args=(loop, ready),
+            name="upstream-loop",
+            daemon=True,
+        )
+        BROWSER_POOL["loop"] = loop
+        BROWSER_POOL["thread"] = thread
+        thread.start()
+        return ready.wait(10)
+
+
+def _browser_worker_stop(timeout=10):
+    with BROWSER_POOL["lock"]:
+        thread = BROWSER_POOL["thread"]
+        loop = BROWSER_POOL["loop"]
+        BROWSER_POOL["thread"] = None
+        if thread is None or not thread.is_alive():
+            return
+        loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout)
+
+
+atexit.register(_browser_worker_stop)
+
+
+def _browser_pool_stats():
+    return {
+        "running": bool(BROWSER_POOL["thread"] and BROWSER_POOL["thread"].is_alive()),
+        "poolSize": max(SHOP_BROWSER_POOL_SIZE, 1),
+        "launches": BROWSER_POOL["launches"],
+        "navigations": BROWSER_POOL["navigations"],
+        "recycles": BROWSER_POOL["recycles"],
+    }
+
+
+# Only ever touched from the upstream loop, so the counters need no lock.
+UPSTREAM = {
+    "available": None,
+    "client": None,
+    "renderSlots": None,
+    "hostSlots": {},
+    "poolSlots": {},
+    "requests": 0,
+    "errors": 0,
+    "inflight": 0,
+    "peakInflight": 0,
+}
+
+
+def _upstream_async_enabled():
+    if not UPSTREAM_ASYNC:
+        return False
+    if UPSTREAM["available"] is None:
+        try:
+            import httpx  # noqa: F401
+        except Exception:
+            UPSTREAM["available"] = False
+        else:
+            UPSTREAM["available"] = True
+    return UPSTREAM["available"]
+
+
+def _upstream_submit(coro):
+    """Schedule ``coro`` on the upstream loop and return a concurrent.futures.Future."""
+    if not _browser_worker_start():
+        coro.close()
+        raise RuntimeError("upstream loop failed to start")
+    return asyncio.run_coroutine_threadsafe(coro, BROWSER_POOL["loop"])
+
+
+def _upstream_traced(coro):
+    trace = TIMING_TRACE.get()
+    return coro if trace is None else _with_trace(coro, trace)
+
+
+def _upstream_run(coro, timeout=None):
+    future = _upstream_submit(_upstream_traced(coro))
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+
+def _submit_upstream(executor, sync_fn, async_fn, *args):
+    """Run ``async_fn`` on the upstream loop in async mode, else ``sync_fn`` on ``executor``."""
+    if _upstream_async_enabled() and _browser_worker_start():
+        return _upstream_submit(_upstream_traced(async_fn(*args)))
+    return executor.submit(contextvars.copy_context().run, sync_fn, *args)
+
+
+async def _upstream_client():
+    client = UPSTREAM["client"]
+    if client is None:
+        import httpx
+
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max(UPSTREAM_MAX_CONNECTIONS, 1),
+                max_keepalive_connections=max(UPSTREAM_MAX_KEEPALIVE, 1),
+                keepalive_expiry=UPSTREAM_KEEPALIVE_SECONDS,
+            ),
+            trust_env=False,
+            follow_redirects=True,
+        )
+        UPSTREAM["client"] = client
+    return client
+
+
+def _upstream_pool_slot(url):
+    # httpx only caps connections globally, so the per-host cap is a semaphore here.
+    host = urlparse(url).netloc.lower()
+    slot = UPSTREAM["poolSlots"].get(host)
+    if slot is None:
+        slot = asyncio.Semaphore(max(UPSTREAM_POOL_PER_HOST, 1))
+        UPSTREAM["poolSlots"][host] = slot
+    return slot
+
+
+@asynccontextmanager
+async def _upstream_stream(method, url, timeout, **kwargs):
+    """Open a streamed GET on the shared async client; the caller reads the body."""
+    import httpx
+
+    client = await _upstream_client()
+    upstream = _upstream_label(url)
+    retries = UPSTREAM_RETRIES if method in UPSTREAM_IDEMPOTENT_METHODS else 0
+    connect_timeout, read_timeout = _split_timeout(timeout)
+    request_timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+    async with _upstream_pool_slot(url):
+        UPSTREAM["inflight"] += 1
+        UPSTREAM["peakInflight"] = max(UPSTREAM["peakInflight"], UPSTREAM["inflight"])
+        try:
+            attempt = 0
+            while True:
+                probe = _breaker_admit(upstream)
+                UPSTREAM["requests"] += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.send(
+                        client.build_request(method, url, timeout=request_timeout, **kwargs), stream=True
+                    )
+                except httpx.TransportError:
+                    UPSTREAM["errors"] += 1
+                    _breaker_record(upstream, False, time.perf_counter() - started, probe)
+                    _count_upstream_failure(url)
+                    if attempt >= retries:
+                        raise
+                except BaseException:
+                    UPSTREAM["errors"] += 1
+                    _breaker_record(upstream, None, None, probe)
+                    _count_upstream_failure(url)
+                    raise
+                else:
+                    _breaker_record(upstream, response.status_code < 500, time.perf_counter() - started, probe)
+                    _count_upstream_response(url, response.status_code)
+                    if response.status_code not in UPSTREAM_RETRY_STATUSES or attempt >= retries:
+                        break
+                    await response.aclose()
+                _count("shop_impress_upstream_retries_total", upstream=upstream)
+                await asyncio.sleep(_upstream_retry_delay(attempt))
+                attempt += 1
+            try:
+                yield response
+            except Exception:
+                UPSTREAM["errors"] += 1
+                raise
+            finally:
+                await response.aclose()
+        finally:
+            UPSTREAM["inflight"] -= 1
+
+
+def _upstream_stats():
+    return {
+        "async": _upstream_async_enabled(),
+        "requests": UPSTREAM["requests"],
+        "errors": UPSTREAM["errors"],
+        "inflight": UPSTREAM["inflight"],
+        "peakInflight": UPSTREAM["peakInflight"],
+        "breakers": _upstream_health(),
+        "browserPool": _browser_pool_stats(),
+    }
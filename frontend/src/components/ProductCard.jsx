@@ -2,11 +2,18 @@ import "./ProductCard.css";
 
 import Heart from '../assets/heart.svg'
 import Dislike from '../assets/dislike.svg';
+import ResponsiveImage from "./ResponsiveImage";
 
-export default function ProductCard({name, price, store, image, onDislike, onLike}) {
+export default function ProductCard({name, price, store, image, imageVariants, onDislike, onLike}) {
     return (
         <div className="product-card">
-            <img className="product-card-image" src={image}></img>
+            <ResponsiveImage
+                className="product-card-image"
+                src={image}
+                variants={imageVariants}
+                sizes="25rem"
+                alt={name}
+            />
             
             <div className="product-card-text">
                 <h3>{name}</h3>
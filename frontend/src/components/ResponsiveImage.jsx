@@ -0,0 +1,49 @@
+import { useState } from "react";
+
+const FALLBACK_TYPE = "image/jpeg";
+
+function toSrcSet(entries) {
+    return (entries || []).map((entry) => `${entry.url} ${entry.width}w`).join(", ");
+}
+
+// Renders an image from a backend variant record ({ placeholder, sources }), letting the
+// browser pick the width it displays. Falls back to a plain <img> without variants.
+export default function ResponsiveImage({src, variants, sizes, className, alt = "", style}) {
+    const [loadedKey, setLoadedKey] = useState(null);
+    const sources = variants?.sources;
+
+    if (!sources) {
+        return <img className={className} src={src} alt={alt} style={style} decoding="async" />;
+    }
+
+    const fallback = sources[FALLBACK_TYPE] || [];
+    const placeholderStyle = loadedKey !== variants.placeholder && variants.placeholder
+        ? {
+            backgroundImage: `url(${variants.placeholder})`,
+            backgroundSize: "cover",
+            backgroundPosition: "center",
+        }
+        : null;
+
+    return (
+        <picture>
+            {Object.entries(sources)
+                .filter(([type]) => type !== FALLBACK_TYPE)
+                .map(([type, entries]) => (
+                    <source key={type} type={type} srcSet={toSrcSet(entries)} sizes={sizes} />
+                ))}
+            <img
+                className={className}
+                src={fallback.length ? fallback[fallback.length - 1].url : src}
+                srcSet={toSrcSet(fallback) || undefined}
+                sizes={sizes}
+                alt={alt}
+                width={variants.width}
+                height={variants.height}
+                style={{...placeholderStyle, ...style}}
+                decoding="async"
+                onLoad={() => setLoadedKey(variants.placeholder)}
+            />
+        </picture>
+    );
+}
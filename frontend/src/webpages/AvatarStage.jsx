@@ -1,4 +1,5 @@
 import React, { useEffect, useState } from "react";
+import ResponsiveImage from "../components/ResponsiveImage";
 
 const BASE_IMAGES = {
   girl: { primary: "/avatars/basic%20girl.png", fallback: "/avatars/girl.svg" },
@@ -7,7 +8,10 @@ const BASE_IMAGES = {
 
 const OVERLAY_PRESETS = {
   top: { width: "58%", top: "34%", left: "50%" },
+  outerwear: { width: "62%", top: "35%", left: "50%" },
+  dress: { width: "58%", top: "46%", left: "50%" },
   bottom: { width: "50%", top: "60%", left: "50%" },
+  shoes: { width: "40%", top: "88%", left: "50%" },
   accessory: { width: "30%", top: "24%", left: "58%" },
 };
 
@@ -16,6 +20,7 @@ export default function AvatarStage({
   overlayUrl,
   overlayCategory = "top",
   renderUrl,
+  renderVariants,
 }) {
   const baseConfig = BASE_IMAGES[base] ?? BASE_IMAGES.girl;
   const [baseUrl, setBaseUrl] = useState(baseConfig.primary);
@@ -28,7 +33,13 @@ export default function AvatarStage({
   return (
     <div className="avatar-stage">
       {renderUrl ? (
-        <img className="avatar-render" src={renderUrl} alt="Rendered avatar" />
+        <ResponsiveImage
+          className="avatar-render"
+          src={renderUrl}
+          variants={renderVariants}
+          sizes="(max-width: 640px) 100vw, 640px"
+          alt="Rendered avatar"
+        />
       ) : (
         <>
           <img
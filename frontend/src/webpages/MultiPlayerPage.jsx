@@ -1,5 +1,6 @@
 import { useEffect, useMemo, useState } from "react";
 import Button from "../components/Button";
+import ResponsiveImage from "../components/ResponsiveImage";
 import "./MultiPlayerPage.css";
 
 const API_BASE = "/api";
@@ -57,33 +58,105 @@ export default function MultiPlayerPage() {
   const players = state?.players ?? [];
   const me = players.find((player) => player.id === playerId);
   const isHost = state?.hostId && state.hostId === playerId;
-  const timeRemaining = state?.timeRemaining;
   const phase = state?.phase ?? "waiting";
   const maxPlayers = state?.maxPlayers ?? 2;
 
   const canPick = phase === "draft" && currentItem && !isRendering;
   const canVote = phase === "vote" && players.length > 1;
 
-  const fetchState = async (activeGameId) => {
-    if (!activeGameId) return;
-    try {
-      const data = await fetchJson(`${API_BASE}/multiplayer/state?gameId=${encodeURIComponent(activeGameId)}`);
-      setState(data);
-      if (data.items?.length) {
-        setItems((prev) => (prev.length ? prev : data.items));
-      }
-    } catch (error) {
-      setStatus(error.message);
+  const applyState = (data) => {
+    if (!data) return;
+    // Pushed updates and POST responses can arrive out of order; keep the newest version.
+    setState((prev) => {
+      if (prev?.gameId === data.gameId && data.version < prev.version) return prev;
+      return { ...data, receivedAt: Date.now() };
+    });
+    if (data.items?.length) {
+      // Slow categories can be filled in after creation, so the list may grow while waiting.
+      setItems((prev) => (data.items.length > prev.length ? data.items : prev));
     }
   };
 
   useEffect(() => {
     if (!gameId) return;
-    fetchState(gameId);
-    const interval = setInterval(() => fetchState(gameId), 2000);
-    return () => clearInterval(interval);
+    let active = true;
+    let source = null;
+    let version = -1;
+    let current = null;
+    const query = `gameId=${encodeURIComponent(gameId)}`;
+
+    const handle = (data) => {
+      if (!active) return true;
+      let next = data;
+      if (data.delta) {
+        // Deltas only list the top-level keys that changed since baseVersion.
+        if (current?.version !== data.baseVersion) return false;
+        next = { ...current, ...data.changes };
+      }
+      current = next;
+      version = next.version;
+      applyState(next);
+      return true;
+    };
+
+    const connectStream = () => {
+      current = null;
+      version = -1;
+      source = new EventSource(`${API_BASE}/multiplayer/stream?${query}`);
+      const onEvent = (event) => {
+        if (handle(JSON.parse(event.data))) return;
+        source.close();
+        connectStream();
+      };
+      source.addEventListener("state", onEvent);
+      source.addEventListener("delta", onEvent);
+      source.addEventListener("gone", () => {
+        source.close();
+        setStatus("Game not found.");
+      });
+      source.onerror = () => {
+        // EventSource retries transient drops itself; fall back only once it gives up.
+        if (source.readyState === EventSource.CLOSED) {
+          source = null;
+          longPoll();
+        }
+      };
+    };
+
+    const longPoll = async () => {
+      while (active) {
+        try {
+          const data = await fetchJson(`${API_BASE}/multiplayer/state?${query}&sinceVersion=${version}&delta=1`);
+          if (!handle(data)) version = -1;
+        } catch (error) {
+          if (!active) return;
+          setStatus(error.message);
+          await new Promise((resolve) => setTimeout(resolve, 2000));
+        }
+      }
+    };
+
+    if (typeof EventSource === "undefined") {
+      longPoll();
+    } else {
+      connectStream();
+    }
+    return () => {
+      active = false;
+      if (source) source.close();
+    };
   }, [gameId]);
 
+  const [now, setNow] = useState(() => Date.now());
+  useEffect(() => {
+    if (phase !== "draft") return;
+    const interval = setInterval(() => setNow(Date.now()), 1000);
+    return () => clearInterval(interval);
+  }, [phase]);
+  const timeRemaining = state?.timeRemaining == null || phase !== "draft"
+    ? state?.timeRemaining
+    : Math.max(0, Math.round(state.timeRemaining - (now - state.receivedAt) / 1000));
+
   useEffect(() => {
     if (!state?.promptId) return;
     setPromptId(state.promptId);
@@ -118,7 +191,7 @@ export default function MultiPlayerPage() {
       });
       setGameId(data.gameId);
       setPlayerId(data.playerId);
-      setState(data.state);
+      applyState(data.state);
       setItems(data.state?.items ?? []);
       setMode("game");
     } catch (error) {
@@ -148,7 +221,7 @@ export default function MultiPlayerPage() {
       });
       setGameId(data.gameId);
       setPlayerId(data.playerId);
-      setState(data.state);
+      applyState(data.state);
       setItems(data.state?.items ?? []);
       setMode("game");
     } catch (error) {
@@ -195,7 +268,7 @@ export default function MultiPlayerPage() {
           renderedImage: renderedUrl,
         }),
       });
-      setState(stateUpdate);
+      applyState(stateUpdate);
     } catch (error) {
       setStatus(error.message);
     } finally {
@@ -213,7 +286,7 @@ export default function MultiPlayerPage() {
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ gameId, playerId }),
       });
-      setState(stateUpdate);
+      applyState(stateUpdate);
     } catch (error) {
       setStatus(error.message);
     } finally {
@@ -234,7 +307,7 @@ export default function MultiPlayerPage() {
           voteFor: targetId,
         }),
       });
-      setState(stateUpdate);
+      applyState(stateUpdate);
     } catch (error) {
       setStatus(error.message);
     } finally {
@@ -377,7 +450,12 @@ export default function MultiPlayerPage() {
                 {currentItem ? (
                   <>
                     <div className="mp-item">
-                      <img src={currentItem.previewImage || currentItem.imageUrl} alt={currentItem.name} />
+                      <ResponsiveImage
+                        src={currentItem.previewImage || currentItem.imageUrl}
+                        variants={currentItem.previewVariants}
+                        sizes="120px"
+                        alt={currentItem.name}
+                      />
                       <div>
                         <h3>{currentItem.name}</h3>
                         <p>{currentItem.store}</p>
@@ -3,6 +3,19 @@ import './SinglePlayerPage.css';
 import AvatarStage from "./AvatarStage";
 import ProductCard from '../components/ProductCard';
 
+const CATALOG_FIELDS = [
+  "name",
+  "store",
+  "productUrl",
+  "imageUrl",
+  "previewImage",
+  "previewVariants",
+  "category",
+  "status",
+  "renderedImages",
+  "renderedVariants",
+].join(",");
+
 export default function SinglePlayerPage() {
   const [items, setItems] = useState([]);
   const [dismissedIds, setDismissedIds] = useState([]);
@@ -30,15 +43,20 @@ export default function SinglePlayerPage() {
     let active = true;
     let inFlight = false;
     let intervalId;
+    let lastEtag = null;
 
     const tick = async () => {
       if (inFlight || !active) return;
       inFlight = true;
       try {
-        const catalogRes = await fetch("/attachments/catalog.json", { cache: "no-store" });
+        // The API answers 304 while nothing changed, so an idle poll costs one header round trip.
+        const catalogRes = await fetch(`/api/catalog?fields=${CATALOG_FIELDS}`, { cache: "no-cache" });
+        const etag = catalogRes.headers.get("ETag");
+        if (catalogRes.ok && etag && etag === lastEtag) return;
         const catalog = catalogRes.ok ? await catalogRes.json() : [];
 
         if (!active) return;
+        lastEtag = catalogRes.ok ? etag : null;
         setItems(Array.isArray(catalog) ? catalog : []);
         if (Array.isArray(catalog) && catalog.length > 0) {
           const pending = catalog.some((item) => item.status !== "ready" && item.status !== "error");
@@ -74,6 +92,7 @@ export default function SinglePlayerPage() {
   const isRendering = renderingId === current?.id;
   const equippedItem = items.find((item) => item.id === equippedId) ?? null;
   const renderUrl = equippedItem?.renderedImages?.[avatar];
+  const renderVariants = equippedItem?.renderedVariants?.[avatar];
   const overlayUrl = (!renderUrl && !isRendering)
     ? (equippedItem?.previewImage || equippedItem?.imageUrl)
     : null;
@@ -181,6 +200,7 @@ export default function SinglePlayerPage() {
           overlayUrl={overlayUrl}
           overlayCategory={overlayCategory}
           renderUrl={renderUrl}
+          renderVariants={renderVariants}
         />
 
         <div className="singleplayer-page-cards">
@@ -188,6 +208,7 @@ export default function SinglePlayerPage() {
             name={current.name}
             store={current.productUrl}
             image={current.previewImage || current.imageUrl}
+            imageVariants={current.previewVariants}
             onDislike={handleDiscard}
             onLike={handleWear}
           /> : 